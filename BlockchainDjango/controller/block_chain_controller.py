@@ -2,10 +2,12 @@
 # -*- coding: UTF-8 -*-
 import logging
 
+from django.http import JsonResponse
 from django.shortcuts import render_to_response, render
 from django.views.decorators.csrf import csrf_exempt
 
 from ..service.block_chain_service import BlockChainService
+from ..service.block_service import BlockService
 from ..entity.patient import Patient
 from ..entity.doctor import Doctor
 from ..service.patient_service import PatientService
@@ -149,3 +151,19 @@ class BlockChainController(object):
 
         return render(request, 'blockchain_manager.html', rtn_msg)
 
+    @staticmethod
+    def tx_proof(request):
+        """
+        返回交易单所在区块的区块头与 Merkle 包含证明，参数为 tx_id
+        :param request:
+        :return:
+        """
+        tx_id = request.GET.get('tx_id')
+        if not tx_id:
+            return JsonResponse({'error': '缺少参数 tx_id'}, status=400)
+
+        tx_proof = BlockService.get_tx_proof(tx_id)
+        if tx_proof is None:
+            return JsonResponse({'error': '交易单 ' + tx_id + ' 不存在！'}, status=404)
+
+        return JsonResponse(tx_proof)
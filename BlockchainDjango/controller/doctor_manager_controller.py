@@ -2,14 +2,15 @@
 # -*- coding: UTF-8 -*-
 import logging
 
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render_to_response, render
 
 from ..service.medical_record_service import MedicalRecordService
-from ..service.transaction_service import TransactionService
-from ..service.patient_service import PatientService
+from ..service.data_loader import RequestLoaders
 
 from ..util.const import FindRecordType
+from ..util.page_util import get_page_size
 from ..util.time_util import get_format_time
 
 logging.basicConfig(level=logging.INFO)
@@ -32,14 +33,23 @@ class DoctorManagerController(object):
         rtn_msg = {}
         if request.POST:
             doctor_id = request.POST['doctor_id']
-            find_record_type = FindRecordType.NORMAL.value
-            tx_id_list = MedicalRecordService.find_by_doctor_id(doctor_id, find_record_type)
-            record_info_list = TransactionService.find_contents_by_ids(tx_id_list)
+            # 按从新到旧的顺序分页显示，每次只读取一页的就诊记录
+            try:
+                page_size = get_page_size(request.POST.get('page_size'))
+                tx_id_list, next_cursor = MedicalRecordService.find_page_by_doctor_id(doctor_id, page_size,
+                                                                                      request.POST.get('cursor'))
+            except ValueError as e:
+                return render(request, 'doctor-manager.html', {'msg': str(e)})
+            rtn_msg['doctor_id'] = doctor_id
+            rtn_msg['next_cursor'] = next_cursor
+
+            # 同一请求中的交易单与病人通过 RequestLoaders 批量查找，花费与就诊记录数量无关
+            loaders = RequestLoaders.get(request)
+            record_info_list = [dict(record) for record in loaders.tx_contents.load_many(tx_id_list)]
 
             # 根据就诊记录里的patient_id来获取对应病人的具体信息，并追加到就诊记录dict当中返回
-            for record in record_info_list:
-                patient_id = record['patient_id']
-                patient_dict = PatientService.find_by_id(patient_id)
+            patient_dicts = loaders.patients.load_many([record['patient_id'] for record in record_info_list])
+            for record, patient_dict in zip(record_info_list, patient_dicts):
                 record['patient'] = patient_dict
 
             logger.info('tx_id_list: ' + str(tx_id_list))
@@ -54,6 +64,32 @@ class DoctorManagerController(object):
         else:
             return render(request, 'doctor-manager.html', {'msg': '该医生没有任何就诊记录'})
 
+    @staticmethod
+    def doctor_records_page(request):
+        """
+        以 json 的形式按从新到旧的顺序分页返回医生的就诊记录，参数为 doctor_id, page_size 与 cursor，
+        返回 {'records': 就诊记录的list, 'next_cursor': 下一页的 cursor，没有下一页时为null}
+        :param request:
+        :return:
+        """
+        doctor_id = request.GET.get('doctor_id')
+        if not doctor_id:
+            return JsonResponse({'error': '缺少参数 doctor_id'}, status=400)
+
+        try:
+            page_size = get_page_size(request.GET.get('page_size'))
+            tx_id_list, next_cursor = MedicalRecordService.find_page_by_doctor_id(doctor_id, page_size,
+                                                                                  request.GET.get('cursor'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        loaders = RequestLoaders.get(request)
+        records = [dict(record) for record in loaders.tx_contents.load_many(tx_id_list)]
+        patient_dicts = loaders.patients.load_many([record['patient_id'] for record in records])
+        for record, patient_dict in zip(records, patient_dicts):
+            record['patient'] = patient_dict
+        return JsonResponse({'records': records, 'next_cursor': next_cursor})
+
     @staticmethod
     @csrf_exempt
     def get_doctor_del_records(request):
@@ -65,18 +101,20 @@ class DoctorManagerController(object):
             # deleted_record_tx_id_list用于保存MedicalRecordDel 类型 transaction 的 id
             tx_id_list, deleted_record_tx_id_list = \
                 MedicalRecordService.find_by_doctor_id(doctor_id, find_record_type)
-            record_info_list = TransactionService.find_contents_by_ids(deleted_record_tx_id_list)
+            loaders = RequestLoaders.get(request)
+            record_info_list = [dict(record) for record in loaders.tx_contents.load_many(deleted_record_tx_id_list)]
+            # 被删除的就诊记录与病人在一次批量查找中获取
+            loaders.tx_contents.prime([record['tx_id'] for record in record_info_list])
+            loaders.patients.prime([record['patient_id'] for record in record_info_list])
             for record in record_info_list:
                 record['timestamp'] = get_format_time(record['timestamp'])
                 # 根据就诊记录里的tx_id来获取已被删除的 就诊记录的信息
                 tx_id = record['tx_id']
                 logger.info('tx_id: ' + tx_id)
-                record['record_del_info'] = TransactionService.find_contents_by_id(tx_id)
+                record['record_del_info'] = loaders.tx_contents.load(tx_id)
 
-                # 根据就诊记录里的doctor_id来获取对应医生的具体信息，并追加到就诊记录dict当中返回
-                patient_id = record['patient_id']
-                patient_dict = PatientService.find_by_id(patient_id)
-                record['patient'] = patient_dict
+                # 根据就诊记录里的patient_id来获取对应病人的具体信息，并追加到就诊记录dict当中返回
+                record['patient'] = loaders.patients.load(record['patient_id'])
 
             logger.info('tx_id_list: ' + str(tx_id_list))
             logger.info('record_info_list' + str(record_info_list))
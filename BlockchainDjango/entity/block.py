@@ -4,6 +4,8 @@
 import hashlib
 import logging
 
+from ..util.const import Const
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -16,16 +18,55 @@ class Block(object):
     time_stamp = 0.0
     tx_count = 0
     tx_list = []
+    # 区块在链上的高度，创世区块为 0
+    height = None
+    # 区块中交易单所含标识符的 Bloom 过滤器的dict
+    bloom = None
 
-    def __init__(self, pre_id, tree_hash, time_stamp, tx_count, tx_list):
+    def __init__(self, pre_id, tree_hash, time_stamp, tx_count, tx_list, height=None, bloom=None):
         self.pre_id = pre_id
         self.tree_hash = tree_hash
         self.time_stamp = time_stamp
         self.tx_count = tx_count
         self.tx_list = tx_list
+        self.height = height
+        self.bloom = bloom
+        self._id = Block.calc_id(pre_id, tree_hash, time_stamp)
+
+    @staticmethod
+    def calc_id(pre_id, tree_hash, time_stamp):
+        """
+        根据区块头计算区块的ID，也用于验证区块头是否被篡改
+        :param pre_id:
+        :param tree_hash:
+        :param time_stamp:
+        :return:
+        """
         hash_content = pre_id + tree_hash + str(time_stamp)
         # 利用sha256算法计算一个区块的ID
-        self._id = hashlib.sha256(bytes(hash_content, encoding='utf-8')).hexdigest()
+        return hashlib.sha256(bytes(hash_content, encoding='utf-8')).hexdigest()
+
+    def get_header_doc(self):
+        """
+        区块头文档，以区块ID为 _id，遍历区块链、按高度读取区块时只需读取区块头
+        :return:
+        """
+        header_doc = {'_id': self._id, 'pre_id': self.pre_id, 'tree_hash': self.tree_hash,
+                      'time_stamp': self.time_stamp, 'tx_count': self.tx_count, 'height': self.height}
+        if self.bloom is not None:
+            header_doc['bloom'] = self.bloom
+        return header_doc
+
+    def get_body_doc(self):
+        """
+        区块体文档，保存区块中交易单的 id 列表，需要时才读取
+        :return:
+        """
+        return {'_id': Block.get_body_id(self._id), 'tx_list': list(self.tx_list)}
+
+    @staticmethod
+    def get_body_id(block_id):
+        return Const.BLOCK_BODY_PREFIX + block_id
 
     def __str__(self):
         return "id: " + str(self._id) + ", pre_id: " + str(self.pre_id) \
@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from ..util.const import Const
+
+
+class Checkpoint(object):
+    """
+    区块链的检查点：记录某一高度的区块ID，以及从创世区块到该区块的所有区块ID的累积哈希，并由节点的私钥签名。
+    信任检查点后，只需验证检查点之后加入的区块
+    """
+
+    def __init__(self, height, block_id, cum_hash, pub_key='', signature=''):
+        self._id = Const.CHECKPOINT_PREFIX + str(height)
+        self.height = height
+        self.block_id = block_id
+        self.cum_hash = cum_hash
+        # 签名者公钥的 hex 字符串
+        self.pub_key = pub_key
+        self.signature = signature
+
+    def get_sign_content(self):
+        """
+        :return: 签名的内容
+        """
+        return str(self.height) + ':' + self.block_id + ':' + self.cum_hash
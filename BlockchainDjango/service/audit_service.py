@@ -0,0 +1,311 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..entity.block import Block
+from ..entity.transaction import Transaction
+from ..storage import get_store
+from ..util.const import Const
+from ..util.merkle_tree import gen_merkle_tree
+from .transaction_service import TransactionService
+from .block_service import BlockService
+from .checkpoint_service import CheckpointService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def audit_block(block_doc, tx_ids, tx_dicts):
+    """
+    验证一个区块：区块ID是否等于区块头的哈希，tree_hash 是否等于交易单的 Merkle 根，各交易单的签名是否正确，
+    区块头中的 Bloom 过滤器是否与交易单一致
+    :param block_doc: 区块头文档
+    :param tx_ids: 区块体中的 tx_list
+    :param tx_dicts: 区块中 Transaction 的dict的list，创世区块为 None
+    :return: 错误信息的list，验证通过时为空
+    """
+    errors = []
+    if Block.calc_id(block_doc['pre_id'], block_doc['tree_hash'], block_doc['time_stamp']) != block_doc['_id']:
+        errors.append('区块ID与区块头的哈希不一致')
+
+    # 创世区块的 tx_list 中直接存储内容
+    if tx_dicts is None:
+        leaves = tx_ids
+    else:
+        leaves = [TransactionService.get_tx_str(tx_dict) for tx_dict in tx_dicts]
+    if gen_merkle_tree(leaves) != block_doc['tree_hash']:
+        errors.append('tree_hash 与交易单的 Merkle 根不一致')
+    if block_doc['tx_count'] != len(tx_ids):
+        errors.append('tx_count 与 tx_list 的长度不一致')
+
+    tx_list = []
+    for tx_dict in tx_dicts or ():
+        tx_obj = Transaction()
+        tx_obj.init_tx_by_dict(tx_dict)
+        tx_list.append(tx_obj)
+        try:
+            tx_ok = TransactionService.verify_tx(tx_obj)
+        except Exception:
+            # 签名错误时 ecdsa 会抛出 BadSignatureError
+            tx_ok = False
+        if not tx_ok:
+            errors.append('交易单 ' + tx_dict['id'] + ' 的签名错误')
+
+    # Bloom 过滤器不参与区块ID的计算，需要根据交易单重新生成后比较
+    if tx_dicts is not None and block_doc.get('bloom') is not None and \
+            BlockService.gen_bloom(tx_list) != block_doc['bloom']:
+        errors.append('Bloom 过滤器与交易单不一致')
+
+    return errors
+
+
+def audit_chunk(chunk):
+    """
+    在进程池的工作进程中验证一批区块
+    :param chunk: [(区块头文档, tx_ids, tx_dicts), ...]
+    :return: [(区块ID, 交易单数, 错误信息的list), ...]
+    """
+    return [(block_doc['_id'], len(tx_dicts or ()), audit_block(block_doc, tx_ids, tx_dicts))
+            for block_doc, tx_ids, tx_dicts in chunk]
+
+
+def load_chunk(headers):
+    """
+    读取一批区块的区块体与交易单，区块体、交易单各通过一次批量请求获取
+    :param headers: 区块头文档的list
+    :return: [(区块头文档, tx_ids, tx_dicts), ...]，创世区块的 tx_dicts 为 None
+    """
+    tx_id_lists = BlockService.get_block_tx_ids(headers)
+    tx_ids = [tx_id for header, tx_id_list in zip(headers, tx_id_lists)
+              if Const.GENESIS_PRE_ID != header['pre_id'] for tx_id in tx_id_list]
+    tx_dicts = iter(TransactionService.find_txs_by_ids(tx_ids))
+    chunk = []
+    for header, tx_id_list in zip(headers, tx_id_lists):
+        if Const.GENESIS_PRE_ID == header['pre_id']:
+            chunk.append((header, tx_id_list, None))
+        else:
+            chunk.append((header, tx_id_list, [next(tx_dicts) for _ in tx_id_list]))
+    return chunk
+
+
+def verify_since_checkpoint(trusted_pub_keys=None, chunk_size=Const.AUDIT_CHUNK_SIZE):
+    """
+    节点启动时的验证：从最新的受信任检查点开始按高度批量读取之后的区块，
+    检查 pre_id 的链接并以 audit_block 验证每个区块，再以检查点的累积哈希为起点重新计算链尾的高度与累积哈希，
+    与链尾文档中记录的比较。耗时只与检查点之后的区块数有关
+    :param trusted_pub_keys: 受信任的公钥 hex 字符串的集合，默认只信任本节点的公钥
+    :param chunk_size: 每批读取、验证的区块数
+    :return: 验证是否通过
+    """
+    head_doc = get_store().get_head()
+    if 'cum_hash' not in head_doc:
+        logger.error('链尾文档中没有记录高度与累积哈希')
+        return False
+
+    checkpoint_dict = CheckpointService.find_latest_checkpoint(trusted_pub_keys)
+    if checkpoint_dict is None:
+        pre_id, height, cum_hash = Const.GENESIS_PRE_ID, -1, ''
+    else:
+        pre_id, height, cum_hash = checkpoint_dict['block_id'], checkpoint_dict['height'], checkpoint_dict['cum_hash']
+
+    end = head_doc['height'] + 1
+    for start in range(height + 1, end, chunk_size):
+        headers = BlockService.get_blocks(start, min(start + chunk_size, end))
+        if len(headers) != min(chunk_size, end - start):
+            logger.error('高度 ' + str(start) + ' 之后的区块缺少高度索引')
+            return False
+
+        for block_doc, tx_ids, tx_dicts in load_chunk(headers):
+            if block_doc['pre_id'] != pre_id:
+                logger.error('区块 ' + block_doc['_id'] + ' 的 pre_id 与前一个区块的ID不一致')
+                return False
+            errors = audit_block(block_doc, tx_ids, tx_dicts)
+            if errors:
+                logger.error('区块 ' + block_doc['_id'] + ' 验证失败: ' + str(errors))
+                return False
+            pre_id = block_doc['_id']
+            cum_hash = CheckpointService.calc_cum_hash(cum_hash, pre_id)
+
+    if pre_id != head_doc['last_block_id'] or cum_hash != head_doc['cum_hash']:
+        logger.error('链尾文档中的区块ID或累积哈希与区块链不一致')
+        return False
+    return True
+
+
+class ChainAuditor(object):
+    """
+    从链尾开始向前流式地审计区块链：每次读取 chunk_size 个区块头，有高度索引时按高度批量读取，
+    再通过一次批量请求读取这些区块的区块体，通过一次批量请求读取区块中的交易单，
+    区块ID、Merkle 根与签名的验证分散到进程池中并行完成，读取下一批区块与验证同时进行。
+    每验证完一批区块就将进度写入进度文件，中断后再次运行会从中断处继续；
+    审计完成后记录已审计的链尾，下一次只需审计之后新加入的区块。
+    存在比已审计的链尾更新的、受信任的签名检查点时，只审计检查点之后的区块
+    """
+
+    def __init__(self, chunk_size=Const.AUDIT_CHUNK_SIZE, processes=None, checkpoint_file=Const.AUDIT_CHECKPOINT_FILE):
+        """
+        :param chunk_size: 每批读取、验证的区块数
+        :param processes: 进程池大小，默认为 CPU 核数
+        :param checkpoint_file: 保存审计进度的文件的路径
+        """
+        self.chunk_size = chunk_size
+        self.processes = processes or multiprocessing.cpu_count()
+        self.checkpoint_file = checkpoint_file
+
+    def load_checkpoint(self):
+        """
+        审计进度为 {'audited_head': 上一次审计完成时的链尾区块ID, 'audited_height': 其高度,
+        'run': 未完成的审计的进度或None}
+        :return:
+        """
+        if not os.path.exists(self.checkpoint_file):
+            return {'audited_head': None, 'audited_height': None, 'run': None}
+        with open(self.checkpoint_file) as checkpoint:
+            return json.load(checkpoint)
+
+    def save_checkpoint(self, checkpoint):
+        # 先写入临时文件再替换，中断时不会留下不完整的检查点
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as tmp:
+            json.dump(checkpoint, tmp)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def read_headers(self, store, block_id, stop_id):
+        """
+        从 block_id 开始向前读取至多 chunk_size 个区块头，直到 stop_id(不包括)或创世区块(包括)。
+        区块有高度时通过高度索引批量读取，并检查每个区块头的 pre_id 与前一个区块的ID一致
+        :param store:
+        :param block_id:
+        :param stop_id:
+        :return: 从新到旧排列的区块头文档的list
+        """
+        headers = [store[block_id]]
+
+        def reach_end():
+            pre_id = headers[-1]['pre_id']
+            return len(headers) >= self.chunk_size or Const.GENESIS_PRE_ID == pre_id or pre_id == stop_id
+
+        height = headers[0].get('height')
+        if height is not None and not reach_end():
+            for header in reversed(BlockService.get_blocks(max(height - self.chunk_size + 1, 0), height)):
+                # 高度索引与区块链不一致时，改为逐个读取
+                if header['_id'] != headers[-1]['pre_id']:
+                    break
+                headers.append(header)
+                if reach_end():
+                    break
+
+        while not reach_end():
+            headers.append(store[headers[-1]['pre_id']])
+        return headers
+
+    def iter_chunks(self, store, next_id, stop_id):
+        """
+        从 next_id 开始向前读取区块，直到 stop_id(不包括)或创世区块(包括)
+        :param store:
+        :param next_id: 第一个要审计的区块ID
+        :param stop_id: 已审计过的区块ID，为 None 时审计到创世区块
+        :return: 每次返回 [(区块头文档, tx_ids, tx_dicts), ...]
+        """
+        block_id = next_id
+        while block_id != stop_id:
+            if block_id is None:
+                raise Exception('区块 ' + stop_id + ' 不在区块链上')
+
+            headers = self.read_headers(store, block_id, stop_id)
+            block_id = None if Const.GENESIS_PRE_ID == headers[-1]['pre_id'] else headers[-1]['pre_id']
+
+            yield load_chunk(headers)
+
+    def run(self):
+        """
+        审计区块链，返回审计结果
+        :return: {'blocks', 'txs', 'errors': {区块ID: 错误信息的list}, 'elapsed', 'blocks_per_sec', 'txs_per_sec'}
+        """
+        store = get_store()
+        checkpoint = self.load_checkpoint()
+        run = checkpoint['run']
+        if run is None:
+            head_doc = store.get_head()
+            run = {'head_id': head_doc['last_block_id'], 'head_height': head_doc.get('height'),
+                   'next_id': head_doc['last_block_id'], 'stop_id': checkpoint['audited_head'],
+                   'blocks': 0, 'txs': 0, 'errors': {}}
+            # 受信任的签名检查点比上一次审计完成时的链尾更新时，只审计检查点之后的区块
+            signed_checkpoint = CheckpointService.find_latest_checkpoint()
+            if signed_checkpoint is not None and (run['stop_id'] is None or
+                                                  signed_checkpoint['height'] > (checkpoint['audited_height'] or -1)):
+                logger.info('从高度为 ' + str(signed_checkpoint['height']) + ' 的检查点开始审计')
+                run['stop_id'] = signed_checkpoint['block_id']
+        else:
+            logger.info('从上一次中断处继续审计，下一个区块为：' + str(run['next_id']))
+        stop_id = run['stop_id']
+
+        start = time.time()
+        start_blocks = run['blocks']
+        start_txs = run['txs']
+        executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+        # [(Future, 这批区块中最早的区块的 pre_id), ...]，按区块链的顺序完成
+        in_flight = deque()
+
+        def finish_oldest():
+            future, next_id = in_flight.popleft()
+            for block_id, tx_count, errors in future.result():
+                run['blocks'] += 1
+                run['txs'] += tx_count
+                if errors:
+                    logger.error('区块 ' + block_id + ' 审计失败: ' + str(errors))
+                    run['errors'][block_id] = errors
+            run['next_id'] = next_id
+            checkpoint['run'] = run
+            self.save_checkpoint(checkpoint)
+
+        try:
+            if run['next_id'] is not None and run['next_id'] != stop_id:
+                for chunk in self.iter_chunks(store, run['next_id'], stop_id):
+                    last_doc = chunk[-1][0]
+                    next_id = None if Const.GENESIS_PRE_ID == last_doc['pre_id'] else last_doc['pre_id']
+                    in_flight.append((executor.submit(audit_chunk, chunk), next_id))
+                    # 限制已读取但尚未验证完的区块数
+                    if len(in_flight) >= self.processes * 2:
+                        finish_oldest()
+
+            while in_flight:
+                finish_oldest()
+        finally:
+            executor.shutdown()
+
+        elapsed = time.time() - start
+        blocks = run['blocks'] - start_blocks
+        txs = run['txs'] - start_txs
+        checkpoint['run'] = None
+        # 有区块审计失败时不记录已审计的链尾，下一次仍从链尾重新审计
+        if not run['errors']:
+            checkpoint['audited_head'] = run['head_id']
+            checkpoint['audited_height'] = run['head_height']
+        self.save_checkpoint(checkpoint)
+
+        result = {
+            'blocks': run['blocks'],
+            'txs': run['txs'],
+            'errors': run['errors'],
+            'elapsed': elapsed,
+            'blocks_per_sec': blocks / elapsed if elapsed else 0.0,
+            'txs_per_sec': txs / elapsed if elapsed else 0.0,
+        }
+        logger.info('审计完成，共审计区块 %d 个，交易单 %d 条，错误区块 %d 个，%.1f 区块/秒，%.1f 交易单/秒'
+                    % (result['blocks'], result['txs'], len(result['errors']),
+                       result['blocks_per_sec'], result['txs_per_sec']))
+        return result
+
+
+if __name__ == '__main__':
+    audit_result = ChainAuditor().run()
+    print('区块数: %d, 交易单数: %d, 错误区块数: %d' % (audit_result['blocks'], audit_result['txs'],
+                                                len(audit_result['errors'])))
+    print('%.1f 区块/秒, %.1f 交易单/秒' % (audit_result['blocks_per_sec'], audit_result['txs_per_sec']))
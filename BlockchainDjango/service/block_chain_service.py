@@ -3,7 +3,8 @@
 import logging
 
 from .block_service import BlockService
-from ..util import couchdb_util
+from .index_service import IndexService
+from .transaction_service import TransactionService
 from ..util.const import Const
 
 
@@ -30,31 +31,61 @@ class BlockChainService(object):
         :param identifier_name: 标志content中作为identifier的key的名字，默认为‘identifier’
         :return:
         """
-        db = couchdb_util.get_db(Const.DB_NAME)
-        doc = db[Const.LAST_BLOCK_ID]
-        last_block = doc['last_block_id']
-        doc = db[last_block]
-
-        while True:
-            # 若当前区块的 pre_id 为0，则表示便利整个区块链后，均未找到 id 为 所查询 id 的病人返回 none
-            # 创世区块不存储transaction， 跳过
-            if '0000000000000000000000000000000000000000000000000000000000000000' == doc['pre_id']:
+        # 建立了身份索引的字段直接通过索引查找
+        if IndexService.is_identity_indexed(tx_type, identifier_name):
+            entry = IndexService.find_identity(tx_type, identifier, identifier_name)
+            if entry is None:
                 return None
 
-            tx_list = doc['tx_list']
-            # tx 保存了 一个Transaction 的 ID
-            for tx in tx_list:
-                tx_doc = db[tx]
-                transaction_dict = tx_doc['Transaction']
+            transaction_dict = TransactionService.find_tx_by_id(entry['tx_id'])
+            content_dict = transaction_dict['content']
+            content_dict['transaction_id'] = transaction_dict['id']
+            content_dict['block_id'] = entry['block_id']
+            logger.info('Find ' + identifier + ', in transaction ' +
+                        transaction_dict['id'] + ', in block ' + entry['block_id'])
+            return content_dict
 
+        # 未建立索引的字段，则遍历区块链查找，每个区块的交易单通过一次批量请求获取，
+        # identifier_name 为 Bloom 过滤器所包含的字段时，跳过过滤器判断为不包含 identifier 的区块
+        bloom_key = str(identifier) if identifier_name in Const.BLOOM_FIELDS else None
+        for block_doc, tx_dicts in BlockService.iter_block_txs(bloom_key):
+            for transaction_dict in tx_dicts:
                 if tx_type == transaction_dict['tx_type']:
                     content_dict = transaction_dict['content']
                     if identifier == content_dict[identifier_name]:
                         content_dict['transaction_id'] = transaction_dict['id']
-                        content_dict['block_id'] = doc['_id']
+                        content_dict['block_id'] = block_doc['_id']
                         logger.info('Find ' + identifier + ', in transaction ' +
-                                    transaction_dict['id'] + ', in block ' + doc['_id'])
+                                    transaction_dict['id'] + ', in block ' + block_doc['_id'])
                         return content_dict
-                logger.info(str(transaction_dict))
 
-            doc = db[doc['pre_id']]
+        # 遍历整个区块链后，均未找到 id 为所查询 id 的内容，返回 none
+        return None
+
+    @staticmethod
+    def find_contents(identifiers, tx_type, identifier_name='identifier'):
+        """
+        批量查找多个 identifier 对应的 content，建立了身份索引时，索引与交易单各通过一次批量请求获取
+        :param identifiers: identifier 的list
+        :param tx_type:
+        :param identifier_name:
+        :return: 与 identifiers 顺序一致的 content 的dict的list，未找到的对应位置为None
+        """
+        if not IndexService.is_identity_indexed(tx_type, identifier_name):
+            return [BlockChainService.find_content(identifier, tx_type, identifier_name) for identifier in identifiers]
+
+        entries = IndexService.find_identities(tx_type, identifiers, identifier_name)
+        found_entries = [entry for entry in entries if entry is not None]
+        transaction_dicts = iter(TransactionService.find_txs_by_ids([entry['tx_id'] for entry in found_entries]))
+        content_dicts = []
+        for entry in entries:
+            if entry is None:
+                content_dicts.append(None)
+                continue
+
+            transaction_dict = next(transaction_dicts)
+            content_dict = transaction_dict['content']
+            content_dict['transaction_id'] = transaction_dict['id']
+            content_dict['block_id'] = entry['block_id']
+            content_dicts.append(content_dict)
+        return content_dicts
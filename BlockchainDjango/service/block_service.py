@@ -1,17 +1,37 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
 import logging
+import threading
 import time
-from ..util.merkle_tree import gen_merkle_tree
+from ..util.merkle_tree import gen_merkle_tree, MerkleTree, hash_leaf, verify_proof
+from ..util.lru_cache import LRUCache
+from ..util.bloom_filter import BloomFilter
 from ..entity.block import Block
-from ..util import couchdb_util
+from ..storage import get_store
+from ..storage.base import BulkSaveError
+from ..storage.cached_store import CachedStore
 from ..util.const import Const
+from ..entity.transaction import Transaction
 from .transaction_service import TransactionService
+from .index_service import IndexService
+from .group_commit import GroupCommitWriter
+from .head_pointer import HeadPointer
+from .checkpoint_service import CheckpointService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class DuplicateTxError(Exception):
+    """
+    交易单已在区块链中，或在同一区块中出现多次，tx_ids 中保存这些交易单的ID
+    """
+
+    def __init__(self, tx_ids):
+        self.tx_ids = tx_ids
+        super(DuplicateTxError, self).__init__('交易单已在区块链中: ' + str(tx_ids))
+
+
 class BlockService(object):
 
     @staticmethod
@@ -26,25 +46,38 @@ class BlockService(object):
         tree_hash = gen_merkle_tree(init_content)
         timestamp = time.time()
         tx_count = len(init_content)
-        block = Block(pre_id, tree_hash, timestamp, tx_count, init_content)
+        block = Block(pre_id, tree_hash, timestamp, tx_count, init_content, height=0)
         logger.info("创世区块的内容为： " + str(block))
-        db = couchdb_util.init_db(Const.DB_NAME)
-        couchdb_util.save(db, block.__dict__)
-        couchdb_util.save(db, {'_id': Const.LAST_BLOCK_ID, 'last_block_id': block.get_id()})
+        store = get_store()
+        store.reset()
+        # 链尾文档中同时记录链尾的高度与累积哈希，创世区块的高度为 0
+        store.put_many([block.get_header_doc(), block.get_body_doc(),
+                        {'_id': IndexService.get_height_key(0), 'block_id': block.get_id()},
+                        {'_id': Const.LAST_BLOCK_ID, 'last_block_id': block.get_id(), 'height': 0,
+                         'cum_hash': CheckpointService.calc_cum_hash('', block.get_id())}])
         return block.get_id()
 
     @staticmethod
     def add_block(param_tx_list):
         """
         用于使用init_block(param_tx_list)函数初始化区块链生成创世区块后，
-        向区块链添加新的区块
+        向区块链添加新的区块。交易单交给唯一的组提交写入线程，
+        与同一时间窗口内其他调用者提交的交易单合并为一个区块写入
         :param param_tx_list: 交易单Transaction类实例的列表
-        :return: 返回最后一个区块的ID
+        :return: 返回交易单所在区块的ID
         """
-        db = couchdb_util.get_db(Const.DB_NAME)
-        doc = db[Const.LAST_BLOCK_ID]
+        return _block_writer.submit(param_tx_list)
 
-        pre_id = doc['last_block_id']
+    @staticmethod
+    def append_block(param_tx_list):
+        """
+        将交易单写入一个新的区块并更新链尾区块，只能由组提交写入线程调用
+        :param param_tx_list: 交易单Transaction类实例的列表
+        :return: 返回最后一个区块的ID
+        :raise DuplicateTxError: 有交易单已在区块链中，此时没有写入任何文档
+        :raise BulkSaveError: 写入区块失败，已写入的文档已被删除，可以重试
+        """
+        store = get_store()
 
         # 将 Transaction 实例列表转化为 实例转为json字符串后的列表
         tx_strs = []
@@ -55,33 +88,456 @@ class BlockService(object):
         timestamp = time.time()
         tx_count = len(param_tx_list)
         tx_ids = TransactionService.get_tx_ids(param_tx_list)
+        tx_docs = [TransactionService.gen_tx_doc(each_tx) for each_tx in param_tx_list]
+        stored_docs = store.get_many(tx_ids)
+        duplicate_ids = BlockService.find_duplicate_tx_ids(tx_docs, stored_docs)
+        if duplicate_ids:
+            raise DuplicateTxError(duplicate_ids)
+        # 交易单 Transaction 与第一次尝试的区块通过一次批量写入保存，重新链接时只需重写区块。
+        # 之前写入失败时留下的、内容相同且不在任何区块中的交易单不需要重新写入
+        new_tx_docs = [tx_doc for tx_doc, stored_doc in zip(tx_docs, stored_docs) if stored_doc is None]
+        bloom = BlockService.gen_bloom(param_tx_list)
+        saved_blocks = []
 
-        block = Block(pre_id, tree_hash, timestamp, tx_count, tx_ids)
-        # 保存区块到数据库中
-        couchdb_util.save(db, block.__dict__)
-        # 保存交易单 Transaction 到数据库中
-        TransactionService.save_tx_list(param_tx_list)
+        def save_block(pre_id, height):
+            block = Block(pre_id, tree_hash, timestamp, tx_count, tx_ids, height, bloom)
+            # 写入失败时抛出 BulkSaveError，此时链尾区块尚未更新，调用者可以重试
+            docs = [block.get_header_doc(), block.get_body_doc()]
+            if not saved_blocks:
+                docs.extend(new_tx_docs)
+            try:
+                store.put_many(docs)
+            except BulkSaveError as e:
+                # 批量写入不是原子的，删除本次已写入成功的文档，不留下不在任何区块中的交易单
+                BlockService.delete_written_docs(store, docs, e.failed_ids)
+                raise
+            # 上一次尝试的区块已不会被链接到链上，将其区块头与区块体删除
+            if saved_blocks:
+                for doc in saved_blocks.pop():
+                    store.delete(doc)
+            saved_blocks.append(docs[:2])
+            return block.get_id()
 
-        # 更新最后一个区块的ID
-        doc['last_block_id'] = block.get_id()
-        db[Const.LAST_BLOCK_ID] = doc
-        return doc['last_block_id']
+        # 以 CAS 的方式更新最后一个区块的ID，冲突时以新的链尾为 pre_id 重新写入区块
+        head_doc = _head_pointer.link(store, save_block)
+        block_id = head_doc['last_block_id']
+
+        # 链尾更新成功后才更新索引。此时区块已在链上，索引更新失败也不能抛出异常，
+        # 失败的区块按顺序排队，在之后的区块写入时重试，直到 rebuild_indexes 重建索引
+        _pending_indexes.add(param_tx_list, block_id, head_doc.get('height'))
+        BlockService.update_pending_indexes(store)
+
+        # 每 CHECKPOINT_INTERVAL 个区块生成一个签名的检查点，生成失败不影响区块的写入
+        if head_doc.get('height') and head_doc['height'] % Const.CHECKPOINT_INTERVAL == 0:
+            try:
+                CheckpointService.create_checkpoint(store, head_doc['height'], block_id, head_doc['cum_hash'])
+            except Exception as e:
+                logger.error('生成检查点失败: ' + str(e))
+        return block_id
 
     @staticmethod
-    def show_block_chain():
-        db = couchdb_util.get_db(Const.DB_NAME)
-        doc = db[Const.LAST_BLOCK_ID]
-        last_block = doc['last_block_id']
-        doc = db[last_block]
-        block_count = 1
-        print('区块：' + doc['_id'] + ' 的前一个区块ID为：' + doc['pre_id'])
+    def find_duplicate_tx_ids(tx_docs, stored_docs):
+        """
+        返回不能写入新区块的交易单ID：在 tx_docs 中出现多次的，已在区块链中的(交易单索引中有记录或正等待更新索引)，
+        以及存储中已有同一ID但内容不同的交易单。
+        存储中内容相同、但不在任何区块中的交易单是之前写入失败时留下的，可以写入新区块
+        :param tx_docs: 待写入的交易单文档的list
+        :param stored_docs: 与 tx_docs 顺序一致的、存储中已有的同一ID的文档，不存在时为None
+        :return: 交易单ID的list
+        """
+        duplicate_ids = []
+        seen_ids = set()
+        for tx_doc in tx_docs:
+            if tx_doc['_id'] in seen_ids:
+                duplicate_ids.append(tx_doc['_id'])
+            seen_ids.add(tx_doc['_id'])
 
-        while True:
-            doc = db[doc['pre_id']]
-            print('区块：' + doc['_id'] + ' 的前一个区块ID为：' + doc['pre_id'])
-            block_count += 1
+        stored = [(tx_doc, stored_doc) for tx_doc, stored_doc in zip(tx_docs, stored_docs) if stored_doc is not None]
+        if not stored:
+            return duplicate_ids
+
+        pending_tx_ids = _pending_indexes.get_tx_ids()
+        tx_blocks = IndexService.find_tx_blocks([tx_doc['_id'] for tx_doc, _ in stored])
+        for (tx_doc, stored_doc), tx_block in zip(stored, tx_blocks):
+            if tx_block is not None or tx_doc['_id'] in pending_tx_ids or \
+                    stored_doc.get('Transaction') != tx_doc['Transaction']:
+                duplicate_ids.append(tx_doc['_id'])
+        return duplicate_ids
 
-            if '0000000000000000000000000000000000000000000000000000000000000000' == doc['pre_id']:
+    @staticmethod
+    def delete_written_docs(store, docs, failed_ids):
+        """
+        批量写入部分失败后，删除 docs 中已写入成功的文档
+        :param store:
+        :param docs: 批量写入的文档，写入成功的文档中已设置 _rev
+        :param failed_ids: 写入失败的文档ID
+        :return:
+        """
+        failed_ids = set(failed_ids)
+        for doc in docs:
+            if doc['_id'] in failed_ids or '_rev' not in doc:
+                continue
+            try:
+                store.delete(doc)
+            except Exception as e:
+                logger.error('删除写入失败的区块中已写入的文档 ' + doc['_id'] + ' 失败: ' + str(e))
+            del doc['_rev']
+
+    @staticmethod
+    def update_pending_indexes(store):
+        """
+        按区块加入区块链的顺序更新排队中的区块的索引，遇到更新失败的区块即停止，
+        保证后加入的区块的身份索引不会被之前的区块覆盖
+        :param store:
+        :return: 仍在排队的区块数
+        """
+        for tx_list, block_id, height in _pending_indexes.peek_all():
+            try:
+                IndexService.update_indexes(store, tx_list, block_id, height)
+            except Exception as e:
+                logger.error('更新区块 ' + block_id + ' 的索引失败，之后重试或通过 rebuild_indexes 重建: ' + str(e))
                 break
+            _pending_indexes.remove(block_id)
+        return _pending_indexes.get_count()
+
+    @staticmethod
+    def get_bloom_keys(tx_id, content):
+        """
+        返回交易单中需要加入区块 Bloom 过滤器的标识符：交易单的 id 及 content 中 BLOOM_FIELDS 字段的值
+        :param tx_id:
+        :param content: 交易单的 content
+        :return:
+        """
+        keys = [tx_id]
+        if isinstance(content, dict):
+            keys.extend(str(content[field]) for field in Const.BLOOM_FIELDS if field in content)
+        return keys
+
+    @staticmethod
+    def gen_bloom(tx_list):
+        """
+        生成区块中交易单所含标识符的 Bloom 过滤器
+        :param tx_list: Transaction类实例的列表
+        :return: Bloom 过滤器的dict
+        """
+        keys = [key for tx in tx_list for key in BlockService.get_bloom_keys(tx.id, tx.content)]
+        bloom = BloomFilter.create(len(keys), Const.BLOOM_FP_RATE)
+        for key in keys:
+            bloom.add(key)
+        return bloom.to_dict()
+
+    @staticmethod
+    def get_stats():
+        """
+        返回组提交写入、链尾区块 CAS 更新、等待更新索引的区块数与区块读缓存的统计信息
+        :return:
+        """
+        stats = _block_writer.get_stats()
+        stats.update(_head_pointer.get_stats())
+        stats['pending_index_blocks'] = _pending_indexes.get_count()
+        store = get_store()
+        if isinstance(store, CachedStore):
+            stats.update(store.get_cache_stats())
+        return stats
+
+    @staticmethod
+    def get_block_tx_ids(block_docs):
+        """
+        返回各区块的 tx_list，区块体通过一次批量请求获取。
+        区块头与区块体分开存储之前的区块，tx_list 直接保存在区块文档中
+        :param block_docs: 区块头文档的list
+        :return: 与 block_docs 顺序一致的 tx_list 的list
+        """
+        body_ids = [Block.get_body_id(block_doc['_id']) for block_doc in block_docs if 'tx_list' not in block_doc]
+        body_docs = iter(get_store().get_many(body_ids))
+
+        tx_id_lists = []
+        for block_doc in block_docs:
+            if 'tx_list' in block_doc:
+                tx_id_lists.append(block_doc['tx_list'])
+                continue
+
+            body_doc = next(body_docs)
+            if body_doc is None:
+                raise Exception('区块 ' + block_doc['_id'] + ' 的区块体不存在！')
+            tx_id_lists.append(body_doc['tx_list'])
+        return tx_id_lists
+
+    @staticmethod
+    def iter_blocks():
+        """
+        从链尾开始向前遍历区块链，依次返回各区块的区块头文档，不包括不存储transaction的创世区块
+        :return:
+        """
+        store = get_store()
+        doc = store[store.get_head()['last_block_id']]
+
+        while Const.GENESIS_PRE_ID != doc['pre_id']:
+            yield doc
+            doc = store[doc['pre_id']]
+
+    @staticmethod
+    def iter_block_txs(key=None):
+        """
+        从链尾开始向前遍历区块链，依次返回 (区块文档, 区块中Transaction的dict的list)，
+        每个区块的 tx_list 通过一次批量请求获取。
+        指定 key 时，跳过 Bloom 过滤器判断为不包含 key 的区块，只读取这些区块的区块头
+        :param key: 要查找的标识符，如 identifier, patient_id, tx_id 等
+        :return:
+        """
+        for block_doc in BlockService.iter_blocks():
+            has_bloom = key is not None and 'bloom' in block_doc
+            if has_bloom and key not in BloomFilter.from_dict(block_doc['bloom']):
+                _scan_stats.incr('blocks_skipped')
+                continue
+
+            tx_ids = BlockService.get_block_tx_ids([block_doc])[0]
+            tx_dicts = TransactionService.find_txs_by_ids(tx_ids)
+            _scan_stats.incr('blocks_scanned')
+            if has_bloom and not any(key in BlockService.get_bloom_keys(tx_dict['id'], tx_dict['content'])
+                                     for tx_dict in tx_dicts):
+                _scan_stats.incr('false_positives')
+            yield block_doc, tx_dicts
+
+    @staticmethod
+    def get_scan_stats():
+        """
+        返回遍历区块链查找时 Bloom 过滤器的统计信息，
+        false_positive_rate 为不包含 key 的区块中被 Bloom 过滤器误判为可能包含的比例
+        :return:
+        """
+        stats = _scan_stats.get_stats()
+        negatives = stats['blocks_skipped'] + stats['false_positives']
+        stats['false_positive_rate'] = stats['false_positives'] / negatives if negatives else 0.0
+        return stats
+
+    @staticmethod
+    def rebuild_indexes():
+        """
+        从创世区块开始按顺序重新建立索引，用于为建立索引之前就已存在的区块链补建索引
+        :return:
+        """
+        store = get_store()
+        blocks = list(BlockService.iter_block_txs())
+
+        # 创世区块的高度为 0
+        for height, (block_doc, tx_dicts) in enumerate(reversed(blocks), 1):
+            tx_list = []
+            for tx_dict in tx_dicts:
+                tx_obj = Transaction()
+                tx_obj.init_tx_by_dict(tx_dict)
+                tx_list.append(tx_obj)
+            IndexService.update_indexes(store, tx_list, block_doc['_id'], height)
+        genesis_id = blocks[-1][0]['pre_id'] if blocks else store.get_head()['last_block_id']
+        IndexService.update_indexes(store, [], genesis_id, 0)
+        _pending_indexes.clear()
+
+        logger.info('索引重建完成，共处理区块 ' + str(len(blocks)) + ' 个')
+
+    @staticmethod
+    def compact_store(revs_limit=Const.HEAD_REVS_LIMIT):
+        """
+        维护操作：限制每个文档保留的历史 revision 个数并压缩存储，回收链尾与索引文档的旧 revision。
+        CouchDB 的 revs_limit 对整个数据库生效，应在写入较少时手动执行
+        :param revs_limit: 每个文档保留的历史 revision 个数
+        :return:
+        """
+        get_store().compact(revs_limit)
+        logger.info('存储压缩完成，每个文档保留的历史 revision 个数为 ' + str(revs_limit))
+
+    @staticmethod
+    def get_block_header(block_doc):
+        """
+        :param block_doc: 区块文档
+        :return: 区块头，即验证区块ID与 Merkle 根所需的字段
+        """
+        return {
+            'id': block_doc['_id'],
+            'pre_id': block_doc['pre_id'],
+            'tree_hash': block_doc['tree_hash'],
+            'time_stamp': block_doc['time_stamp'],
+            'tx_count': block_doc['tx_count'],
+            'height': block_doc.get('height'),
+        }
+
+    @staticmethod
+    def get_merkle_tree(block_doc):
+        """
+        返回区块的 Merkle 树，区块不可修改，因此按区块ID缓存
+        :param block_doc: 区块文档
+        :return:
+        """
+        tree = _merkle_tree_cache.get(block_doc['_id'])
+        if tree is None:
+            tx_dicts = TransactionService.find_txs_by_ids(BlockService.get_block_tx_ids([block_doc])[0])
+            tree = MerkleTree([TransactionService.get_tx_str(tx_dict) for tx_dict in tx_dicts])
+            _merkle_tree_cache.put(block_doc['_id'], tree)
+        return tree
+
+    @staticmethod
+    def get_tx_proof(tx_id):
+        """
+        生成交易单的 Merkle 包含证明，验证者只需区块头与 O(log n) 个摘要即可确认交易单在区块中
+        :param tx_id:
+        :return: {'tx_id', 'block_id', 'header', 'index', 'leaf_hash', 'proof'}，交易单不存在时返回None
+        """
+        entry = IndexService.find_tx_block(tx_id)
+        if entry is None:
+            return None
+
+        block_doc = get_store()[entry['block_id']]
+        tree = BlockService.get_merkle_tree(block_doc)
+        return {
+            'tx_id': tx_id,
+            'block_id': block_doc['_id'],
+            'header': BlockService.get_block_header(block_doc),
+            'index': entry['index'],
+            'leaf_hash': tree.leaves[entry['index']].hex(),
+            'proof': tree.get_proof(entry['index']),
+        }
+
+    @staticmethod
+    def verify_tx_proof(tx_proof, tx_dict=None):
+        """
+        验证 get_tx_proof 生成的包含证明：区块头的哈希是否等于区块ID，Merkle 路径是否能得到区块头中的 tree_hash
+        :param tx_proof:
+        :param tx_dict: 交易单 Transaction 的dict，提供时同时验证其内容与证明中的叶子一致
+        :return:
+        """
+        header = tx_proof['header']
+        if header['id'] != tx_proof['block_id'] or \
+                Block.calc_id(header['pre_id'], header['tree_hash'], header['time_stamp']) != header['id']:
+            return False
+
+        if tx_dict is not None and hash_leaf(TransactionService.get_tx_str(tx_dict)) != tx_proof['leaf_hash']:
+            return False
+
+        return verify_proof(tx_proof['proof'], tx_proof['leaf_hash'], header['tree_hash'])
+
+    @staticmethod
+    def get_chain_length():
+        """
+        返回区块链的长度(包括创世区块)，由链尾文档中记录的高度得到，
+        记录高度之前创建的区块链则遍历区块链计算
+        :return:
+        """
+        head_doc = get_store().get_head()
+        if 'height' in head_doc:
+            return head_doc['height'] + 1
+
+        return sum(1 for _ in BlockService.iter_blocks()) + 1
+
+    @staticmethod
+    def get_block_by_height(height):
+        """
+        根据高度索引返回该高度的区块头文档，不存在时返回None
+        :param height: 区块高度，创世区块为 0
+        :return:
+        """
+        block_id = IndexService.find_block_ids([height])[0]
+        if block_id is None:
+            return None
+
+        return get_store()[block_id]
+
+    @staticmethod
+    def get_blocks(start, end):
+        """
+        读取高度在 [start, end) 之间的区块头，高度索引与区块头各通过一次批量请求获取，区块体可通过 get_block_tx_ids 读取
+        :param start:
+        :param end:
+        :return: 按高度从低到高排列的区块头文档的list，只包含链上已存在的高度
+        """
+        block_ids = [block_id for block_id in IndexService.find_block_ids(list(range(start, end)))
+                     if block_id is not None]
+        return get_store().get_many(block_ids)
+
+    @staticmethod
+    def show_block_chain(chunk_size=100):
+        store = get_store()
+        head_doc = store.get_head()
+        # 记录高度之前创建的区块链，从链尾开始逐个读取区块
+        if 'height' not in head_doc:
+            doc = store[head_doc['last_block_id']]
+            block_count = 1
+            print('区块：' + doc['_id'] + ' 的前一个区块ID为：' + doc['pre_id'])
+
+            while Const.GENESIS_PRE_ID != doc['pre_id']:
+                doc = store[doc['pre_id']]
+                print('区块：' + doc['_id'] + ' 的前一个区块ID为：' + doc['pre_id'])
+                block_count += 1
+
+            print("当前区块链长度为：", block_count)
+            return
+
+        # 按高度从链尾开始，每次批量读取 chunk_size 个区块
+        end = head_doc['height'] + 1
+        while end > 0:
+            start = max(end - chunk_size, 0)
+            for doc in reversed(BlockService.get_blocks(start, end)):
+                print('区块：' + doc['_id'] + ' 的前一个区块ID为：' + doc['pre_id'])
+            end = start
+
+        print("当前区块链长度为：", head_doc['height'] + 1)
+
+
+class _ScanStats(object):
+    """线程安全的遍历区块链计数器"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {'blocks_scanned': 0, 'blocks_skipped': 0, 'false_positives': 0}
+
+    def incr(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class _PendingIndexes(object):
+    """线程安全的、按加入区块链的顺序排列的等待更新索引的区块队列"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # [(交易单Transaction类实例的列表, 区块ID, 区块高度), ...]
+        self.blocks = []
+
+    def add(self, tx_list, block_id, height):
+        with self.lock:
+            self.blocks.append((tx_list, block_id, height))
+
+    def peek_all(self):
+        with self.lock:
+            return list(self.blocks)
+
+    def get_tx_ids(self):
+        with self.lock:
+            return {tx.id for tx_list, _, _ in self.blocks for tx in tx_list}
+
+    def remove(self, block_id):
+        with self.lock:
+            self.blocks = [block for block in self.blocks if block[1] != block_id]
+
+    def clear(self):
+        with self.lock:
+            self.blocks = []
+
+    def get_count(self):
+        with self.lock:
+            return len(self.blocks)
+
 
-        print("当前区块链长度为：", block_count)
+# 遍历区块链时 Bloom 过滤器的统计
+_scan_stats = _ScanStats()
+# 链尾已更新而索引尚未更新成功的区块
+_pending_indexes = _PendingIndexes()
+# 按区块ID缓存的 Merkle 树
+_merkle_tree_cache = LRUCache(Const.MERKLE_TREE_CACHE_SIZE)
+# 进程内共用的链尾区块ID管理器
+_head_pointer = HeadPointer()
+# 所有 add_block 调用共用的组提交写入器
+_block_writer = GroupCommitWriter(BlockService.append_block,
+                                  window=Const.GROUP_COMMIT_WINDOW, max_txs=Const.GROUP_COMMIT_MAX_TXS)
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import hashlib
+import logging
+
+from ..entity.checkpoint import Checkpoint
+from ..storage import get_store
+from ..util.const import Const
+from ..util.signature import Signature
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CheckpointService(object):
+
+    @staticmethod
+    def calc_cum_hash(pre_cum_hash, block_id):
+        """
+        计算累积哈希：cum_hash(n) = sha256(cum_hash(n - 1) + block_id(n))，创世区块的 pre_cum_hash 为空字符串
+        :param pre_cum_hash:
+        :param block_id:
+        :return:
+        """
+        return hashlib.sha256(bytes(pre_cum_hash + block_id, encoding='utf-8')).hexdigest()
+
+    @staticmethod
+    def gen_checkpoint(height, block_id, cum_hash):
+        """
+        生成一个由本节点私钥签名的检查点
+        :param height:
+        :param block_id:
+        :param cum_hash:
+        :return: Checkpoint 对象
+        """
+        pvt_key, pub_key = Signature.get_key_pair()
+        checkpoint = Checkpoint(height, block_id, cum_hash, bytes.hex(pub_key.to_string()))
+        checkpoint.signature = bytes.hex(Signature.sign(pvt_key, checkpoint.get_sign_content()))
+        return checkpoint
+
+    @staticmethod
+    def verify_checkpoint(checkpoint_dict, trusted_pub_keys=None):
+        """
+        验证检查点的签名，且签名者必须是受信任的节点
+        :param checkpoint_dict: 检查点文档
+        :param trusted_pub_keys: 受信任的公钥 hex 字符串的集合，默认只信任本节点的公钥
+        :return:
+        """
+        if trusted_pub_keys is None:
+            _, pub_key = Signature.get_key_pair()
+            trusted_pub_keys = {bytes.hex(pub_key.to_string())}
+        if checkpoint_dict['pub_key'] not in trusted_pub_keys:
+            return False
+
+        checkpoint = Checkpoint(checkpoint_dict['height'], checkpoint_dict['block_id'], checkpoint_dict['cum_hash'])
+        try:
+            vk = Signature.get_verifying_key(checkpoint_dict['pub_key'])
+            return vk.verify(bytes.fromhex(checkpoint_dict['signature']),
+                             checkpoint.get_sign_content().encode('utf-8'))
+        except Exception:
+            # 签名错误时 ecdsa 会抛出 BadSignatureError
+            return False
+
+    @staticmethod
+    def save_checkpoint(store, checkpoint):
+        """
+        保存检查点，并将其记录为最新的检查点
+        :param store:
+        :param checkpoint: Checkpoint 对象
+        :return:
+        """
+        latest = store.get(Const.LATEST_CHECKPOINT_ID) or {'_id': Const.LATEST_CHECKPOINT_ID}
+        # 并发写入时，只保留高度最大的检查点为最新的检查点
+        if latest.get('height', -1) >= checkpoint.height:
+            store.put_many([checkpoint.__dict__])
+            return
+
+        latest.update(height=checkpoint.height, checkpoint_id=checkpoint._id)
+        store.put_many([checkpoint.__dict__, latest])
+        logger.info('生成检查点，高度为：' + str(checkpoint.height) + '，区块ID为：' + checkpoint.block_id)
+
+    @staticmethod
+    def create_checkpoint(store, height, block_id, cum_hash):
+        """
+        生成、签名并保存检查点
+        :param store:
+        :param height:
+        :param block_id:
+        :param cum_hash:
+        :return: Checkpoint 对象
+        """
+        checkpoint = CheckpointService.gen_checkpoint(height, block_id, cum_hash)
+        CheckpointService.save_checkpoint(store, checkpoint)
+        return checkpoint
+
+    @staticmethod
+    def find_latest_checkpoint(trusted_pub_keys=None):
+        """
+        返回最新的、签名正确的检查点文档，没有检查点或签名错误时返回None
+        :param trusted_pub_keys: 受信任的公钥 hex 字符串的集合，默认只信任本节点的公钥
+        :return:
+        """
+        store = get_store()
+        latest = store.get(Const.LATEST_CHECKPOINT_ID)
+        if latest is None:
+            return None
+
+        checkpoint_dict = store[latest['checkpoint_id']]
+        if not CheckpointService.verify_checkpoint(checkpoint_dict, trusted_pub_keys):
+            logger.error('检查点 ' + latest['checkpoint_id'] + ' 的签名错误')
+            return None
+        return checkpoint_dict
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from .transaction_service import TransactionService
+from .doctor_service import DoctorService
+from .patient_service import PatientService
+
+
+class DataLoader(object):
+    """
+    合并同一请求中的查找：先通过 prime 收集需要的 key，再通过 batch_func 一次批量查找所有未查找过的 key，
+    查找结果在请求期间被缓存，同一个 key 只查找一次
+    """
+
+    def __init__(self, batch_func):
+        """
+        :param batch_func: 批量查找函数，参数为 key 的list，返回与其顺序一致的值的list
+        """
+        self.batch_func = batch_func
+        self.cache = {}
+        # 按登记顺序保存待查找的 key
+        self.pending = {}
+        self.batches = 0
+
+    def prime(self, keys):
+        """
+        登记之后需要查找的 key，在下一次 dispatch 时一起查找
+        :param keys:
+        :return:
+        """
+        for key in keys:
+            if key not in self.cache:
+                self.pending[key] = None
+
+    def dispatch(self):
+        """
+        批量查找所有已登记而未查找的 key
+        :return:
+        """
+        if not self.pending:
+            return
+
+        keys = list(self.pending)
+        self.pending = {}
+        self.cache.update(zip(keys, self.batch_func(keys)))
+        self.batches += 1
+
+    def load_many(self, keys):
+        """
+        :param keys:
+        :return: 与 keys 顺序一致的值的list
+        """
+        self.prime(keys)
+        self.dispatch()
+        return [self.cache[key] for key in keys]
+
+    def load(self, key):
+        return self.load_many([key])[0]
+
+
+class RequestLoaders(object):
+    """
+    一次请求中使用的各个 DataLoader：按 identifier 查找医生、病人，按交易单ID查找交易单的 content
+    """
+
+    def __init__(self):
+        self.doctors = DataLoader(DoctorService.find_by_ids)
+        self.patients = DataLoader(PatientService.find_by_ids)
+        self.tx_contents = DataLoader(TransactionService.find_contents_by_ids)
+
+    @staticmethod
+    def get(request):
+        """
+        返回 request 对应的 RequestLoaders，同一请求中多次调用返回同一个对象
+        :param request:
+        :return:
+        """
+        loaders = getattr(request, '_request_loaders', None)
+        if loaders is None:
+            loaders = RequestLoaders()
+            request._request_loaders = loaders
+        return loaders
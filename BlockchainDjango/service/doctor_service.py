@@ -3,8 +3,7 @@
 import logging
 from .transaction_service import TransactionService
 from .block_service import BlockService
-from ..util import couchdb_util
-from ..util.const import Const
+from .block_chain_service import BlockChainService
 from ..entity.doctor import Doctor
 
 logging.basicConfig(level=logging.INFO)
@@ -32,34 +31,16 @@ class DoctorService(object):
         :param identifier:
         :return:
         """
-        db = couchdb_util.get_db(Const.DB_NAME)
-        doc = db[Const.LAST_BLOCK_ID]
-        last_block = doc['last_block_id']
-        doc = db[last_block]
+        return BlockChainService.find_content(identifier, 'doctor')
 
-        while True:
-            # 若当前区块的 pre_id 为0，则表示便利整个区块链后，均未找到 id 为 所查询 id 的病人返回 none
-            # 创世区块不存储transaction， 跳过
-            if '0000000000000000000000000000000000000000000000000000000000000000' == doc['pre_id']:
-                return None
-
-            tx_list = doc['tx_list']
-            # tx 保存了 一个Transaction 的 ID
-            for tx in tx_list:
-                tx_doc = db[tx]
-                transaction_dict = tx_doc['Transaction']
-
-                if 'doctor' == transaction_dict['tx_type']:
-                    content_dict = transaction_dict['content']
-                    if identifier == content_dict['identifier']:
-                        content_dict['transaction_id'] = transaction_dict['id']
-                        content_dict['block_id'] = doc['_id']
-                        logger.info('Find doctor ' + identifier + ', in transaction ' +
-                                    transaction_dict['id'] + ', in block ' + doc['_id'])
-                        return content_dict
-                logger.info(str(transaction_dict))
-
-            doc = db[doc['pre_id']]
+    @staticmethod
+    def find_by_ids(identifiers):
+        """
+        批量查找多个医生，返回与 identifiers 顺序一致的医生信息的dict的list，未找到的对应位置为None
+        :param identifiers:
+        :return:
+        """
+        return BlockChainService.find_contents(identifiers, 'doctor')
 
     @staticmethod
     def gen_instance_by_dict(doctor_dict):
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter(object):
+    """
+    组提交写入器：并发的调用者把交易单交给唯一的写入线程，
+    写入线程将一个短时间窗口内到达的交易单合并为一个区块，由 append_func 写入区块链，
+    同一时间只有一个线程读取、更新链尾区块，不会再出现并发覆盖链尾导致的分叉
+    """
+
+    def __init__(self, append_func, window=0.005, max_txs=500):
+        """
+        :param append_func: 将交易单列表写入一个区块并返回区块ID的函数
+        :param window: 第一批交易单到达后，等待后续交易单合并进同一区块的最长时间(秒)
+        :param max_txs: 每个区块最多包含的交易单数
+        """
+        self.append_func = append_func
+        self.window = window
+        self.max_txs = max_txs
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.blocks_written = 0
+        self.txs_written = 0
+        self.failures = 0
+
+    def submit(self, tx_list):
+        """
+        提交一批交易单，阻塞直到其所在的区块写入完成
+        :param tx_list: Transaction 对象的list
+        :return: 交易单所在区块的ID，写入失败时抛出写入时的异常
+        """
+        future = Future()
+        self._get_queue().put((list(tx_list), future))
+        return future.result()
+
+    def _get_queue(self):
+        # fork 出的子进程中没有写入线程，需要重新创建
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid():
+                self.queue = queue.Queue()
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self.thread.start()
+            return self.queue
+
+    def _collect(self, work_queue):
+        """
+        取出一组待写入的请求：阻塞等待第一个请求，再在 window 时间内继续收集，直到交易单数达到 max_txs
+        :param work_queue:
+        :return: [(tx_list, Future), ...]
+        """
+        group = [work_queue.get()]
+        tx_count = len(group[0][0])
+        deadline = time.time() + self.window
+        while tx_count < self.max_txs:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    item = work_queue.get(timeout=remaining)
+                else:
+                    # 窗口已过，只取走已经在排队的请求
+                    item = work_queue.get_nowait()
+            except queue.Empty:
+                break
+            group.append(item)
+            tx_count += len(item[0])
+        return group
+
+    def _run(self):
+        work_queue = self.queue
+        while True:
+            self._write(self._collect(work_queue))
+
+    def _write(self, group):
+        """
+        将一组请求的交易单写入一个区块。写入失败时只让导致失败的调用者失败：
+        异常的 tx_ids 指出了出错的交易单时，去掉包含这些交易单的调用者后重新写入其余调用者的交易单，
+        否则将各调用者的交易单分别写入
+        :param group: [(tx_list, Future), ...]
+        :return:
+        """
+        tx_list = [tx for each_tx_list, _ in group for tx in each_tx_list]
+        try:
+            block_id = self.append_func(tx_list)
+        except Exception as e:
+            self.failures += 1
+            logger.error('组提交写入区块失败: ' + str(e))
+            if len(group) == 1:
+                group[0][1].set_exception(e)
+                return
+
+            failed_ids = set(getattr(e, 'tx_ids', ()))
+            failed = [item for item in group if any(getattr(tx, 'id', tx) in failed_ids for tx in item[0])]
+            if failed and len(failed) < len(group):
+                for _, future in failed:
+                    future.set_exception(e)
+                self._write([item for item in group if item not in failed])
+            else:
+                for item in group:
+                    self._write([item])
+            return
+
+        self.blocks_written += 1
+        self.txs_written += len(tx_list)
+        for _, future in group:
+            future.set_result(block_id)
+
+    def get_stats(self):
+        avg_txs = self.txs_written / self.blocks_written if self.blocks_written else 0.0
+        return {
+            'blocks_written': self.blocks_written,
+            'txs_written': self.txs_written,
+            'avg_txs_per_block': avg_txs,
+            'failures': self.failures,
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+        }
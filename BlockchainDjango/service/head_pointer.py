@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import logging
+import threading
+
+from ..util.const import Const
+from .checkpoint_service import CheckpointService
+
+logger = logging.getLogger(__name__)
+
+
+class HeadConflictError(Exception):
+    """重试 max_retries 次后仍未能将新区块链接到链尾"""
+
+
+class HeadPointer(object):
+    """
+    管理保存链尾区块ID的文档 last_block：以文档的 _rev 做 compare-and-swap 更新，
+    其他写入者先更新了链尾时，将待写入的区块重新链接到新的链尾后重试；
+    设置 compact_interval 时定期压缩存储，避免 last_block 的历史 revision 无限增长
+    """
+
+    def __init__(self, max_retries=Const.HEAD_CAS_MAX_RETRIES, compact_interval=Const.HEAD_COMPACT_INTERVAL,
+                 revs_limit=Const.HEAD_REVS_LIMIT):
+        """
+        :param max_retries: CAS 冲突时的最大重试次数
+        :param compact_interval: 每成功更新链尾多少次压缩一次存储，为 0 时(默认)不在写入时压缩
+        :param revs_limit: 压缩前设置的每个文档保留的历史 revision 个数
+        """
+        self.max_retries = max_retries
+        self.compact_interval = compact_interval
+        self.revs_limit = revs_limit
+        self.lock = threading.Lock()
+        self.advances = 0
+        self.conflicts = 0
+        self.retries = 0
+        self.compactions = 0
+
+    def advance(self, store, head_doc, block_id):
+        """
+        以 head_doc 的 _rev 将链尾更新为 block_id，同时更新链尾的高度与累积哈希
+        :param store:
+        :param head_doc: 读取到的 last_block 文档
+        :param block_id: 新的链尾区块ID
+        :return: 更新成功返回更新后的 last_block 文档，链尾已被其他写入者更新时返回 None
+        """
+        new_doc = dict(head_doc)
+        new_doc['last_block_id'] = block_id
+        # 记录高度之前创建的区块链没有高度与累积哈希
+        if 'height' in head_doc:
+            new_doc['height'] = head_doc['height'] + 1
+            new_doc['cum_hash'] = CheckpointService.calc_cum_hash(head_doc['cum_hash'], block_id)
+        if not store.swap_head(new_doc):
+            with self.lock:
+                self.conflicts += 1
+            return None
+
+        with self.lock:
+            self.advances += 1
+            need_compact = self.compact_interval and self.advances % self.compact_interval == 0
+        if need_compact:
+            self.compact(store)
+        return new_doc
+
+    def link(self, store, save_block):
+        """
+        将新区块链接到链尾：读取链尾，由 save_block 以链尾为 pre_id 写入区块，再 CAS 更新链尾，冲突时重新链接
+        :param store:
+        :param save_block: 以 pre_id 和新区块的高度为参数写入区块并返回区块ID的函数，重试时会以新的链尾再次调用，
+                           记录高度之前创建的区块链，高度为 None
+        :return: 更新后的 last_block 文档
+        :raise HeadConflictError: 重试 max_retries 次后仍然冲突
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self.lock:
+                    self.retries += 1
+            head_doc = store.get_head()
+            pre_id = head_doc['last_block_id']
+            height = head_doc['height'] + 1 if 'height' in head_doc else None
+            block_id = save_block(pre_id, height)
+            new_head_doc = self.advance(store, head_doc, block_id)
+            if new_head_doc is not None:
+                return new_head_doc
+            logger.info('链尾区块已被更新，将区块重新链接到新的链尾，重试次数: ' + str(attempt + 1))
+
+        raise HeadConflictError('重试 ' + str(self.max_retries) + ' 次后仍未能更新链尾区块')
+
+    def compact(self, store):
+        """
+        限制每个文档保留的历史 revision 个数并压缩存储，压缩失败不影响写入
+        :param store:
+        :return:
+        """
+        try:
+            store.compact(self.revs_limit)
+        except Exception as e:
+            logger.error('压缩存储失败: ' + str(e))
+            return
+
+        with self.lock:
+            self.compactions += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'head_advances': self.advances,
+                'head_conflicts': self.conflicts,
+                'head_retries': self.retries,
+                'compactions': self.compactions,
+            }
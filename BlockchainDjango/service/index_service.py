@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import logging
+
+from ..storage import get_store
+from ..storage.base import BulkSaveError
+from ..util.const import Const
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IndexService(object):
+    """
+    维护存储在区块链存储中的索引文档，避免每次查询都从链尾开始遍历整个区块链
+    """
+
+    @staticmethod
+    def get_identity_key(tx_type, identifier_name, identifier):
+        """
+        生成身份索引文档的ID
+        :param tx_type:
+        :param identifier_name: content中作为identifier的key的名字
+        :param identifier:
+        :return:
+        """
+        return Const.IDENTITY_INDEX_PREFIX + tx_type + ':' + identifier_name + ':' + str(identifier)
+
+    @staticmethod
+    def is_identity_indexed(tx_type, identifier_name):
+        """
+        判断 tx_type 与 identifier_name 的组合是否建立了身份索引
+        :param tx_type:
+        :param identifier_name:
+        :return:
+        """
+        return identifier_name in Const.IDENTITY_INDEX_FIELDS.get(tx_type, ())
+
+    @staticmethod
+    def gen_identity_entries(tx_list, block_id):
+        """
+        根据区块中的交易单生成身份索引项，返回 {索引文档ID: {'tx_id': ..., 'block_id': ...}}
+        同一区块内若有多条交易单对应同一索引，则与遍历区块链时一样，以 tx_list 中靠前的为准
+        :param tx_list: Transaction类实例的列表
+        :param block_id: 交易单所在区块的ID
+        :return:
+        """
+        entries = {}
+        for tx in tx_list:
+            if not isinstance(tx.content, dict):
+                continue
+
+            for identifier_name in Const.IDENTITY_INDEX_FIELDS.get(tx.tx_type, ()):
+                if identifier_name not in tx.content:
+                    continue
+
+                key = IndexService.get_identity_key(tx.tx_type, identifier_name, tx.content[identifier_name])
+                if key not in entries:
+                    entries[key] = {'tx_id': tx.id, 'block_id': block_id}
+
+        return entries
+
+    @staticmethod
+    def get_height_key(height):
+        """
+        生成高度索引文档的ID
+        :param height:
+        :return:
+        """
+        return Const.HEIGHT_INDEX_PREFIX + str(height)
+
+    @staticmethod
+    def get_tx_key(tx_id):
+        """
+        生成交易单索引文档的ID
+        :param tx_id:
+        :return:
+        """
+        return Const.TX_INDEX_PREFIX + tx_id
+
+    @staticmethod
+    def gen_tx_entries(tx_list, block_id):
+        """
+        根据区块中的交易单生成交易单索引项，返回 {索引文档ID: {'block_id': ..., 'index': 交易单在区块中的下标}}
+        :param tx_list: Transaction类实例的列表
+        :param block_id: 交易单所在区块的ID
+        :return:
+        """
+        return {IndexService.get_tx_key(tx.id): {'block_id': block_id, 'index': index}
+                for index, tx in enumerate(tx_list)}
+
+    @staticmethod
+    def get_relation_key(tx_type, identifier):
+        """
+        生成关系索引文档的ID
+        :param tx_type: 如 'patient_record', 'doctor_record'
+        :param identifier: 如patient_id, doctor_id
+        :return:
+        """
+        return Const.RELATION_INDEX_PREFIX + tx_type + ':' + str(identifier)
+
+    @staticmethod
+    def gen_relation_entries(tx_list):
+        """
+        根据区块中的交易单生成关系索引项，返回 {索引文档ID: {'records': [], 'deleted': [], 'updated': []}}
+        records 中为就诊记录的 tx_id；
+        deleted 中为 [被删除的就诊记录的 tx_id, medical_record_del 交易单的 id]；
+        updated 中为 [被更新的旧就诊记录的 tx_id, medical_record_update 交易单的 id]；
+        各列表均按交易单加入区块链的先后顺序排列
+        :param tx_list: Transaction类实例的列表
+        :return:
+        """
+        entries = {}
+
+        def get_entry(tx_type, identifier):
+            key = IndexService.get_relation_key(tx_type, identifier)
+            if key not in entries:
+                entries[key] = {'records': [], 'deleted': [], 'updated': []}
+            return entries[key]
+
+        for tx in tx_list:
+            if not isinstance(tx.content, dict):
+                continue
+
+            if tx.tx_type in Const.RELATION_INDEX_TYPES:
+                id_name = Const.RELATION_INDEX_TYPES[tx.tx_type]
+                get_entry(tx.tx_type, tx.content[id_name])['records'].append(tx.content['record_tx_id'])
+
+            elif 'medical_record_del' == tx.tx_type:
+                for tx_type, id_name in Const.RELATION_INDEX_TYPES.items():
+                    get_entry(tx_type, tx.content[id_name])['deleted'].append([tx.content['tx_id'], tx.id])
+
+            elif 'medical_record_update' == tx.tx_type:
+                for tx_type, id_name in Const.RELATION_INDEX_TYPES.items():
+                    get_entry(tx_type, tx.content['old_' + id_name])['updated'].append([tx.content['old_tx_id'],
+                                                                                        tx.id])
+
+        return entries
+
+    @staticmethod
+    def update_indexes(store, tx_list, block_id, height=None, max_retries=Const.INDEX_UPDATE_MAX_RETRIES):
+        """
+        区块加入区块链后，根据其中的交易单更新索引。
+        身份索引中后加入的区块会覆盖之前的索引项，关系索引则追加到已有的索引项之后，已存在的索引项不再重复追加，
+        因此同一区块的索引可以安全地重复更新(例如超过最大重试次数后由 update_pending_indexes 重放)。
+        索引文档被其他写入者修改(_rev 冲突)时，重新读取写入失败的文档并再次合并
+        :param store:
+        :param tx_list: Transaction类实例的列表
+        :param block_id: 交易单所在区块的ID
+        :param height: 区块的高度，为 None 时不更新高度索引
+        :param max_retries: 冲突时的最大重试次数，超过后抛出 BulkSaveError
+        :return:
+        """
+        identity_entries = IndexService.gen_identity_entries(tx_list, block_id)
+        identity_entries.update(IndexService.gen_tx_entries(tx_list, block_id))
+        if height is not None:
+            identity_entries[IndexService.get_height_key(height)] = {'block_id': block_id}
+        relation_entries = IndexService.gen_relation_entries(tx_list)
+
+        # 通过一次批量读取得到已有的索引文档(及其 _rev)，再通过一次批量写入保存更新后的索引文档
+        # 身份索引、交易单索引与高度索引都直接以新的索引项覆盖
+        keys = list(identity_entries.keys()) + list(relation_entries.keys())
+        for attempt in range(max_retries + 1):
+            docs = []
+            for key, doc in zip(keys, store.get_many(keys)):
+                if key in identity_entries:
+                    if doc is None:
+                        doc = {'_id': key}
+                    doc.update(identity_entries[key])
+
+                else:
+                    if doc is None:
+                        doc = {'_id': key, 'records': [], 'deleted': [], 'updated': []}
+                    for list_name in ('records', 'deleted', 'updated'):
+                        doc[list_name].extend(entry for entry in relation_entries[key][list_name]
+                                              if entry not in doc[list_name])
+
+                docs.append(doc)
+
+            try:
+                store.put_many(docs)
+                return
+            except BulkSaveError as e:
+                # 其余文档已写入成功，只重新读取、合并写入失败的文档
+                if attempt == max_retries:
+                    raise
+                keys = e.failed_ids
+                logger.info('索引文档更新冲突，重试次数: ' + str(attempt + 1) + ', 文档: ' + str(keys))
+
+    @staticmethod
+    def find_identity(tx_type, identifier, identifier_name='identifier'):
+        """
+        根据身份索引查找 identifier 对应的交易单，找到则返回 {'tx_id': ..., 'block_id': ...}，否则返回None
+        :param tx_type:
+        :param identifier:
+        :param identifier_name:
+        :return:
+        """
+        doc = get_store().get(IndexService.get_identity_key(tx_type, identifier_name, identifier))
+        if doc is None:
+            return None
+
+        return {'tx_id': doc['tx_id'], 'block_id': doc['block_id']}
+
+    @staticmethod
+    def find_identities(tx_type, identifiers, identifier_name='identifier'):
+        """
+        根据身份索引通过一次批量请求查找各 identifier 对应的交易单
+        :param tx_type:
+        :param identifiers: identifier 的list
+        :param identifier_name:
+        :return: 与 identifiers 顺序一致的 {'tx_id': ..., 'block_id': ...} 的list，未找到的对应位置为None
+        """
+        docs = get_store().get_many([IndexService.get_identity_key(tx_type, identifier_name, identifier)
+                                     for identifier in identifiers])
+        return [{'tx_id': doc['tx_id'], 'block_id': doc['block_id']} if doc is not None else None for doc in docs]
+
+    @staticmethod
+    def find_tx_block(tx_id):
+        """
+        根据交易单索引查找交易单所在的区块，找到则返回 {'block_id': ..., 'index': 交易单在区块中的下标}，否则返回None
+        :param tx_id:
+        :return:
+        """
+        doc = get_store().get(IndexService.get_tx_key(tx_id))
+        if doc is None:
+            return None
+
+        return {'block_id': doc['block_id'], 'index': doc['index']}
+
+    @staticmethod
+    def find_tx_blocks(tx_ids):
+        """
+        根据交易单索引通过一次批量请求查找各交易单所在的区块
+        :param tx_ids: 交易单ID的list
+        :return: 与 tx_ids 顺序一致的 {'block_id': ..., 'index': ...} 的list，未找到的对应位置为None
+        """
+        docs = get_store().get_many([IndexService.get_tx_key(tx_id) for tx_id in tx_ids])
+        return [{'block_id': doc['block_id'], 'index': doc['index']} if doc is not None else None for doc in docs]
+
+    @staticmethod
+    def find_block_ids(heights):
+        """
+        根据高度索引通过一次批量请求查找各高度的区块ID
+        :param heights: 区块高度的list
+        :return: 与 heights 顺序一致的区块ID的list，不存在的高度对应位置为None
+        """
+        docs = get_store().get_many([IndexService.get_height_key(height) for height in heights])
+        return [doc['block_id'] if doc is not None else None for doc in docs]
+
+    @staticmethod
+    def find_relation_lists(tx_type, identifier):
+        """
+        根据关系索引返回 identifier 所对应的 records, deleted, updated 三个列表，均按加入区块链的先后顺序排列，
+        即关系索引文档中保存的列表本身，不复制
+        :param tx_type: 如 'patient_record', 'doctor_record'
+        :param identifier: 如patient_id, doctor_id
+        :return:
+        """
+        doc = get_store().get(IndexService.get_relation_key(tx_type, identifier))
+        if doc is None:
+            return [], [], []
+
+        return doc['records'], doc['deleted'], doc['updated']
+
+    @staticmethod
+    def find_relation(tx_type, identifier):
+        """
+        根据关系索引返回 identifier 所对应的 records, deleted, updated 三个列表，均按从新到旧的顺序排列
+        :param tx_type: 如 'patient_record', 'doctor_record'
+        :param identifier: 如patient_id, doctor_id
+        :return:
+        """
+        record_list, deleted_entries, updated_entries = IndexService.find_relation_lists(tx_type, identifier)
+        return list(reversed(record_list)), list(reversed(deleted_entries)), list(reversed(updated_entries))
@@ -2,6 +2,7 @@
 # -*- coding: UTF-8 -*-
 import logging
 import time
+from itertools import islice
 
 from ..entity.medical_record import MedicalRecord
 from ..entity.patient_record import PatientRecord
@@ -9,10 +10,10 @@ from ..entity.doctor_record import DoctorRecord
 from ..entity.medical_record_del import MedicalRecordDel
 from ..entity.medical_record_update import MedicalRecordUpdate
 
-from ..util.const import RecordType, FindRecordType
-from ..util import couchdb_util
-from ..util.const import Const
+from ..util.const import Const, RecordType, FindRecordType
+from ..util.page_util import encode_cursor, decode_cursor
 from .transaction_service import TransactionService
+from .index_service import IndexService
 from .block_service import BlockService
 from .block_chain_service import BlockChainService
 
@@ -86,96 +87,46 @@ class MedicalRecordService(object):
         return doctor_record_tx
 
     @staticmethod
-    def find_by_relation(tx_type, identifier, id_name, find_record_type=FindRecordType.NORMAL.value):
+    def find_by_relation(tx_type, identifier, id_name=None, find_record_type=FindRecordType.NORMAL.value):
         """
-        根据 tx_type, identifier, id_name 来查找对应 transaction 的 id，存入list中并返回
-        :param tx_type:
+        根据 tx_type, identifier 从关系索引中查找对应 transaction 的 id，存入list中并返回
+        :param tx_type: 如 'patient_record', 'doctor_record'
         :param identifier: 如patient_id, doctor_id
-        :param id_name: 如'patient_id', 'doctor_id'
+        :param id_name: 已弃用，保留以兼容旧的调用方式。关系索引由 tx_type 确定 identifier 的字段名，不再使用该参数
         :param find_record_type: 默认不去除被删除的记录
-        :return:
+        :return: NORMAL, ALL 返回就诊记录tx_id的list；
+                 DELETED 返回 (被删除的就诊记录tx_id的list, medical_record_del交易单id的list)；
+                 UPDATED 返回 (被更新的旧就诊记录tx_id的list, medical_record_update交易单id的list)
         """
-        record_list = []
-
-        deleted_record_list = []
-        deleted_record_tx_id_list = []
-
-        updated_old_record_list = []
-        updated_record_tx_id_list = []
-
-        db = couchdb_util.get_db(Const.DB_NAME)
-        doc = db[Const.LAST_BLOCK_ID]
-        last_block = doc['last_block_id']
-        doc = db[last_block]
-
-        while True:
-            # 若当前区块的 pre_id 为0，则表示便利整个区块链后，均未找到 id 为 所查询 id 的病人返回 none
-            # 创世区块不存储transaction， 跳过
-            if '0000000000000000000000000000000000000000000000000000000000000000' == doc['pre_id']:
-                break
-
-            tx_list = doc['tx_list']
-            # tx 保存了 一个Transaction 的 ID
-            for tx in tx_list:
-                tx_doc = db[tx]
-                transaction_dict = tx_doc['Transaction']
-
-                # 若只检索被删除的就诊记录时，则不检索其他就诊记录。否则的话，则检索
-                if find_record_type != FindRecordType.DELETED.value and tx_type == transaction_dict['tx_type']:
-                    content_dict = transaction_dict['content']
-                    if identifier == content_dict[id_name]:
-                        logger.info('Find ' + identifier + ', in transaction ' +
-                                    transaction_dict['id'] + ', in block ' + doc['_id'])
-                        record_list.append(content_dict['record_tx_id'])
-
-                # 检查 find_record_type 的值，判断是否检索被删除的就诊记录
-                # 就诊记录的tx_id
-                if (find_record_type == FindRecordType.NORMAL.value
-                    or find_record_type == FindRecordType.DELETED.value) \
-                        and 'medical_record_del' == transaction_dict['tx_type']:
-                    del_record_dict = transaction_dict['content']
-
-                    # 如果传入的 id 与 medical_record_del 中记录的，对应id_name的id相同时，
-                    # 则将该 medical_record_del 中记录的 tx_id 加入到 deleted_record_list 中
-                    if identifier == del_record_dict[id_name]:
-                        deleted_record_list.append(del_record_dict['tx_id'])
-                        deleted_record_tx_id_list.append(tx_doc['_id'])  # tx_doc['_id'] 的内容为当前交易单的id
-
-                # 检查 find_record_type 的值，判断是否检索 就诊记录更新关系 的就诊记录
-                # 就诊记录的tx_id
-                if (find_record_type == FindRecordType.NORMAL.value
-                    or find_record_type == FindRecordType.UPDATED.value) \
-                        and 'medical_record_update' == transaction_dict['tx_type']:
-                    update_record_dict = transaction_dict['content']
-
-                    # 如果传入的 id 与 medical_record_update 中记录的，对应id_name的id相同时，
-                    # 则将该 medical_record_update 中记录的 tx_id 加入到 update_record_list 中
-                    if identifier == update_record_dict['old_' + id_name]:
-                        updated_old_record_list.append(update_record_dict['old_tx_id'])
-                        updated_record_tx_id_list.append(tx_doc['_id'])  # tx_doc['_id'] 的内容为当前交易单的id
-
-                logger.info(str(transaction_dict))
-
-            doc = db[doc['pre_id']]
+        # 从关系索引中读取，各列表均按从新到旧的顺序排列，花费只与该病人/医生的就诊记录数量有关
+        record_list, deleted_entries, updated_entries = IndexService.find_relation(tx_type, identifier)
+
+        # deleted_record_list 为被删除的就诊记录的tx_id, deleted_record_tx_id_list 为对应 medical_record_del 交易单的id
+        deleted_record_list = [entry[0] for entry in deleted_entries]
+        deleted_record_tx_id_list = [entry[1] for entry in deleted_entries]
+
+        # updated_old_record_list 为被更新的旧就诊记录的tx_id, updated_record_tx_id_list 为对应 medical_record_update 交易单的id
+        updated_old_record_list = [entry[0] for entry in updated_entries]
+        updated_record_tx_id_list = [entry[1] for entry in updated_entries]
 
         logger.info('deleted_record_list: ' + str(deleted_record_list))
         logger.info('record_list: ' + str(record_list))
 
         if find_record_type == FindRecordType.NORMAL.value:
-            # 从 record_list 中去除已被删除的元素
-            for deleted_record in deleted_record_list:
-                record_list.remove(deleted_record)
-
-            # 从 record_list 中去除已被更新过的旧的就诊记录
-            for updated_old_record in updated_old_record_list:
-                record_list.remove(updated_old_record)
+            # 从 record_list 中去除已被删除以及已被更新过的旧的就诊记录
+            removed_records = set(deleted_record_list)
+            removed_records.update(updated_old_record_list)
+            return [record for record in record_list if record not in removed_records]
 
-        if find_record_type == FindRecordType.NORMAL.value or find_record_type == FindRecordType.ALL.value:
+        elif find_record_type == FindRecordType.ALL.value:
             return record_list
 
         elif find_record_type == FindRecordType.DELETED.value:
             return deleted_record_list, deleted_record_tx_id_list
 
+        elif find_record_type == FindRecordType.UPDATED.value:
+            return updated_old_record_list, updated_record_tx_id_list
+
         else:
             raise Exception('未处理的find_record_type！')
 
@@ -188,8 +139,7 @@ class MedicalRecordService(object):
         :return:
         """
         tx_type = 'patient_record'
-        id_name = 'patient_id'
-        return MedicalRecordService.find_by_relation(tx_type, patient_id, id_name, find_record_type)
+        return MedicalRecordService.find_by_relation(tx_type, patient_id, find_record_type=find_record_type)
 
     @staticmethod
     def find_by_doctor_id(doctor_id, find_record_type=FindRecordType.NORMAL.value):
@@ -200,8 +150,66 @@ class MedicalRecordService(object):
         :return:
         """
         tx_type = 'doctor_record'
-        id_name = 'doctor_id'
-        return MedicalRecordService.find_by_relation(tx_type, doctor_id, id_name, find_record_type)
+        return MedicalRecordService.find_by_relation(tx_type, doctor_id, find_record_type=find_record_type)
+
+    @staticmethod
+    def iter_relation_records(tx_type, identifier, before=None):
+        """
+        从新到旧依次返回 identifier 未被删除、未被更新的就诊记录。
+        关系索引文档仍需整个读取，records 按位置从后向前访问而不复制，被删除、被更新的记录需要先生成集合
+        :param tx_type: 如 'patient_record', 'doctor_record'
+        :param identifier: 如patient_id, doctor_id
+        :param before: 只返回关系索引中位置小于 before 的记录，为 None 时从最新的记录开始
+        :return: (记录在关系索引中的位置, 就诊记录的tx_id) 的生成器
+        """
+        record_list, deleted_entries, updated_entries = IndexService.find_relation_lists(tx_type, identifier)
+        removed_records = {entry[0] for entry in deleted_entries}
+        removed_records.update(entry[0] for entry in updated_entries)
+
+        # record_list 按加入关系索引的先后顺序排列，位置即下标
+        start = len(record_list) if before is None else min(before, len(record_list))
+        for position in range(start - 1, -1, -1):
+            if record_list[position] not in removed_records:
+                yield position, record_list[position]
+
+    @staticmethod
+    def find_page_by_relation(tx_type, identifier, page_size=Const.RECORD_PAGE_SIZE, cursor=None):
+        """
+        按从新到旧的顺序分页查找就诊记录，只读取当前页的就诊记录的内容
+        :param tx_type: 如 'patient_record', 'doctor_record'
+        :param identifier: 如patient_id, doctor_id
+        :param page_size: 每页的记录数
+        :param cursor: 上一页返回的 next_cursor，为 None 时返回第一页
+        :return: (当前页就诊记录tx_id的list, 下一页的 cursor，没有下一页时为None)
+        :raise ValueError: cursor 无效
+        """
+        # 多取一条记录，用于判断是否还有下一页
+        page = list(islice(MedicalRecordService.iter_relation_records(tx_type, identifier, decode_cursor(cursor)),
+                           page_size + 1))
+        next_cursor = encode_cursor(page[page_size - 1][0]) if len(page) > page_size else None
+        return [tx_id for _, tx_id in page[:page_size]], next_cursor
+
+    @staticmethod
+    def find_page_by_patient_id(patient_id, page_size=Const.RECORD_PAGE_SIZE, cursor=None):
+        """
+        按从新到旧的顺序分页查找病人的就诊记录
+        :param patient_id:
+        :param page_size:
+        :param cursor:
+        :return: (当前页就诊记录tx_id的list, 下一页的 cursor)
+        """
+        return MedicalRecordService.find_page_by_relation('patient_record', patient_id, page_size, cursor)
+
+    @staticmethod
+    def find_page_by_doctor_id(doctor_id, page_size=Const.RECORD_PAGE_SIZE, cursor=None):
+        """
+        按从新到旧的顺序分页查找医生的就诊记录
+        :param doctor_id:
+        :param page_size:
+        :param cursor:
+        :return: (当前页就诊记录tx_id的list, 下一页的 cursor)
+        """
+        return MedicalRecordService.find_page_by_relation('doctor_record', doctor_id, page_size, cursor)
 
     @staticmethod
     def del_by_tx_id(tx_id, operator_type, operator_id):
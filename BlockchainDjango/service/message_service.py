@@ -2,10 +2,8 @@
 # -*- coding: UTF-8 -*-
 import logging
 import time
-from ecdsa import VerifyingKey
 
 from ..util.signature import Signature
-from ..util.const import Const
 from ..entity.message import Message
 
 logging.basicConfig(level=logging.INFO)
@@ -42,6 +40,6 @@ class MessageService(object):
         pub_key_str = msg.pub_key
         content_str = str(msg.transaction)
 
-        vk = VerifyingKey.from_string(bytes.fromhex(pub_key_str), curve=Const.CURVE)
+        vk = Signature.get_verifying_key(pub_key_str)
         # transaction.content 作为签名的内容
         return vk.verify(bytes.fromhex(sig_str), content_str.encode('utf-8'))
@@ -5,10 +5,7 @@ import logging
 import time
 import hashlib
 
-from ecdsa import VerifyingKey
-
-from ..util import couchdb_util
-from ..util.const import Const
+from ..storage import get_store
 from ..util.signature import Signature
 from ..entity.transaction import Transaction
 from ..entity.patient import Patient
@@ -21,8 +18,6 @@ from ..entity.doctor_last_record import DoctorLastRecord
 from ..entity.medical_record_del import MedicalRecordDel
 from ..entity.medical_record_update import MedicalRecordUpdate
 
-db = couchdb_util.get_db(Const.DB_NAME)
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -110,18 +105,35 @@ class TransactionService(object):
             raise Exception('未知 Transaction 类型！')
 
     @staticmethod
-    def save_tx(transaction):
-        """ 将一条 transaction 信息存储 couchdb数据库里"""
+    def gen_tx_doc(transaction):
+        """ 生成一条 transaction 存储在区块链存储中的文档"""
         if not isinstance(transaction, Transaction):
             raise Exception("形参transaction类型错误，必须为Transaction类的实例！")
         else:
-            couchdb_util.save(db, {'_id': transaction.id, 'Transaction': transaction.__dict__})
+            return {'_id': transaction.id, 'Transaction': transaction.__dict__}
+
+    @staticmethod
+    def save_tx(transaction):
+        """ 将一条 transaction 信息存储到区块链存储里"""
+        get_store().put(TransactionService.gen_tx_doc(transaction))
 
     @staticmethod
     def save_tx_list(transaction_list):
-        """ 循环调用 save_tx, 将transaction list 存入到数据库中"""
-        for each_tx in transaction_list:
-            TransactionService.save_tx(each_tx)
+        """ 通过一次批量写入, 将transaction list 存入到数据库中"""
+        tx_docs = [TransactionService.gen_tx_doc(each_tx) for each_tx in transaction_list]
+        get_store().put_many(tx_docs)
+
+    @staticmethod
+    def get_tx_str(tx_dict):
+        """
+        返回交易单作为 Merkle 树叶子的字符串，与 add_block 中的 tx.__dict__.__str__() 一致，
+        tx_dict 中查询时附加的 tx_id 等字段不参与计算
+        :param tx_dict: Transaction 的dict
+        :return:
+        """
+        tx_obj = Transaction()
+        tx_obj.init_tx_by_dict(tx_dict)
+        return tx_obj.__dict__.__str__()
 
     @staticmethod
     def get_tx_ids(transaction_list):
@@ -138,8 +150,7 @@ class TransactionService(object):
         :param tx_id:
         :return:
         """
-        # db = couchdb_util.get_db(Const.DB_NAME)
-        tx_doc = db[tx_id]
+        tx_doc = get_store()[tx_id]
         transaction_dict = tx_doc['Transaction']
         transaction_dict['tx_id'] = tx_id
         return transaction_dict
@@ -148,12 +159,19 @@ class TransactionService(object):
     def find_txs_by_ids(tx_id_list):
         """
         根据tx_id_list)中所存储的所有tx的id查找相应的Transaction，并以list的形式返回
+        所有Transaction通过一次批量请求获取
         :param tx_id_list:
         :return:
         """
+        tx_docs = get_store().get_many(tx_id_list)
         tx_dicts = []
-        for tx_id in tx_id_list:
-            tx_dicts.append(TransactionService.find_tx_by_id(tx_id))
+        for tx_id, tx_doc in zip(tx_id_list, tx_docs):
+            if tx_doc is None:
+                raise Exception('交易单 ' + tx_id + ' 不存在！')
+
+            transaction_dict = tx_doc['Transaction']
+            transaction_dict['tx_id'] = tx_id
+            tx_dicts.append(transaction_dict)
 
         return tx_dicts
 
@@ -199,8 +217,9 @@ class TransactionService(object):
         """
         sig_str = tx.signature
         pub_key_str = tx.pub_key
-        content_str = tx.content
+        # 与 gen_tx 一致，content 为对象时签名的内容为其 dict 的字符串
+        content_str = tx.content if isinstance(tx.content, str) else str(tx.content)
 
-        vk = VerifyingKey.from_string(bytes.fromhex(pub_key_str), curve=Const.CURVE)
+        vk = Signature.get_verifying_key(pub_key_str)
         # transaction.content 作为签名的内容
         return vk.verify(bytes.fromhex(sig_str), content_str.encode('utf-8'))
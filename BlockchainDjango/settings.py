@@ -81,6 +81,16 @@ DATABASES = {
     }
 }
 
+# 区块链的存储后端：'couchdb' 使用 couchdb 服务器，'sqlite' 使用本地的 SQLite 文件，不需要数据库服务器，
+# 'segment_log' 将区块与交易单追加写入段文件，链尾、索引等可修改的文档保存在 SQLite 文件中
+BLOCKCHAIN_STORAGE = 'couchdb'
+BLOCKCHAIN_SQLITE_PATH = os.path.join(BASE_DIR, 'block_tree.sqlite3')
+BLOCKCHAIN_SEGMENT_LOG_DIR = os.path.join(BASE_DIR, 'block_log')
+# 区块与交易单的进程内读缓存最多保存的文档数，为 0 时不缓存
+BLOCKCHAIN_STORE_CACHE_SIZE = 10000
+# 多个进程共用的二级缓存：None 不使用，'local' 使用进程内的替代实现，'host:port' 使用该地址的 memcached(需要 pymemcache)
+BLOCKCHAIN_SHARED_CACHE = None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import os
+import threading
+
+from ..util.const import Const
+from .base import Store, BulkSaveError, ConflictError, DocNotFoundError
+
+_lock = threading.Lock()
+_store = None
+_store_pid = None
+
+
+def get_setting(name, default):
+    """
+    读取 Django settings 中的配置，在 Validator 等未配置 Django 的进程中使用默认值
+    :param name:
+    :param default:
+    :return:
+    """
+    try:
+        from django.conf import settings
+        from django.core.exceptions import ImproperlyConfigured
+    except ImportError:
+        return default
+
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+def create_shared_cache(address):
+    """
+    创建读缓存的共享缓存
+    :param address: 'local' 或 memcached 的地址 'host:port'
+    :return:
+    """
+    if 'local' == address:
+        from .cached_store import MemorySharedCache
+        return MemorySharedCache()
+
+    # pymemcache 只在使用 memcached 时需要
+    from pymemcache.client.base import Client
+    host, port = address.rsplit(':', 1)
+    return Client((host, int(port)))
+
+
+def create_backend(backend):
+    """
+    :param backend: 'couchdb'、'sqlite' 或 'segment_log'
+    :return: Store
+    """
+    if 'couchdb' == backend:
+        from .couchdb_store import CouchDBStore
+        return CouchDBStore(Const.DB_NAME)
+
+    elif 'sqlite' == backend:
+        from .sqlite_store import SQLiteStore
+        return SQLiteStore(get_setting('BLOCKCHAIN_SQLITE_PATH', Const.SQLITE_STORE_PATH))
+
+    elif 'segment_log' == backend:
+        from .segment_log_store import SegmentLogStore
+        from .sqlite_store import SQLiteStore
+        return SegmentLogStore(get_setting('BLOCKCHAIN_SEGMENT_LOG_DIR', Const.SEGMENT_LOG_DIR),
+                               SQLiteStore(get_setting('BLOCKCHAIN_SQLITE_PATH', Const.SQLITE_STORE_PATH)))
+
+    raise Exception('未知的存储后端: ' + str(backend))
+
+
+def create_store(backend=None):
+    """
+    创建存储，并在其前加上区块与交易单的读缓存
+    :param backend: 'couchdb'、'sqlite' 或 'segment_log'，默认由 settings.BLOCKCHAIN_STORAGE 决定，
+                    未配置时为 Const.STORAGE_BACKEND
+    :return: Store
+    """
+    store = create_backend(backend or get_setting('BLOCKCHAIN_STORAGE', Const.STORAGE_BACKEND))
+    cache_size = get_setting('BLOCKCHAIN_STORE_CACHE_SIZE', Const.STORE_CACHE_SIZE)
+    if not cache_size:
+        return store
+
+    from .cached_store import CachedStore
+    shared_address = get_setting('BLOCKCHAIN_SHARED_CACHE', None)
+    return CachedStore(store, cache_size, shared_cache=create_shared_cache(shared_address) if shared_address else None)
+
+
+def get_store():
+    """
+    返回进程内共享的存储，fork 出的子进程中会重新创建
+    :return: Store
+    """
+    global _store, _store_pid
+    with _lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = create_store()
+            _store_pid = os.getpid()
+        return _store
+
+
+def set_store(store):
+    """
+    替换进程内共享的存储，用于脚本与测试
+    :param store: Store
+    :return:
+    """
+    global _store, _store_pid
+    with _lock:
+        _store = store
+        _store_pid = os.getpid()
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from ..util.const import Const
+
+
+def is_immutable(doc):
+    """
+    区块头、区块体、交易单与签名的检查点写入后不再修改，
+    链尾、索引等其他文档可以被修改
+    :param doc:
+    :return:
+    """
+    doc_id = doc['_id']
+    return 'pre_id' in doc or 'Transaction' in doc or doc_id.startswith(Const.BLOCK_BODY_PREFIX) or \
+        doc_id.startswith(Const.CHECKPOINT_PREFIX)
+
+
+class BulkSaveError(Exception):
+    """
+    批量写入时有文档写入失败，failures 中保存 [(doc_id, 异常), ...]，
+    其余文档已写入成功，调用者只需重试 failed_ids 中的文档
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.failed_ids = [doc_id for doc_id, _ in failures]
+        super(BulkSaveError, self).__init__('批量写入失败的文档: ' + str(failures))
+
+
+class ConflictError(Exception):
+    """写入文档时 _rev 与存储中的不一致，文档已被其他写入者修改"""
+
+
+class DocNotFoundError(KeyError):
+    """文档不存在"""
+
+
+class Store(object):
+    """
+    区块链存储的接口。文档为带有 '_id' 的 dict，写入后会在文档中设置 '_rev'：
+    更新已存在的文档时必须带有读取时的 '_rev'，否则视为冲突，链尾文档据此实现 compare-and-swap
+    """
+
+    def reset(self):
+        """
+        清空存储，用于初始化区块链
+        :return:
+        """
+        raise NotImplementedError
+
+    def get(self, doc_id):
+        """
+        :param doc_id:
+        :return: 文档，不存在时返回None
+        """
+        raise NotImplementedError
+
+    def get_many(self, doc_ids):
+        """
+        批量读取文档
+        :param doc_ids: 文档ID的list或tuple
+        :return: 按 doc_ids 的顺序返回文档的list，不存在的文档对应位置为None
+        """
+        raise NotImplementedError
+
+    def put_many(self, docs):
+        """
+        批量写入文档，写入成功的文档中会设置新的 '_rev'
+        :param docs: 文档dict的list
+        :return: [(doc_id, rev), ...]
+        :raise BulkSaveError: 有文档写入失败时抛出，其余文档已写入成功
+        """
+        raise NotImplementedError
+
+    def put(self, doc):
+        """
+        写入一个文档
+        :param doc:
+        :return: (doc_id, rev)
+        :raise ConflictError: 文档已被其他写入者修改
+        """
+        raise NotImplementedError
+
+    def delete(self, doc):
+        """
+        删除文档
+        :param doc: 带有 '_id' 与 '_rev' 的文档
+        :return:
+        """
+        raise NotImplementedError
+
+    def iterate(self, prefix=''):
+        """
+        按文档ID的顺序遍历ID以 prefix 开头的文档
+        :param prefix:
+        :return: 文档的生成器
+        """
+        raise NotImplementedError
+
+    def compact(self, revs_limit):
+        """
+        删除文档的旧 revision，默认不需要处理
+        :param revs_limit: 每个文档保留的历史 revision 个数
+        :return:
+        """
+
+    def get_stats(self):
+        return {}
+
+    def __getitem__(self, doc_id):
+        doc = self.get(doc_id)
+        if doc is None:
+            raise DocNotFoundError(doc_id)
+        return doc
+
+    def get_head(self):
+        """
+        :return: 带有 '_rev' 的链尾文档 last_block
+        """
+        return self[Const.LAST_BLOCK_ID]
+
+    def swap_head(self, new_head_doc):
+        """
+        以 new_head_doc 中的 '_rev' 做 compare-and-swap 更新链尾文档
+        :param new_head_doc: 由读取到的链尾文档修改得到的新链尾文档
+        :return: 更新成功返回 True，链尾已被其他写入者更新时返回 False
+        """
+        try:
+            self.put(new_head_doc)
+        except ConflictError:
+            return False
+        return True
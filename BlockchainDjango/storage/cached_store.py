@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+import threading
+
+from ..util.const import Const
+from ..util.lru_cache import LRUCache
+from .base import Store, is_immutable
+
+# 可以被修改的文档ID的前缀，读取时不经过缓存
+MUTABLE_PREFIXES = (Const.IDENTITY_INDEX_PREFIX, Const.TX_INDEX_PREFIX, Const.HEIGHT_INDEX_PREFIX,
+                    Const.RELATION_INDEX_PREFIX)
+
+
+def is_cacheable_id(doc_id):
+    """
+    链尾、最新检查点与各索引文档会被修改，不缓存
+    :param doc_id:
+    :return:
+    """
+    return doc_id not in (Const.LAST_BLOCK_ID, Const.LATEST_CHECKPOINT_ID) and not doc_id.startswith(MUTABLE_PREFIXES)
+
+
+class MemorySharedCache(object):
+    """
+    共享缓存的进程内替代实现，接口与 pymemcache 的 Client 相同(get_many, set_many, delete_many)，
+    用于测试和没有 memcached 的单进程部署
+    """
+
+    def __init__(self, capacity=Const.STORE_CACHE_SIZE):
+        self.cache = LRUCache(capacity)
+
+    def get_many(self, keys):
+        """
+        :param keys:
+        :return: {key: value}，只包含存在的 key
+        """
+        values = {}
+        for key in keys:
+            value = self.cache.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set_many(self, values):
+        for key, value in values.items():
+            self.cache.put(key, value)
+        return []
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.cache.pop(key)
+        return True
+
+
+class CachedStore(Store):
+    """
+    在 store 前加一层按文档ID缓存的读缓存。区块头、区块体与交易单由内容哈希确定且不会被修改，
+    因此不需要失效处理；链尾与索引等可修改的文档不经过缓存。
+    缓存分两级：进程内容量与字节数有限的 LRU 缓存，以及可选的、多个进程共用的共享缓存(如 memcached)。
+    缓存中保存文档的 json 字符串，每次读取都返回新的 dict，调用者修改返回的文档不会影响缓存
+    """
+
+    def __init__(self, store, capacity=Const.STORE_CACHE_SIZE, max_bytes=Const.STORE_CACHE_BYTES,
+                 shared_cache=None):
+        """
+        :param store: 被缓存的 Store
+        :param capacity: 进程内缓存最多保存的文档数
+        :param max_bytes: 进程内缓存中文档 json 的最大总字节数
+        :param shared_cache: 共享缓存，需要有 get_many, set_many, delete_many 方法，为 None 时只使用进程内缓存
+        """
+        self.store = store
+        self.local_cache = LRUCache(capacity, max_bytes)
+        self.shared_cache = shared_cache
+        self.lock = threading.Lock()
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @staticmethod
+    def _shared_key(doc_id):
+        return Const.DB_NAME + ':' + doc_id
+
+    def _cache_docs(self, docs):
+        """
+        将从 store 读取到的不可修改的文档放入各级缓存
+        :param docs:
+        :return:
+        """
+        shared_values = {}
+        for doc in docs:
+            doc_json = json.dumps(doc, separators=(',', ':'))
+            self.local_cache.put(doc['_id'], doc_json, len(doc_json))
+            shared_values[self._shared_key(doc['_id'])] = doc_json
+        if self.shared_cache is not None and shared_values:
+            self.shared_cache.set_many(shared_values)
+
+    def reset(self):
+        # 共享缓存中可能还有其他数据，不清空；区块与交易单的ID由内容哈希确定，旧的缓存不会被误用
+        self.local_cache.clear()
+        self.store.reset()
+
+    def get(self, doc_id):
+        return self.get_many([doc_id])[0]
+
+    def get_many(self, doc_ids):
+        if not doc_ids:
+            return []
+
+        docs = [None] * len(doc_ids)
+        missing = []
+        for i, doc_id in enumerate(doc_ids):
+            doc_json = self.local_cache.get(doc_id) if is_cacheable_id(doc_id) else None
+            if doc_json is not None:
+                docs[i] = json.loads(doc_json)
+            else:
+                missing.append(i)
+
+        if self.shared_cache is not None:
+            shared_ids = [doc_ids[i] for i in missing if is_cacheable_id(doc_ids[i])]
+            if shared_ids:
+                values = self.shared_cache.get_many([self._shared_key(doc_id) for doc_id in shared_ids])
+                with self.lock:
+                    self.shared_hits += len(values)
+                    self.shared_misses += len(shared_ids) - len(values)
+
+                still_missing = []
+                for i in missing:
+                    doc_json = values.get(self._shared_key(doc_ids[i]))
+                    if doc_json is None:
+                        still_missing.append(i)
+                        continue
+                    if isinstance(doc_json, bytes):
+                        doc_json = doc_json.decode('utf-8')
+                    self.local_cache.put(doc_ids[i], doc_json, len(doc_json))
+                    docs[i] = json.loads(doc_json)
+                missing = still_missing
+
+        if missing:
+            store_docs = self.store.get_many([doc_ids[i] for i in missing])
+            for i, doc in zip(missing, store_docs):
+                docs[i] = doc
+            self._cache_docs([doc for doc in store_docs
+                              if doc is not None and is_cacheable_id(doc['_id']) and is_immutable(doc)])
+        return docs
+
+    def put_many(self, docs):
+        return self.store.put_many(docs)
+
+    def put(self, doc):
+        return self.store.put(doc)
+
+    def delete(self, doc):
+        # 链尾重新链接时会删除未被链接的区块，区块不在缓存中时这里什么也不做
+        self.local_cache.pop(doc['_id'])
+        if self.shared_cache is not None:
+            self.shared_cache.delete_many([self._shared_key(doc['_id'])])
+        self.store.delete(doc)
+
+    def iterate(self, prefix=''):
+        return self.store.iterate(prefix)
+
+    def compact(self, revs_limit):
+        self.store.compact(revs_limit)
+
+    def get_head(self):
+        return self.store.get_head()
+
+    def swap_head(self, new_head_doc):
+        return self.store.swap_head(new_head_doc)
+
+    def get_cache_stats(self):
+        """
+        返回各级缓存的统计信息：进程内缓存的命中率、保存的文档数与字节数，共享缓存的命中率
+        :return:
+        """
+        local_stats = self.local_cache.get_stats()
+        with self.lock:
+            shared_lookups = self.shared_hits + self.shared_misses
+            return {
+                'store_cache_hits': local_stats['hits'],
+                'store_cache_misses': local_stats['misses'],
+                'store_cache_hit_ratio': local_stats['hit_ratio'],
+                'store_cache_size': local_stats['size'],
+                'store_cache_bytes': local_stats['bytes'],
+                'store_cache_evictions': local_stats['evictions'],
+                'shared_cache_hits': self.shared_hits,
+                'shared_cache_misses': self.shared_misses,
+                'shared_cache_hit_ratio': self.shared_hits / shared_lookups if shared_lookups else 0.0,
+            }
+
+    def get_stats(self):
+        stats = dict(self.store.get_stats())
+        stats.update(self.get_cache_stats())
+        return stats
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+from couchdb.http import ResourceConflict
+
+from ..util import couchdb_util
+from .base import Store, ConflictError
+
+
+class CouchDBStore(Store):
+    """
+    以 couchdb 数据库作为存储，数据库连接由 couchdb_util 中进程内共享的 ConnectionManager 管理
+    """
+
+    def __init__(self, db_name, iterate_batch=1000):
+        """
+        :param db_name: 数据库名
+        :param iterate_batch: iterate 时每次请求读取的文档数
+        """
+        self.db_name = db_name
+        self.iterate_batch = iterate_batch
+
+    @property
+    def db(self):
+        return couchdb_util.get_db(self.db_name)
+
+    def reset(self):
+        couchdb_util.init_db(self.db_name)
+
+    def get(self, doc_id):
+        doc = self.db.get(doc_id)
+        return dict(doc) if doc is not None else None
+
+    def get_many(self, doc_ids):
+        return [dict(doc) if doc is not None else None for doc in couchdb_util.get_docs(self.db, doc_ids)]
+
+    def put_many(self, docs):
+        return couchdb_util.save_docs(self.db, docs)
+
+    def put(self, doc):
+        try:
+            return self.db.save(doc)
+        except ResourceConflict as e:
+            raise ConflictError(str(e))
+
+    def delete(self, doc):
+        try:
+            self.db.delete(doc)
+        except ResourceConflict as e:
+            raise ConflictError(str(e))
+
+    def iterate(self, prefix=''):
+        # '\ufff0' 大于文档ID中可能出现的字符，[prefix, prefix + '\ufff0'] 即以 prefix 开头的所有ID
+        rows = self.db.iterview('_all_docs', self.iterate_batch, startkey=prefix, endkey=prefix + '\ufff0',
+                                include_docs=True)
+        for row in rows:
+            yield dict(row.doc)
+
+    def compact(self, revs_limit):
+        couchdb_util.set_revs_limit(self.db, revs_limit)
+        couchdb_util.compact(self.db)
+
+    def get_stats(self):
+        return couchdb_util.get_stats()
@@ -0,0 +1,313 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import fcntl
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from ..util.const import Const
+from .base import Store, BulkSaveError, ConflictError, is_immutable
+
+# 记录头：记录类型、文档ID的字节数、文档内容的字节数、文档ID与内容的 crc32
+RECORD_HEADER = struct.Struct('>BHII')
+RECORD_DOC = 0
+RECORD_TOMBSTONE = 1
+# 不可修改的文档的 _rev
+IMMUTABLE_REV = '1'
+
+
+class SegmentLogStore(Store):
+    """
+    不可修改的文档(见 is_immutable)按写入顺序追加到段文件 segment_<序号>.log 中，每条记录为
+    记录头 + 文档ID + 文档内容的 json，内存中的偏移索引记录每个文档ID所在的段文件与偏移。
+    读取时通过 mmap 只解码被访问的记录，沿链遍历区块不需要网络请求；按写入顺序重放整条链只需顺序读取一遍段文件。
+    可修改的文档交给 mutable_store 保存。
+
+    启动时顺序扫描段文件重建偏移索引；多个进程可以共用同一目录，写入时以文件锁互斥，
+    读取不到的文档会先读取其他进程新追加的记录再查找。写入中断留下的不完整记录在下一次写入前截去
+    """
+
+    def __init__(self, path, mutable_store, segment_size=Const.SEGMENT_SIZE, sync=True):
+        """
+        :param path: 保存段文件的目录
+        :param mutable_store: 保存可修改的文档的 Store
+        :param segment_size: 每个段文件的大小上限(字节)
+        :param sync: 每次写入后是否 fsync
+        """
+        self.path = path
+        self.mutable_store = mutable_store
+        self.segment_size = segment_size
+        self.sync = sync
+        self.lock = threading.RLock()
+        # 文档ID -> (段序号, 文档内容的偏移, 文档内容的字节数)
+        self.index = {}
+        # 段序号 -> 已扫描到的偏移
+        self.scanned = {}
+        # 段序号 -> mmap
+        self.maps = {}
+        self.tombstones = 0
+        os.makedirs(path, exist_ok=True)
+        self.lock_file = open(os.path.join(path, 'segment.lock'), 'a')
+        self.catch_up()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, 'segment_%08d.log' % segment)
+
+    def _list_segments(self):
+        return sorted(int(name[8:-4]) for name in os.listdir(self.path)
+                      if name.startswith('segment_') and name.endswith('.log'))
+
+    def _get_map(self, segment, end):
+        """
+        返回至少覆盖到 end 的段文件的 mmap，段文件变长后重新映射。
+        旧的 mmap 可能正被其他线程读取，不主动关闭
+        """
+        mapped = self.maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            with self.lock:
+                mapped = self.maps.get(segment)
+                if mapped is None or len(mapped) < end:
+                    with open(self._segment_path(segment), 'rb') as segment_file:
+                        mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                    self.maps[segment] = mapped
+        return mapped
+
+    def _scan_segment(self, segment, repair=False):
+        """
+        从上一次扫描到的偏移开始读取段文件中新追加的记录并更新偏移索引
+        :param segment:
+        :param repair: 是否截去末尾不完整或校验失败的记录，只能在持有文件锁时使用
+        :return:
+        """
+        size = os.path.getsize(self._segment_path(segment))
+        offset = self.scanned.get(segment, 0)
+        if offset >= size:
+            return
+
+        mapped = self._get_map(segment, size)
+        while offset + RECORD_HEADER.size <= size:
+            kind, id_len, body_len, crc = RECORD_HEADER.unpack_from(mapped, offset)
+            id_start = offset + RECORD_HEADER.size
+            body_start = id_start + id_len
+            end = body_start + body_len
+            if end > size or zlib.crc32(mapped[id_start:end]) != crc:
+                break
+
+            doc_id = mapped[id_start:body_start].decode('utf-8')
+            if RECORD_TOMBSTONE == kind:
+                self.index.pop(doc_id, None)
+                self.tombstones += 1
+            else:
+                self.index[doc_id] = (segment, body_start, body_len)
+            offset = end
+
+        if repair and offset < size:
+            os.truncate(self._segment_path(segment), offset)
+            self.maps.pop(segment, None)
+        self.scanned[segment] = offset
+
+    def catch_up(self, repair=False):
+        """
+        读取所有段文件中尚未扫描的记录，包括其他进程追加的记录
+        :param repair:
+        :return:
+        """
+        with self.lock:
+            for segment in self._list_segments():
+                self._scan_segment(segment, repair)
+
+    def _read(self, doc_id, location):
+        segment, offset, length = location
+        doc = json.loads(self._get_map(segment, offset + length)[offset:offset + length].decode('utf-8'))
+        doc['_id'] = doc_id
+        doc['_rev'] = IMMUTABLE_REV
+        return doc
+
+    def _append(self, records):
+        """
+        在线程锁与文件锁内将记录追加到最后一个段文件，超过大小上限时先新建段文件。
+        文件锁只在进程之间互斥，同一进程的线程之间由 self.lock 互斥
+        :param records: [(记录类型, 文档ID, 文档内容的 json), ...]
+        :return: 已存在而未写入的文档ID的list
+        """
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            try:
+                self.catch_up(repair=True)
+                segments = self._list_segments()
+                segment = segments[-1] if segments else 1
+                if segments and self.scanned.get(segment, 0) >= self.segment_size:
+                    segment += 1
+
+                data = bytearray()
+                conflicts = []
+                for kind, doc_id, body in records:
+                    # 不可修改的文档只能写入一次
+                    if RECORD_DOC == kind and doc_id in self.index:
+                        conflicts.append(doc_id)
+                        continue
+                    id_bytes = doc_id.encode('utf-8')
+                    body_bytes = body.encode('utf-8')
+                    data += RECORD_HEADER.pack(kind, len(id_bytes), len(body_bytes),
+                                               zlib.crc32(id_bytes + body_bytes))
+                    data += id_bytes
+                    data += body_bytes
+
+                if data:
+                    with open(self._segment_path(segment), 'ab') as segment_file:
+                        segment_file.write(data)
+                        segment_file.flush()
+                        if self.sync:
+                            os.fsync(segment_file.fileno())
+                    self._scan_segment(segment)
+                return conflicts
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def reset(self):
+        with self.lock:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            try:
+                for segment in self._list_segments():
+                    os.remove(self._segment_path(segment))
+                self.index = {}
+                self.scanned = {}
+                self.maps = {}
+                self.tombstones = 0
+            finally:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.mutable_store.reset()
+
+    def get(self, doc_id):
+        location = self.index.get(doc_id)
+        if location is not None:
+            return self._read(doc_id, location)
+
+        doc = self.mutable_store.get(doc_id)
+        if doc is None:
+            # 可能是其他进程新追加的文档
+            self.catch_up()
+            location = self.index.get(doc_id)
+            if location is not None:
+                return self._read(doc_id, location)
+        return doc
+
+    def get_many(self, doc_ids):
+        if not doc_ids:
+            return []
+
+        docs = [self._read(doc_id, self.index[doc_id]) if doc_id in self.index else None for doc_id in doc_ids]
+        missing = [i for i, doc in enumerate(docs) if doc is None]
+        if missing:
+            mutable_docs = self.mutable_store.get_many([doc_ids[i] for i in missing])
+            if None in mutable_docs:
+                self.catch_up()
+            for i, doc in zip(missing, mutable_docs):
+                if doc is None and doc_ids[i] in self.index:
+                    doc = self._read(doc_ids[i], self.index[doc_ids[i]])
+                docs[i] = doc
+        return docs
+
+    def put_many(self, docs):
+        if not docs:
+            return []
+
+        results = []
+        failures = []
+        records = []
+        mutable_docs = []
+        for doc in docs:
+            if is_immutable(doc):
+                records.append((RECORD_DOC, doc['_id'], json.dumps(
+                    {key: value for key, value in doc.items() if key not in ('_id', '_rev')},
+                    separators=(',', ':'))))
+            else:
+                mutable_docs.append(doc)
+
+        # 先写入区块与交易单，再写入引用它们的索引
+        if records:
+            conflicts = set(self._append(records))
+            for doc in docs:
+                if not is_immutable(doc):
+                    continue
+                if doc['_id'] in conflicts:
+                    failures.append((doc['_id'], ConflictError('Document update conflict: ' + doc['_id'])))
+                else:
+                    doc['_rev'] = IMMUTABLE_REV
+                    results.append((doc['_id'], IMMUTABLE_REV))
+        if mutable_docs:
+            try:
+                results.extend(self.mutable_store.put_many(mutable_docs))
+            except BulkSaveError as e:
+                failures.extend(e.failures)
+
+        if failures:
+            raise BulkSaveError(failures)
+        return results
+
+    def put(self, doc):
+        if not is_immutable(doc):
+            return self.mutable_store.put(doc)
+
+        try:
+            return self.put_many([doc])[0]
+        except BulkSaveError as e:
+            raise e.failures[0][1]
+
+    def delete(self, doc):
+        if doc['_id'] not in self.index:
+            self.catch_up()
+        if doc['_id'] not in self.index:
+            self.mutable_store.delete(doc)
+            return
+
+        # 段文件只追加，删除时追加一条墓碑记录
+        self._append([(RECORD_TOMBSTONE, doc['_id'], '')])
+
+    def iterate(self, prefix=''):
+        self.catch_up()
+        end = prefix + '\uffff'
+        doc_ids = sorted(doc_id for doc_id in list(self.index) if prefix <= doc_id < end)
+        log_docs = (self.get(doc_id) for doc_id in doc_ids)
+        for doc in heapq.merge(log_docs, self.mutable_store.iterate(prefix), key=lambda doc: doc['_id']):
+            if doc is not None:
+                yield doc
+
+    def replay(self):
+        """
+        按写入顺序顺序读取所有段文件，返回仍存在的不可修改的文档
+        :return: 文档的生成器
+        """
+        self.catch_up()
+        for segment in self._list_segments():
+            end = self.scanned.get(segment, 0)
+            if not end:
+                continue
+            mapped = self._get_map(segment, end)
+            offset = 0
+            while offset < end:
+                kind, id_len, body_len, _ = RECORD_HEADER.unpack_from(mapped, offset)
+                body_start = offset + RECORD_HEADER.size + id_len
+                doc_id = mapped[offset + RECORD_HEADER.size:body_start].decode('utf-8')
+                # 被删除或被覆盖的记录不在偏移索引中
+                if RECORD_DOC == kind and self.index.get(doc_id) == (segment, body_start, body_len):
+                    yield self._read(doc_id, (segment, body_start, body_len))
+                offset = body_start + body_len
+
+    def compact(self, revs_limit):
+        self.mutable_store.compact(revs_limit)
+
+    def get_stats(self):
+        segments = self._list_segments()
+        return {
+            'path': self.path,
+            'segments': len(segments),
+            'log_bytes': sum(self.scanned.get(segment, 0) for segment in segments),
+            'log_docs': len(self.index),
+            'tombstones': self.tombstones,
+            'mutable': self.mutable_store.get_stats(),
+        }
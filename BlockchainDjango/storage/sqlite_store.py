@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import json
+import sqlite3
+import threading
+
+from .base import Store, BulkSaveError, ConflictError
+
+
+class SQLiteStore(Store):
+    """
+    以本地 SQLite 文件作为存储的单节点后端，不需要数据库服务器。
+    每个线程使用各自的连接，数据库使用 WAL 模式，读取不会被写入阻塞；
+    _rev 为文档被写入的次数，只保留最新的 revision
+    """
+
+    def __init__(self, path):
+        """
+        :param path: SQLite 数据库文件的路径，':memory:' 时只在当前进程内存中存储(各线程共用一个连接)
+        """
+        self.path = path
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+        self.shared_conn = None
+        self._get_conn().execute('CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, rev INTEGER NOT NULL, '
+                                 'body TEXT NOT NULL)')
+
+    def _get_conn(self):
+        if self.path == ':memory:':
+            if self.shared_conn is None:
+                self.shared_conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            return self.shared_conn
+
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def _load(doc_id, rev, body):
+        doc = json.loads(body)
+        doc['_id'] = doc_id
+        doc['_rev'] = str(rev)
+        return doc
+
+    def reset(self):
+        with self.write_lock:
+            self._get_conn().execute('DELETE FROM docs')
+
+    def get(self, doc_id):
+        row = self._get_conn().execute('SELECT id, rev, body FROM docs WHERE id = ?', (doc_id,)).fetchone()
+        return self._load(*row) if row is not None else None
+
+    def get_many(self, doc_ids):
+        if not doc_ids:
+            return []
+
+        docs = {}
+        conn = self._get_conn()
+        # SQLite 单条语句中的参数个数有上限，分批查询
+        for start in range(0, len(doc_ids), 500):
+            batch = list(doc_ids[start:start + 500])
+            rows = conn.execute('SELECT id, rev, body FROM docs WHERE id IN (' + ','.join('?' * len(batch)) + ')',
+                                batch)
+            for row in rows:
+                docs[row[0]] = self._load(*row)
+        return [docs.get(doc_id) for doc_id in doc_ids]
+
+    def _put_in_transaction(self, conn, doc):
+        """
+        在已开始的事务中写入一个文档，写入成功后在 doc 中设置新的 _rev
+        :raise ConflictError:
+        """
+        doc_id = doc['_id']
+        row = conn.execute('SELECT rev FROM docs WHERE id = ?', (doc_id,)).fetchone()
+        current_rev = str(row[0]) if row is not None else None
+        if doc.get('_rev') != current_rev:
+            raise ConflictError('Document update conflict: ' + doc_id)
+
+        new_rev = (row[0] if row is not None else 0) + 1
+        body = json.dumps({key: value for key, value in doc.items() if key not in ('_id', '_rev')})
+        conn.execute('INSERT OR REPLACE INTO docs (id, rev, body) VALUES (?, ?, ?)', (doc_id, new_rev, body))
+        doc['_rev'] = str(new_rev)
+        return doc_id, doc['_rev']
+
+    def put_many(self, docs):
+        if not docs:
+            return []
+
+        results = []
+        failures = []
+        conn = self._get_conn()
+        with self.write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for doc in docs:
+                    try:
+                        results.append(self._put_in_transaction(conn, doc))
+                    except ConflictError as e:
+                        failures.append((doc['_id'], e))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        if failures:
+            raise BulkSaveError(failures)
+        return results
+
+    def put(self, doc):
+        conn = self._get_conn()
+        with self.write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = self._put_in_transaction(conn, doc)
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return result
+
+    def delete(self, doc):
+        with self.write_lock:
+            cursor = self._get_conn().execute('DELETE FROM docs WHERE id = ? AND rev = ?',
+                                              (doc['_id'], int(doc['_rev'])))
+            if not cursor.rowcount:
+                raise ConflictError('Document update conflict: ' + doc['_id'])
+
+    def iterate(self, prefix=''):
+        rows = self._get_conn().execute('SELECT id, rev, body FROM docs WHERE id >= ? AND id < ? ORDER BY id',
+                                        (prefix, prefix + '\uffff'))
+        for row in rows:
+            yield self._load(*row)
+
+    def get_stats(self):
+        doc_count = self._get_conn().execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+        return {'path': self.path, 'doc_count': doc_count}
@@ -37,6 +37,7 @@ urlpatterns = [
 
     url(r'^blockchain-manager$', BlockChainController.manager),
     url(r'^blockchain-init$', BlockChainController.init),
+    url(r'^tx-proof$', BlockChainController.tx_proof),
 
     url(r'^to-add-patient$', BlockChainController.to_add_patient),
     url(r'^add-patient$', BlockChainController.add_patient),
@@ -56,8 +57,10 @@ urlpatterns = [
     url(r'^to-patient-manager$', PatientManagerController.to_patient_manager),
     url(r'^get-patient-records$', PatientManagerController.get_patient_records),
     url(r'^get-patient-del-records$', PatientManagerController.get_patient_del_records),
+    url(r'^patient-records$', PatientManagerController.patient_records_page),
 
     url(r'^to-doctor-manager$', DoctorManagerController.to_doctor_manager),
     url(r'^get-doctor-records$', DoctorManagerController.get_doctor_records),
     url(r'^get-doctor-del-records$', DoctorManagerController.get_doctor_del_records),
+    url(r'^doctor-records$', DoctorManagerController.doctor_records_page),
 ]
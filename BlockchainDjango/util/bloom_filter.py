@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import hashlib
+import math
+
+
+class BloomFilter(object):
+    """
+    Bloom 过滤器：判断一个字符串是否可能在集合中。返回 False 时一定不在集合中，返回 True 时有一定的误判率。
+    位数组以十六进制字符串的形式保存在区块头中
+    """
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        """
+        :param num_bits: 位数组的长度
+        :param num_hashes: 哈希函数的个数
+        :param bits: 位数组，为 None 时创建全为 0 的位数组
+        """
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @staticmethod
+    def create(capacity, fp_rate):
+        """
+        根据元素个数与期望的误判率创建 Bloom 过滤器
+        :param capacity: 元素个数
+        :param fp_rate: 期望的误判率
+        :return:
+        """
+        capacity = max(capacity, 1)
+        num_bits = max(int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))), 8)
+        num_hashes = max(int(round(num_bits / capacity * math.log(2))), 1)
+        return BloomFilter(num_bits, num_hashes)
+
+    def _positions(self, value):
+        # 由一次 sha256 得到两个哈希值，再以 h1 + i * h2 模拟 num_hashes 个哈希函数
+        digest = hashlib.sha256(value.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_dict(self):
+        return {'num_bits': self.num_bits, 'num_hashes': self.num_hashes, 'bits': self.bits.hex()}
+
+    @staticmethod
+    def from_dict(bloom_dict):
+        return BloomFilter(bloom_dict['num_bits'], bloom_dict['num_hashes'], bytearray.fromhex(bloom_dict['bits']))
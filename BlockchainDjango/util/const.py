@@ -7,12 +7,75 @@ from enum import Enum, unique
 
 class Const(object):
     DB_NAME = 'block_tree'
+    # 默认的存储后端：'couchdb'、'sqlite' 或 'segment_log'，可在 settings.BLOCKCHAIN_STORAGE 中配置
+    STORAGE_BACKEND = 'couchdb'
+    # sqlite 存储后端的数据库文件，可在 settings.BLOCKCHAIN_SQLITE_PATH 中配置
+    SQLITE_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'block_tree.sqlite3')
+    # segment_log 存储后端保存区块与交易单段文件的目录，可在 settings.BLOCKCHAIN_SEGMENT_LOG_DIR 中配置
+    SEGMENT_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'block_log')
+    # 每个段文件的大小上限(字节)，超过后写入新的段文件
+    SEGMENT_SIZE = 64 * 1024 * 1024
+    # 区块与交易单读缓存最多保存的文档数与字节数，文档数可在 settings.BLOCKCHAIN_STORE_CACHE_SIZE 中配置，为 0 时不缓存
+    STORE_CACHE_SIZE = 10000
+    STORE_CACHE_BYTES = 64 * 1024 * 1024
     LAST_BLOCK_ID = 'last_block'
     GENESIS_BLOCK_ID = 'genesis_block'
+    # 创世区块的 pre_id
+    GENESIS_PRE_ID = '0000000000000000000000000000000000000000000000000000000000000000'
     PVT_KEY_LOC = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files', 'sk.pem')
     PUB_KEY_LOC = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files', 'vk.pem')
     # SECP256k1 is the Bitcoin elliptic curve
     CURVE = ecdsa.SECP256k1
+    # 缓存的已解码公钥 VerifyingKey 的最大个数
+    VERIFYING_KEY_CACHE_SIZE = 256
+    # 组提交：等待后续交易单合并进同一区块的最长时间(秒)，及每个区块最多包含的交易单数
+    GROUP_COMMIT_WINDOW = 0.005
+    GROUP_COMMIT_MAX_TXS = 500
+    # 链尾区块ID文档 CAS 更新冲突时，重新链接到新链尾的最大重试次数
+    HEAD_CAS_MAX_RETRIES = 10
+    # 索引文档更新冲突时，重新读取并合并的最大重试次数
+    INDEX_UPDATE_MAX_RETRIES = 10
+    # 链尾区块ID文档每更新多少次压缩一次数据库，以及压缩后保留的历史 revision 个数。
+    # CouchDB 的 _revs_limit 对整个数据库生效且压缩会占用写入线程，默认不在写入时压缩，
+    # 需要时通过 BlockService.compact_store 维护
+    HEAD_COMPACT_INTERVAL = 0
+    HEAD_REVS_LIMIT = 10
+    # 身份索引文档ID的前缀，完整的ID为：前缀 + tx_type + ':' + identifier_name + ':' + identifier
+    IDENTITY_INDEX_PREFIX = 'identity_index:'
+    # 需要建立身份索引的 tx_type，以及其 content 中作为 identifier 的字段
+    IDENTITY_INDEX_FIELDS = {
+        'patient': ('identifier',),
+        'doctor': ('identifier',),
+        'medical_record': ('identifier',),
+    }
+    # 每隔多少个区块生成一个签名的检查点，检查点文档ID的前缀，以及记录最新检查点的文档ID
+    CHECKPOINT_INTERVAL = 100
+    CHECKPOINT_PREFIX = 'checkpoint:'
+    LATEST_CHECKPOINT_ID = 'latest_checkpoint'
+    # 审计区块链时每批读取、验证的区块数，以及保存审计进度的检查点文件
+    AUDIT_CHUNK_SIZE = 100
+    AUDIT_CHECKPOINT_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'files', 'audit_checkpoint.json')
+    # 区块头中 Bloom 过滤器所包含的 content 字段，以及过滤器的误判率
+    BLOOM_FIELDS = ('identifier', 'patient_id', 'doctor_id', 'tx_id', 'old_tx_id')
+    BLOOM_FP_RATE = 0.01
+    # 区块体文档ID的前缀，完整的ID为：前缀 + 区块ID，区块体中保存区块的 tx_list
+    BLOCK_BODY_PREFIX = 'block_body:'
+    # 高度索引文档ID的前缀，完整的ID为：前缀 + 区块高度，记录该高度的区块ID
+    HEIGHT_INDEX_PREFIX = 'height_index:'
+    # 交易单索引文档ID的前缀，完整的ID为：前缀 + tx_id，记录交易单所在的区块及其在区块中的位置
+    TX_INDEX_PREFIX = 'tx_index:'
+    # 缓存的区块 Merkle 树的最大个数，用于生成交易单的包含证明
+    MERKLE_TREE_CACHE_SIZE = 64
+    # 分页查询就诊记录时默认与最大的每页记录数
+    RECORD_PAGE_SIZE = 20
+    RECORD_MAX_PAGE_SIZE = 100
+    # 关系索引文档ID的前缀，完整的ID为：前缀 + tx_type + ':' + identifier
+    RELATION_INDEX_PREFIX = 'relation_index:'
+    # 关系索引对应的 tx_type 与其 content 中作为 identifier 的字段，如 patient_record 中的 patient_id
+    RELATION_INDEX_TYPES = {
+        'patient_record': 'patient_id',
+        'doctor_record': 'doctor_id',
+    }
 
 
 @unique
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+# -*- coding: UTF-8 -*-
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    容量有限、线程安全的 LRU 缓存，并统计命中、未命中与淘汰的次数。
+    指定 max_bytes 时，同时限制 put 时传入的各元素字节数之和
+    """
+
+    def __init__(self, capacity, max_bytes=None):
+        """
+        :param capacity: 缓存中最多保存的元素个数
+        :param max_bytes: 缓存中元素的最大总字节数，为 None 时不限制
+        """
+        if capacity <= 0:
+            raise Exception('LRUCache 的容量必须大于0！')
+
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        # key -> (value, 字节数)
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        获取 key 对应的值，并将其标记为最近使用。key 不存在时返回 default
+        :param key:
+        :param default:
+        :return:
+        """
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key][0]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=0):
+        """
+        存入 key 对应的值，超出容量或总字节数上限时淘汰最久未使用的元素
+        :param key:
+        :param value:
+        :param size: 值的字节数
+        :return:
+        """
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.items[key][1]
+            self.items[key] = (value, size)
+            self.items.move_to_end(key)
+            self.bytes += size
+            while len(self.items) > self.capacity or \
+                    (self.max_bytes is not None and self.bytes > self.max_bytes and len(self.items) > 1):
+                _, (_, evicted_size) = self.items.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key):
+        """
+        删除 key 对应的值
+        :param key:
+        :return:
+        """
+        with self.lock:
+            if key in self.items:
+                self.bytes -= self.items.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get_stats(self):
+        """
+        返回缓存的统计信息
+        :return:
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.items),
+                'capacity': self.capacity,
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,24 +1,200 @@
 #!/usr/bin/python3
 # -*- coding: UTF-8 -*-
 
+import hashlib
 import logging
-from merkletools import MerkleTools
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class MerkleTree(object):
+    """
+    使用 sha256 的 Merkle 树，根与 merkletools.MerkleTools(hash_type="sha256") 一致：
+    叶子为字符串 utf-8 编码后的 sha256，父节点为左右子节点摘要拼接后的 sha256，
+    某一层的节点数为奇数时，最后一个节点直接提升到上一层。
+    树中只保存二进制摘要，支持在区块生成过程中逐个添加叶子，计算根时只重新计算新叶子所影响的节点
+    """
+
+    def __init__(self, values=None):
+        """
+        :param values: 初始的叶子内容，字符串的list
+        """
+        # levels[0] 为叶子层，levels[-1] 为根所在的层
+        self.levels = [[]]
+        # 上一次计算根时的叶子数，其之前的叶子所影响的节点都已计算完成
+        self.built_count = 0
+        if values:
+            self.add_leaves(values)
+
+    @property
+    def leaves(self):
+        return self.levels[0]
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def add_leaf(self, value):
+        """
+        添加一个叶子
+        :param value: 叶子内容字符串
+        :return: 叶子的下标
+        """
+        self.levels[0].append(hashlib.sha256(value.encode('utf-8')).digest())
+        return len(self.levels[0]) - 1
+
+    def add_leaves(self, values):
+        """
+        批量添加叶子
+        :param values: 叶子内容字符串的list
+        :return:
+        """
+        sha256 = hashlib.sha256
+        self.levels[0].extend([sha256(value.encode('utf-8')).digest() for value in values])
+
+    def _build(self):
+        """
+        从上一次计算时的叶子数开始，逐层重新计算受新叶子影响的节点
+        :return:
+        """
+        leaf_count = len(self.levels[0])
+        if self.built_count == leaf_count:
+            return
+
+        sha256 = hashlib.sha256
+        start = self.built_count
+        depth = 0
+        while len(self.levels[depth]) > 1:
+            level = self.levels[depth]
+            if depth + 1 == len(self.levels):
+                self.levels.append([])
+            next_level = self.levels[depth + 1]
+
+            # 之前落单被直接提升的节点现在可能已有兄弟节点，因此从 start // 2 开始重新计算
+            parent_start = start // 2
+            del next_level[parent_start:]
+            pair_end = len(level) - len(level) % 2
+            next_level.extend([sha256(level[i] + level[i + 1]).digest()
+                               for i in range(parent_start * 2, pair_end, 2)])
+            if len(level) % 2:
+                next_level.append(level[-1])
+
+            start = parent_start
+            depth += 1
+
+        del self.levels[depth + 1:]
+        self.built_count = leaf_count
+
+    def get_root(self):
+        """
+        :return: Merkle 根的二进制摘要，没有叶子时返回 None
+        """
+        if not self.levels[0]:
+            return None
+        self._build()
+        return self.levels[-1][0]
+
+    def get_root_hex(self):
+        """
+        :return: Merkle 根的十六进制字符串，没有叶子时返回 None
+        """
+        root = self.get_root()
+        return root.hex() if root is not None else None
+
+    def get_proof(self, index):
+        """
+        生成第 index 个叶子的包含证明，格式与 merkletools 相同
+        :param index: 叶子的下标
+        :return: [{'left' 或 'right': 兄弟节点的十六进制摘要}, ...]，下标越界时返回 None
+        """
+        if index < 0 or index >= len(self.levels[0]):
+            return None
+
+        self._build()
+        proof = []
+        for level in self.levels[:-1]:
+            level_len = len(level)
+            # 落单的最后一个节点直接提升，这一层没有兄弟节点
+            if index == level_len - 1 and level_len % 2 == 1:
+                index //= 2
+                continue
+            if index % 2:
+                proof.append({'left': level[index - 1].hex()})
+            else:
+                proof.append({'right': level[index + 1].hex()})
+            index //= 2
+        return proof
+
+
+def hash_leaf(value):
+    """
+    :param value: 叶子内容字符串
+    :return: 叶子的十六进制摘要
+    """
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def verify_proof(proof, target_hash, merkle_root):
+    """
+    验证包含证明
+    :param proof: get_proof 生成的证明
+    :param target_hash: 叶子的十六进制摘要
+    :param merkle_root: Merkle 根的十六进制字符串
+    :return: 叶子是否包含在以 merkle_root 为根的树中
+    """
+    try:
+        proof_hash = bytes.fromhex(target_hash)
+        for node in proof:
+            if 'left' in node:
+                proof_hash = hashlib.sha256(bytes.fromhex(node['left']) + proof_hash).digest()
+            else:
+                proof_hash = hashlib.sha256(proof_hash + bytes.fromhex(node['right'])).digest()
+        return proof_hash == bytes.fromhex(merkle_root)
+    except (ValueError, KeyError, TypeError):
+        return False
+
+
 def gen_merkle_tree(tx_list):
-    mt = MerkleTools(hash_type="sha256")
-    mt.add_leaf(tx_list, True)
-    mt.make_tree()
-    for index in range(0, mt.leaves.__len__()):
-        logger.info("Transaction" + str(index) + ": " + mt.get_leaf(index))
+    """
+    计算 Merkle 根
+    :param tx_list: 叶子内容字符串的list
+    :return: Merkle 根的十六进制字符串，tx_list 为空时返回 None
+    """
+    root = MerkleTree(tx_list).get_root_hex()
+    logger.debug("叶子数: " + str(len(tx_list)) + ", Merkle 根: " + str(root))
+    return root
+
+
+def bench_merkle_tree(sizes=(1, 10, 100, 1000, 10000), repeat=5):
+    """
+    对比 merkletools 与 MerkleTree 计算不同叶子数的 Merkle 根的耗时
+    :param sizes: 叶子数
+    :param repeat: 每种叶子数重复计算的次数
+    :return: [(叶子数, merkletools 平均耗时(秒), MerkleTree 平均耗时(秒)), ...]
+    """
+    from merkletools import MerkleTools
+
+    results = []
+    for size in sizes:
+        tx_list = [str({'id': str(i), 'content': 'tx_' + str(i)}) for i in range(size)]
+
+        start = time.time()
+        for _ in range(repeat):
+            mt = MerkleTools(hash_type="sha256")
+            mt.add_leaf(tx_list, True)
+            mt.make_tree()
+            expected_root = mt.get_merkle_root()
+        merkletools_time = (time.time() - start) / repeat
 
-    while not mt.is_ready:
-        logger.error("mt is not ready!")
+        start = time.time()
+        for _ in range(repeat):
+            root = gen_merkle_tree(tx_list)
+        native_time = (time.time() - start) / repeat
 
-    return mt.get_merkle_root()
+        assert root == expected_root
+        results.append((size, merkletools_time, native_time))
+    return results
 
 
 if __name__ == "__main__":
@@ -26,3 +202,5 @@ if __name__ == "__main__":
     merkle_root = gen_merkle_tree(a_list)
     print(merkle_root)
 
+    for leaf_count, before, after in bench_merkle_tree():
+        print('%6d 个叶子: merkletools %.3f ms, MerkleTree %.3f ms' % (leaf_count, before * 1000, after * 1000))
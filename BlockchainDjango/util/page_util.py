@@ -0,0 +1,47 @@
+import base64
+import json
+
+from .const import Const
+
+
+def encode_cursor(before):
+    """
+    生成分页的 cursor：下一页从关系索引中位置小于 before 的记录开始。
+    记录只会追加，因此位置不受之后新增的记录影响
+    :param before:
+    :return:
+    """
+    return base64.urlsafe_b64encode(json.dumps({'before': before}).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: encode_cursor 生成的字符串，为空时表示第一页
+    :return: before，第一页为 None
+    :raise ValueError: cursor 无效
+    """
+    if not cursor:
+        return None
+
+    try:
+        before = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))['before']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('无效的 cursor: ' + cursor)
+    if not isinstance(before, int) or before < 0:
+        raise ValueError('无效的 cursor: ' + cursor)
+    return before
+
+
+def get_page_size(value):
+    """
+    :param value: 请求中的 page_size 参数，为空时使用默认值
+    :return: 不超过 RECORD_MAX_PAGE_SIZE 的每页记录数
+    :raise ValueError: page_size 不是正整数
+    """
+    if not value:
+        return Const.RECORD_PAGE_SIZE
+
+    page_size = int(value)
+    if page_size <= 0:
+        raise ValueError('page_size 必须大于0: ' + str(value))
+    return min(page_size, Const.RECORD_MAX_PAGE_SIZE)
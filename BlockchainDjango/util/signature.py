@@ -4,39 +4,123 @@ from ecdsa import VerifyingKey
 import ecdsa
 import os.path
 import hashlib
+import threading
+import time
 
 from .const import Const
+from .lru_cache import LRUCache
+
+
+class _KeyStore(object):
+    """
+    缓存从 sk.pem/vk.pem 读取的密钥对，只有当密钥文件在磁盘上被修改后才重新读取。
+    密钥文件不存在时生成新的密钥对，密钥文件不纳入版本库
+    """
+
+    def __init__(self, pvt_key_loc=Const.PVT_KEY_LOC, pub_key_loc=Const.PUB_KEY_LOC):
+        self.pvt_key_loc = pvt_key_loc
+        self.pub_key_loc = pub_key_loc
+        self.lock = threading.Lock()
+        self.key_pair = None
+        # 读取密钥时两个文件的 (st_mtime_ns, st_size)，用于判断文件是否被修改
+        self.file_stamps = None
+
+    def get_file_stamps(self):
+        stamps = []
+        for key_loc in (self.pvt_key_loc, self.pub_key_loc):
+            stat = os.stat(key_loc)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamps)
+
+    def load_key_pair(self):
+        """
+        从文件中读取密钥对，并预先计算签名所需的曲线基点乘法表
+        :return:
+        """
+        with open(self.pvt_key_loc) as pvt_file:
+            pvt_key = SigningKey.from_pem(pvt_file.read())
+        with open(self.pub_key_loc) as pub_file:
+            pub_key = VerifyingKey.from_pem(pub_file.read())
+
+        # 签名一次以触发曲线基点的预计算表，之后的签名无需再计算
+        pvt_key.sign(b'', sigencode=ecdsa.util.sigencode_string)
+        return pvt_key, pub_key
+
+    def get_key_pair(self):
+        try:
+            file_stamps = self.get_file_stamps()
+        except OSError:
+            file_stamps = None
+
+        with self.lock:
+            if self.key_pair is not None and file_stamps == self.file_stamps:
+                return self.key_pair
+
+            if file_stamps is None:
+                key_pair = Signature.gen_key_pair(self.pvt_key_loc, self.pub_key_loc)
+                file_stamps = self.get_file_stamps()
+            else:
+                key_pair = self.load_key_pair()
+
+            self.key_pair = key_pair
+            self.file_stamps = file_stamps
+            return key_pair
+
+
+_key_store = _KeyStore()
+# 公钥的 hex 字符串 -> 已解码的 VerifyingKey
+_verifying_key_cache = LRUCache(Const.VERIFYING_KEY_CACHE_SIZE)
 
 
 class Signature(object):
 
     @staticmethod
-    def gen_key_pair():
+    def gen_key_pair(pvt_key_loc=Const.PVT_KEY_LOC, pub_key_loc=Const.PUB_KEY_LOC):
         """
-        生成一对秘钥对，分别存储在sk.pem（私钥），vk.pem（公钥）文件中
+        生成一对秘钥对，分别存储在sk.pem（私钥），vk.pem（公钥）文件中，私钥文件只有所有者可以读写
+        :param pvt_key_loc: 私钥文件的路径
+        :param pub_key_loc: 公钥文件的路径
         :return: 返回秘钥对
         """
 
         pvt_key = SigningKey.generate(curve=Const.CURVE)
-        open(Const.PVT_KEY_LOC, "wb").write(pvt_key.to_pem())
+        with os.fdopen(os.open(pvt_key_loc, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as pvt_file:
+            pvt_file.write(pvt_key.to_pem())
         pub_key = pvt_key.get_verifying_key()
-        open(Const.PUB_KEY_LOC, "wb").write(pub_key.to_pem())
+        with open(pub_key_loc, "wb") as pub_file:
+            pub_file.write(pub_key.to_pem())
         return pvt_key, pub_key
 
     @staticmethod
     def get_key_pair():
         """
-        若保存密钥对的文件存在则从文件中读取秘钥，否则重新生成
+        若保存密钥对的文件存在则从文件中读取秘钥，否则重新生成。
+        读取的密钥对会被缓存，密钥文件被修改后才会重新读取
         :return:
         """
-        if os.path.exists(Const.PVT_KEY_LOC) and os.path.exists(Const.PUB_KEY_LOC):
-            pvt_key = SigningKey.from_pem(open(Const.PVT_KEY_LOC).read())
-            pub_key = VerifyingKey.from_pem(open(Const.PUB_KEY_LOC).read())
+        return _key_store.get_key_pair()
 
-        else:
-            pvt_key, pub_key = Signature.gen_key_pair()
+    @staticmethod
+    def get_verifying_key(pub_key_str):
+        """
+        根据公钥的 hex 字符串返回对应的 VerifyingKey，
+        绝大部分签名来自少数几个医院的密钥，因此将解码后的 VerifyingKey 缓存起来重复使用
+        :param pub_key_str: 公钥的 hex 字符串
+        :return:
+        """
+        vk = _verifying_key_cache.get(pub_key_str)
+        if vk is None:
+            vk = VerifyingKey.from_string(bytes.fromhex(pub_key_str), curve=Const.CURVE)
+            _verifying_key_cache.put(pub_key_str, vk)
+        return vk
 
-        return pvt_key, pub_key
+    @staticmethod
+    def get_verifying_key_stats():
+        """
+        返回 VerifyingKey 缓存的命中、未命中与淘汰次数等统计信息
+        :return:
+        """
+        return _verifying_key_cache.get_stats()
 
     @staticmethod
     def sign(pvt_key, content):
@@ -69,7 +153,34 @@ class Signature(object):
         return hashlib.sha256(bytes.fromhex(signature)).hexdigest()
 
 
+def bench_sign(count=200):
+    """
+    对比每次签名都从文件读取密钥与使用缓存密钥时，每秒的签名次数
+    :param count: 每种方式签名的次数
+    :return: (每次读取密钥时的签名数/秒, 使用缓存密钥时的签名数/秒)
+    """
+    content = str({'identifier': '101', 'name': 'bench'})
+    Signature.get_key_pair()
+
+    start = time.time()
+    for _ in range(count):
+        with open(Const.PVT_KEY_LOC) as pvt_file:
+            pvt_key = SigningKey.from_pem(pvt_file.read())
+        with open(Const.PUB_KEY_LOC) as pub_file:
+            VerifyingKey.from_pem(pub_file.read())
+        Signature.sign(pvt_key, content)
+    uncached_rate = count / (time.time() - start)
+
+    start = time.time()
+    for _ in range(count):
+        pvt_key, _ = Signature.get_key_pair()
+        Signature.sign(pvt_key, content)
+    cached_rate = count / (time.time() - start)
+
+    return uncached_rate, cached_rate
+
+
 if __name__ == "__main__":
-    sk, vk = Signature.gen_key_pair()
-    print(sk)
-    print(vk)
+    before, after = bench_sign()
+    print('每次读取密钥: %.1f 次签名/秒' % before)
+    print('使用缓存密钥: %.1f 次签名/秒' % after)
@@ -0,0 +1,305 @@
+import json
+import time
+from collections import OrderedDict
+
+from twisted.internet import reactor, threads
+from twisted.internet.task import LoopingCall
+
+from BlockchainDjango.entity.transaction import Transaction
+from BlockchainDjango.service.block_service import BlockService, DuplicateTxError
+from BlockchainDjango.service.index_service import IndexService
+from BlockchainDjango.util.logging_util import Logger
+from BlockchainDjango.util.lru_cache import LRUCache
+
+
+class Mempool(object):
+    """
+    已通过验证、等待打包进区块的交易单，按加入的先后顺序保存，并以 tx id 去重
+    """
+
+    def __init__(self, recent_capacity=100000, max_retries=3):
+        """
+        :param recent_capacity: 记住最近已打包的 tx id 的个数，用于拒绝重复提交的交易单
+        :param max_retries: 交易单所在的区块写入失败后最多被放回 mempool 的次数，超过后丢弃
+        """
+        # tx_id -> (tx_dict, 字节数, 加入时间)
+        self.txs = OrderedDict()
+        self.byte_size = 0
+        self.recent_ids = LRUCache(recent_capacity)
+        self.duplicates = 0
+        self.max_retries = max_retries
+        # tx_id -> 已被放回的次数
+        self.retries = {}
+        self.dropped = 0
+
+    def add(self, tx_dict):
+        """
+        加入一条交易单
+        :param tx_dict: Transaction 对象的 dict
+        :return: 加入成功返回 True，重复的交易单返回 False
+        """
+        tx_id = tx_dict['id']
+        if tx_id in self.txs or self.recent_ids.get(tx_id) is not None:
+            self.duplicates += 1
+            return False
+
+        tx_bytes = len(json.dumps(tx_dict))
+        self.txs[tx_id] = (tx_dict, tx_bytes, time.time())
+        self.byte_size += tx_bytes
+        return True
+
+    def take(self, max_count, max_bytes):
+        """
+        按加入的先后顺序取出最多 max_count 条、总字节数不超过 max_bytes 的交易单(至少取出一条)
+        :param max_count:
+        :param max_bytes:
+        :return: tx_dict 的list
+        """
+        tx_dicts = []
+        taken_bytes = 0
+        while self.txs and len(tx_dicts) < max_count:
+            tx_id, (tx_dict, tx_bytes, _) = next(iter(self.txs.items()))
+            if tx_dicts and taken_bytes + tx_bytes > max_bytes:
+                break
+
+            del self.txs[tx_id]
+            self.byte_size -= tx_bytes
+            taken_bytes += tx_bytes
+            self.recent_ids.put(tx_id, True)
+            tx_dicts.append(tx_dict)
+
+        return tx_dicts
+
+    def put_back(self, tx_dicts, failed_ids=None):
+        """
+        区块写入失败时，将取出的交易单按原来的顺序放回 mempool 的最前面。
+        已被放回 max_retries 次的交易单不再放回，以免一直写入失败的交易单阻塞之后的交易单
+        :param tx_dicts:
+        :param failed_ids: 导致写入失败的交易单ID，只有这些交易单计入放回次数，为 None 时全部计入
+        :return: 被丢弃的交易单的list
+        """
+        now = time.time()
+        dropped = []
+        failed_ids = set(failed_ids) if failed_ids is not None else None
+        # 写入失败的文档中没有交易单时，不能确定是哪条交易单导致的，全部计入放回次数
+        if failed_ids is not None and not any(tx_dict['id'] in failed_ids for tx_dict in tx_dicts):
+            failed_ids = None
+        for tx_dict in reversed(tx_dicts):
+            tx_id = tx_dict['id']
+            retries = self.retries.get(tx_id, 0)
+            if failed_ids is None or tx_id in failed_ids:
+                retries += 1
+            if retries > self.max_retries:
+                self.retries.pop(tx_id, None)
+                # 丢弃的交易单没有被打包，允许客户端重新提交
+                self.recent_ids.pop(tx_id)
+                dropped.append(tx_dict)
+                continue
+
+            self.retries[tx_id] = retries
+            tx_bytes = len(json.dumps(tx_dict))
+            self.txs[tx_id] = (tx_dict, tx_bytes, now)
+            self.txs.move_to_end(tx_id, last=False)
+            self.byte_size += tx_bytes
+
+        self.dropped += len(dropped)
+        dropped.reverse()
+        return dropped
+
+    def committed(self, tx_dicts):
+        """
+        交易单已写入区块链，不再记录其被放回的次数
+        :param tx_dicts:
+        :return:
+        """
+        for tx_dict in tx_dicts:
+            self.retries.pop(tx_dict['id'], None)
+
+    def oldest_age(self):
+        """
+        返回 mempool 中最早加入的交易单已等待的时间(秒)，mempool 为空时返回 0
+        :return:
+        """
+        if not self.txs:
+            return 0.0
+        _, _, added_time = next(iter(self.txs.values()))
+        return time.time() - added_time
+
+    def __len__(self):
+        return len(self.txs)
+
+
+class BlockProducer(object):
+    """
+    当 mempool 中的交易单数量、字节数达到上限，或最早的交易单等待超时时，
+    通过 BlockService.add_block 将 mempool 中的交易单打包为一个区块，
+    区块的 Merkle 树和链尾更新等开销由一批交易单分摊
+    """
+
+    def __init__(self, mempool, max_txs=500, max_bytes=1024 * 1024, max_wait=1.0):
+        """
+        :param mempool:
+        :param max_txs: 每个区块最多包含的交易单数
+        :param max_bytes: 每个区块中交易单的最大总字节数
+        :param max_wait: 交易单在 mempool 中等待打包的最长时间(秒)
+        """
+        self.mempool = mempool
+        self.max_txs = max_txs
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.producing = False
+        self.check_call = LoopingCall(self.check)
+        self.blocks_produced = 0
+        self.txs_committed = 0
+        self.failures = 0
+
+    def start(self):
+        self.check_call.start(min(self.max_wait, 1.0) / 2, now=False)
+
+    def stop(self):
+        if self.check_call.running:
+            self.check_call.stop()
+
+    def add_tx(self, tx_dict):
+        """
+        将已验证的交易单加入 mempool，mempool 满时立即出块
+        :param tx_dict:
+        :return: 是否加入成功
+        """
+        added = self.mempool.add(tx_dict)
+        if len(self.mempool) >= self.max_txs or self.mempool.byte_size >= self.max_bytes:
+            self.produce_block()
+        return added
+
+    def check(self):
+        if self.mempool.oldest_age() >= self.max_wait:
+            self.produce_block()
+
+    def produce_block(self):
+        """
+        从 mempool 中取出一批交易单，在线程池中写入区块链，同一时间只写入一个区块
+        :return:
+        """
+        if self.producing or not len(self.mempool):
+            return
+
+        tx_dicts = self.mempool.take(self.max_txs, self.max_bytes)
+        self.producing = True
+        d = threads.deferToThread(BlockProducer.commit_txs, tx_dicts)
+        d.addCallbacks(self.block_produced, self.produce_failed, errbackArgs=(tx_dicts,))
+
+    @staticmethod
+    def commit_txs(tx_dicts):
+        """
+        在线程池中执行：去掉已在区块链中的交易单后写入区块。mempool 只在各进程内去重，
+        重启后或发送给其他工作进程的交易单可能已在区块链中，不能让它们导致整个区块写入失败
+        :param tx_dicts:
+        :return: (区块ID，没有需要写入的交易单时为None, 已在区块链中的交易单的list, 写入区块的交易单的list)
+        """
+        tx_blocks = IndexService.find_tx_blocks([tx_dict['id'] for tx_dict in tx_dicts])
+        committed = [tx_dict for tx_dict, tx_block in zip(tx_dicts, tx_blocks) if tx_block is not None]
+        pending = [tx_dict for tx_dict, tx_block in zip(tx_dicts, tx_blocks) if tx_block is None]
+
+        while pending:
+            tx_list = []
+            for tx_dict in pending:
+                tx_obj = Transaction()
+                tx_obj.init_tx_by_dict(tx_dict)
+                tx_list.append(tx_obj)
+            try:
+                return BlockService.add_block(tx_list), committed, pending
+            except DuplicateTxError as e:
+                # 查找交易单索引之后才加入区块链的交易单
+                duplicate_ids = set(e.tx_ids)
+                committed.extend(tx_dict for tx_dict in pending if tx_dict['id'] in duplicate_ids)
+                pending = [tx_dict for tx_dict in pending if tx_dict['id'] not in duplicate_ids]
+        return None, committed, pending
+
+    def block_produced(self, result):
+        block_id, committed, written = result
+        self.producing = False
+        self.mempool.committed(committed + written)
+        self.txs_committed += len(written)
+        if committed:
+            Logger.info('交易单中有 ' + str(len(committed)) + ' 条已在区块链中，不再写入')
+        if block_id is not None:
+            self.blocks_produced += 1
+            Logger.info('出块成功，区块ID为：' + block_id + '，包含交易单 ' + str(len(written)) + ' 条')
+        # 出块期间 mempool 可能又已经满了
+        if len(self.mempool) >= self.max_txs or self.mempool.byte_size >= self.max_bytes:
+            self.produce_block()
+
+    def produce_failed(self, err, tx_dicts):
+        """
+        出块失败时区块可能已经加入区块链，只是之后的步骤失败了，
+        先查找交易单索引，只将不在区块链中的交易单放回 mempool。
+        异常指出了写入失败的文档时，只有这些交易单计入放回次数，其他交易单不会因为别的交易单而被丢弃
+        :param err:
+        :param tx_dicts:
+        :return:
+        """
+        self.failures += 1
+        Logger.info('出块失败: ' + str(err.value))
+        failed_ids = getattr(err.value, 'failed_ids', None)
+        d = threads.deferToThread(IndexService.find_tx_blocks, [tx_dict['id'] for tx_dict in tx_dicts])
+        d.addCallbacks(self.put_back_uncommitted, self.put_back_all, callbackArgs=(tx_dicts, failed_ids),
+                       errbackArgs=(tx_dicts, failed_ids))
+        return d
+
+    def put_back_uncommitted(self, tx_blocks, tx_dicts, failed_ids=None):
+        """
+        :param tx_blocks: 与 tx_dicts 顺序一致的交易单索引查找结果
+        :param tx_dicts:
+        :param failed_ids: 写入失败的文档ID，为 None 时所有交易单都计入放回次数
+        :return:
+        """
+        committed = [tx_dict for tx_dict, tx_block in zip(tx_dicts, tx_blocks) if tx_block is not None]
+        if committed:
+            Logger.info('出块失败的交易单中有 ' + str(len(committed)) + ' 条已在区块链中，不再放回 mempool')
+            self.txs_committed += len(committed)
+            self.mempool.committed(committed)
+        self.put_back([tx_dict for tx_dict, tx_block in zip(tx_dicts, tx_blocks) if tx_block is None], failed_ids)
+
+    def put_back_all(self, err, tx_dicts, failed_ids=None):
+        Logger.info('查找交易单索引失败，交易单全部放回 mempool: ' + str(err.value))
+        self.put_back(tx_dicts, failed_ids)
+
+    def put_back(self, tx_dicts, failed_ids=None):
+        self.producing = False
+        dropped = self.mempool.put_back(tx_dicts, failed_ids)
+        if dropped:
+            Logger.info('交易单多次出块失败，已丢弃: ' + str([tx_dict['id'] for tx_dict in dropped]))
+
+    def get_stats(self):
+        """
+        返回 mempool 深度与出块的统计信息，fill_rate 为平均每个区块的交易单数占 max_txs 的比例
+        :return:
+        """
+        avg_txs = self.txs_committed / self.blocks_produced if self.blocks_produced else 0.0
+        return {
+            'mempool_depth': len(self.mempool),
+            'mempool_bytes': self.mempool.byte_size,
+            'duplicates': self.mempool.duplicates,
+            'blocks_produced': self.blocks_produced,
+            'txs_committed': self.txs_committed,
+            'avg_txs_per_block': avg_txs,
+            'fill_rate': avg_txs / self.max_txs,
+            'failures': self.failures,
+            'dropped': self.mempool.dropped,
+        }
+
+
+def create_producer(produce_blocks=True, **kwargs):
+    """
+    创建并启动使用一个新 Mempool 的 BlockProducer，reactor 关闭前停止出块检查。produce_blocks 为 False 时返回 None
+    :param produce_blocks:
+    :param kwargs: BlockProducer 的其他参数
+    :return:
+    """
+    if not produce_blocks:
+        return None
+
+    producer = BlockProducer(Mempool(), **kwargs)
+    producer.start()
+    reactor.addSystemEventTrigger('before', 'shutdown', producer.stop)
+    return producer
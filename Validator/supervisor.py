@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import queue
+import socket
+import time
+
+from BlockchainDjango.util.logging_util import Logger
+
+
+def create_listen_socket(port, reuse_port, backlog=1024):
+    """
+    创建监听 port 的非阻塞 socket
+    :param port:
+    :param reuse_port: 是否设置 SO_REUSEPORT，设置后多个进程可以各自绑定同一端口，由内核分配新连接
+    :param backlog:
+    :return:
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def run_worker(worker_index, port, listen_sock, stats_queue, verify_processes, stats_interval, produce_blocks):
+    """
+    工作进程：在共享的端口上运行一个 reactor，并定期上报已接受的连接数、收到的消息数以及出块的统计信息
+    :param worker_index:
+    :param port:
+    :param listen_sock: 主进程预先绑定好的 socket，为 None 时通过 SO_REUSEPORT 自行绑定
+    :param stats_queue:
+    :param verify_processes: 验证签名的进程池大小
+    :param stats_interval: 上报统计信息的间隔(秒)
+    :param produce_blocks: 是否将验证通过的交易单放入 mempool 并打包出块
+    :return:
+    """
+    # reactor 在子进程中才导入，避免与主进程共享 reactor 的状态
+    from twisted.internet import reactor
+    from twisted.internet.task import LoopingCall
+    from Validator.verify_engine import VerifyEngine
+    from Validator.validator_protocol import ValidatorFactory
+    from Validator.mempool import create_producer
+
+    if listen_sock is None:
+        listen_sock = create_listen_socket(port, reuse_port=True)
+
+    engine = VerifyEngine(processes=verify_processes)
+    factory = ValidatorFactory(engine, create_producer(produce_blocks))
+    # adoptStreamPort 会复制文件描述符，之后可以关闭原来的 socket
+    reactor.adoptStreamPort(listen_sock.fileno(), socket.AF_INET, factory)
+    listen_sock.close()
+
+    def report_stats():
+        stats_queue.put((worker_index, os.getpid(), factory.get_stats(), time.time()))
+
+    LoopingCall(report_stats).start(stats_interval, now=False)
+    reactor.addSystemEventTrigger('before', 'shutdown', engine.shutdown)
+    Logger.info('工作进程 ' + str(worker_index) + ' 开始监听端口：' + str(port))
+    reactor.run()
+
+
+class Supervisor(object):
+    """
+    在同一个端口上运行多个 reactor 工作进程：
+    支持 SO_REUSEPORT 时各工作进程自行绑定端口，否则由主进程绑定端口后将 socket 交给各工作进程。
+    主进程会重启退出的工作进程，并定期输出各工作进程的连接数与消息速率
+    """
+
+    def __init__(self, port, workers=None, verify_processes=None, stats_interval=5.0, produce_blocks=True):
+        """
+        :param port: 监听的端口
+        :param workers: 工作进程数，默认为 CPU 核数
+        :param verify_processes: 每个工作进程中验证签名的进程池大小，默认为 CPU 核数 / 工作进程数
+        :param stats_interval: 统计信息的间隔(秒)
+        :param produce_blocks: 各工作进程是否将验证通过的交易单放入 mempool 并打包出块
+        """
+        cpu_count = multiprocessing.cpu_count()
+        self.port = port
+        self.workers = workers or cpu_count
+        self.verify_processes = verify_processes or max(1, cpu_count // self.workers)
+        self.stats_interval = stats_interval
+        self.produce_blocks = produce_blocks
+        self.reuse_port = hasattr(socket, 'SO_REUSEPORT')
+        self.context = multiprocessing.get_context('spawn')
+        self.stats_queue = self.context.Queue()
+        self.listen_sock = None
+        # worker_index -> Process
+        self.processes = {}
+        # worker_index -> (pid, messages, timestamp)
+        self.last_stats = {}
+        self.restart_count = 0
+
+    def start_worker(self, worker_index):
+        process = self.context.Process(target=run_worker,
+                                       args=(worker_index, self.port, self.listen_sock, self.stats_queue,
+                                             self.verify_processes, self.stats_interval, self.produce_blocks))
+        process.start()
+        self.processes[worker_index] = process
+        Logger.info('启动工作进程 ' + str(worker_index) + ', pid: ' + str(process.pid))
+
+    def check_workers(self):
+        """
+        重启已退出的工作进程
+        :return:
+        """
+        for worker_index, process in list(self.processes.items()):
+            if not process.is_alive():
+                Logger.info('工作进程 ' + str(worker_index) + ' 已退出, exitcode: ' + str(process.exitcode) +
+                            ', 重新启动')
+                self.last_stats.pop(worker_index, None)
+                self.restart_count += 1
+                self.start_worker(worker_index)
+
+    def collect_stats(self):
+        """
+        读取各工作进程上报的统计信息，返回 {worker_index: 统计信息的dict}，
+        其中包括 pid, connections, messages, msg_rate，以及 mempool 与出块的统计信息
+        :return:
+        """
+        report = {}
+        while True:
+            try:
+                worker_index, pid, stats, timestamp = self.stats_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            msg_rate = 0.0
+            last = self.last_stats.get(worker_index)
+            # 工作进程重启后计数从0开始，pid 不同时不计算速率
+            if last is not None and last[0] == pid and timestamp > last[2]:
+                msg_rate = (stats['messages'] - last[1]) / (timestamp - last[2])
+            self.last_stats[worker_index] = (pid, stats['messages'], timestamp)
+
+            stats['pid'] = pid
+            stats['msg_rate'] = msg_rate
+            report[worker_index] = stats
+
+        return report
+
+    def run(self):
+        # 出块前先验证最新检查点之后的区块，区块链已被篡改时不启动
+        if self.produce_blocks:
+            from BlockchainDjango.service.audit_service import verify_since_checkpoint
+            if not verify_since_checkpoint():
+                Logger.info('最新检查点之后的区块验证失败，Supervisor 不启动')
+                return
+
+        if not self.reuse_port:
+            self.listen_sock = create_listen_socket(self.port, reuse_port=False)
+
+        Logger.info('Supervisor 在端口 ' + str(self.port) + ' 上启动 ' + str(self.workers) + ' 个工作进程' +
+                    (', 使用 SO_REUSEPORT' if self.reuse_port else ', 共享预先绑定的 socket'))
+        for worker_index in range(self.workers):
+            self.start_worker(worker_index)
+
+        try:
+            while True:
+                time.sleep(self.stats_interval)
+                self.check_workers()
+                for worker_index, stats in sorted(self.collect_stats().items()):
+                    Logger.info('工作进程 ' + str(worker_index) + ' 统计: ' + str(stats))
+        except KeyboardInterrupt:
+            Logger.info('Supervisor 退出')
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join()
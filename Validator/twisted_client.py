@@ -1,48 +1,40 @@
-import json
 import time
-from twisted.internet import reactor, protocol
+from twisted.internet import defer, reactor
 
 from BlockchainDjango.service.transaction_service import TransactionService
-from BlockchainDjango.service.message_service import MessageService
-from BlockchainDjango.entity.message import Message
-from BlockchainDjango.util.const import MsgType
 from BlockchainDjango.util.logging_util import Logger
+from Validator.validator_client import ValidatorClient
 
 
-class EchoClient(protocol.Protocol):
-    def connectionMade(self):
-        self.send_tx()
+@defer.inlineCallbacks
+def send_txs(client, tx_count):
+    """
+    在连接池上流水线地发送 tx_count 个测试用的Transaction
+    :param client: ValidatorClient
+    :param tx_count:
+    :return:
+    """
+    yield client.connect()
+    transactions = [TransactionService.gen_tx("signature") for _ in range(tx_count)]
 
-    def dataReceived(self, data):
-        Logger.info("Server said: " + data.decode())
-        self.transport.loseConnection()
+    start = time.time()
+    results = yield defer.gatherResults([client.submit_tx(transaction) for transaction in transactions],
+                                        consumeErrors=True)
+    elapsed = time.time() - start
 
-    def connectionLost(self, reason):
-        Logger.info("connection lost")
+    for transaction, (msg_ok, tx_ok) in zip(transactions, results):
+        Logger.info("Server said: " + transaction.id + " Message: " + str(msg_ok) + ", Transaction: " + str(tx_ok))
+    Logger.info("共发送 " + str(tx_count) + " 个Transaction，用时 " + str(elapsed) + " 秒")
 
-    def send_tx(self):
-        """
-        发送一个测试用的Transaction
-        :return:
-        """
-        transaction = TransactionService.gen_tx("signature")
-        tx_str = json.dumps(MessageService.gen_msg(msg_type=MsgType.CLI.value,
-                                                   transaction=transaction).__dict__)
-        self.transport.write(tx_str.encode())
 
+def main(host='localhost', port=9000, tx_count=100, pool_size=4):
+    client = ValidatorClient(host, port, pool_size=pool_size)
+    d = send_txs(client, tx_count)
+    d.addErrback(lambda err: Logger.info("发送失败: " + str(err.value)))
+    d.addBoth(lambda _: client.close())
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
 
-class EchoFactory(protocol.ClientFactory):
-    def buildProtocol(self, addr):
-        return EchoClient()
 
-    def clientConnectionFailed(self, connector, reason):
-        Logger.info("Connection failed - goodbye!")
-        reactor.stop()
-
-    def clientConnectionLost(self, connector, reason):
-        Logger.info("Connection lost - goodbye!")
-        reactor.stop()
-
-
-reactor.connectTCP("localhost", 9001, EchoFactory())
-reactor.run()
+if __name__ == '__main__':
+    main()
@@ -1,82 +1,44 @@
-from twisted.internet import protocol, reactor
-import multiprocessing
-import json
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
 
+from BlockchainDjango.service.audit_service import verify_since_checkpoint
 from BlockchainDjango.util.logging_util import Logger
-from BlockchainDjango.util.const import MsgType
-from BlockchainDjango.entity.transaction import Transaction
-from BlockchainDjango.entity.message import Message
-from BlockchainDjango.service.transaction_service import TransactionService
-from BlockchainDjango.service.message_service import MessageService
+from Validator.verify_engine import VerifyEngine
+from Validator.validator_protocol import ValidatorFactory
+from Validator.supervisor import Supervisor
+from Validator.mempool import create_producer
 
 
-class Echo(protocol.Protocol):
-    def dataReceived(self, data):
-        # As soon as any data is received, write it back
-        msg = data.decode()
-        Logger.info('接收到客户端数据: ' + msg)
-
-        msg_dict = json.loads(msg)
-        msg_type = msg_dict['msg_type']
-        if msg_type == MsgType.CLI.value:
-            Logger.info("msg类型为: " + msg_type)
-            self.process_cli_msg(msg_dict)
-
-        else:
-            raise Exception("未知的msg类型")
-
-        self.transport.write("接收到你的数据".encode())
-
-    def process_cli_msg(self, msg_dict):
-        """
-        用于处理客户端发送的请求消息
-        :param msg_dict:
-        :return:
-        """
-        # 1. 验证 Message 本身是否正确
-        verify_rlt = MessageService.verify_msg(Message(**msg_dict))
-        if verify_rlt:
-            Logger.info("MessageService的内容为正确")
-            self.transport.write("MessageService内容正确\n".encode())
-        else:
-            Logger.info("MessageService的内容为错误")
-            self.transport.write("MessageService内容错误\n".encode())
-
-        # 2. 验证 Message 中所存储的 Transaction 是否正确
-        tx_obj = Transaction()
-        tx_dict = msg_dict['transaction']
-        tx_obj.init_tx_by_dict(tx_dict)
-        Logger.info("Transaction的内容为: " + str(tx_dict))
-        verify_rlt = TransactionService.verify_tx(tx_obj)
-        if verify_rlt:
-            Logger.info("Transaction的内容为正确")
-            self.transport.write("Transaction内容正确\n".encode())
-        else:
-            Logger.info("Transaction的内容为错误")
-            self.transport.write("Transaction内容错误\n".encode())
-
-
-class EchoFactory(protocol.Factory):
-    def buildProtocol(self, addr):
-        return Echo()
-
-
-def start_server(port):
+def start_server(port, verify_processes=None, batch_size=64, max_latency=0.01, produce_blocks=True,
+                 stats_interval=5.0):
     """
     根据port启动相应对的reactor
     :param port:
+    :param verify_processes: 验证签名的进程池大小，默认为 CPU 核数
+    :param batch_size: 每批验证的 Message 个数
+    :param max_latency: Message 等待成批的最长时间(秒)
+    :param produce_blocks: 是否将验证通过的交易单放入 mempool 并打包出块
+    :param stats_interval: 输出 VerifyingKey 缓存统计的间隔(秒)
     :return:
     """
     port = int(port)
+    # 出块前先验证最新检查点之后的区块，区块链已被篡改时不启动
+    if produce_blocks and not verify_since_checkpoint():
+        Logger.info('最新检查点之后的区块验证失败，服务不启动')
+        return
+
+    engine = VerifyEngine(batch_size=batch_size, max_latency=max_latency, processes=verify_processes)
+    reactor.addSystemEventTrigger('before', 'shutdown', engine.shutdown)
     Logger.info('服务起开始监听端口：' + str(port))
-    reactor.listenTCP(port, EchoFactory())
+    reactor.listenTCP(port, ValidatorFactory(engine, create_producer(produce_blocks)))
+
+    def log_key_cache_stats():
+        Logger.info('VerifyingKey 缓存统计: ' + str(engine.get_key_cache_stats()))
+
+    LoopingCall(log_key_cache_stats).start(stats_interval, now=False)
     reactor.run()
 
 
 if __name__ == '__main__':
-    pool = multiprocessing.Pool(processes=4)
-    for index in range(4):
-        pool.apply_async(start_server, (9000+index, ))
-    pool.close()
-    pool.join()
-    Logger.info("Sub-process(es) done.")
\ No newline at end of file
+    # 在 9000 端口上运行与 CPU 核数相同的工作进程，由 Supervisor 负责重启退出的工作进程
+    Supervisor(9000).run()
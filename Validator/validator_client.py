@@ -0,0 +1,118 @@
+import itertools
+
+from twisted.internet import defer, endpoints, reactor
+from twisted.protocols.basic import Int32StringReceiver
+
+from BlockchainDjango.service.message_service import MessageService
+from BlockchainDjango.util.const import MsgType
+from BlockchainDjango.util.logging_util import Logger
+from Validator.validator_protocol import MAX_FRAME_LENGTH, encode_frame, decode_frame
+
+
+class ValidatorClientProtocol(Int32StringReceiver):
+    """
+    Validator 客户端的协议，在一条长连接上流水线地发送请求，并根据 corr_id 将乱序返回的响应交给对应的 Deferred
+    """
+    MAX_LENGTH = MAX_FRAME_LENGTH
+
+    def __init__(self, client):
+        self.client = client
+        # corr_id -> Deferred
+        self.pending = {}
+
+    def connectionMade(self):
+        self.client.connection_made(self)
+
+    def connectionLost(self, reason):
+        pending, self.pending = self.pending, {}
+        for d in pending.values():
+            d.errback(reason)
+        self.client.connection_lost(self)
+
+    def submit(self, corr_id, msg_dict):
+        d = defer.Deferred()
+        self.pending[corr_id] = d
+        self.sendString(encode_frame({'corr_id': corr_id, 'msg': msg_dict}))
+        return d
+
+    def stringReceived(self, data):
+        response = decode_frame(data)
+        d = self.pending.pop(response.get('corr_id'), None)
+        if d is None:
+            Logger.info('收到未知 corr_id 的响应: ' + str(response))
+            return
+
+        if 'error' in response:
+            d.errback(Exception(response['error']))
+        else:
+            d.callback((response['msg_ok'], response['tx_ok']))
+
+
+class ValidatorClient(object):
+    """
+    Validator 的客户端：维持 pool_size 条到 Validator 的长连接，
+    以 round-robin 的方式在各连接上流水线地提交 Message，断开的连接会自动重连
+    """
+
+    def __init__(self, host, port, pool_size=4, reconnect_delay=1.0):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.reconnect_delay = reconnect_delay
+        self.endpoint = endpoints.TCP4ClientEndpoint(reactor, host, port)
+        self.connections = []
+        self.corr_ids = itertools.count()
+        self.round_robin = itertools.count()
+        self.closing = False
+
+    def connect(self):
+        """
+        建立 pool_size 条连接
+        :return: Deferred，全部连接建立后回调
+        """
+        return defer.gatherResults([self.connect_one() for _ in range(self.pool_size)], consumeErrors=True)
+
+    def connect_one(self):
+        d = endpoints.connectProtocol(self.endpoint, ValidatorClientProtocol(self))
+        d.addErrback(self.connect_failed)
+        return d
+
+    def connect_failed(self, err):
+        Logger.info('连接 Validator ' + self.host + ':' + str(self.port) + ' 失败: ' + str(err.value))
+        if not self.closing:
+            reactor.callLater(self.reconnect_delay, self.connect_one)
+
+    def connection_made(self, conn):
+        self.connections.append(conn)
+
+    def connection_lost(self, conn):
+        if conn in self.connections:
+            self.connections.remove(conn)
+        if not self.closing:
+            reactor.callLater(self.reconnect_delay, self.connect_one)
+
+    def submit(self, msg_dict):
+        """
+        提交一个 Message
+        :param msg_dict: Message 对象的 dict
+        :return: Deferred，收到响应后回调 (Message 是否正确, Transaction 是否正确)
+        """
+        if not self.connections:
+            return defer.fail(Exception('没有可用的 Validator 连接'))
+
+        conn = self.connections[next(self.round_robin) % len(self.connections)]
+        return conn.submit(next(self.corr_ids), msg_dict)
+
+    def submit_tx(self, transaction):
+        """
+        将 Transaction 封装为 Message 后提交
+        :param transaction: Transaction 对象
+        :return:
+        """
+        msg = MessageService.gen_msg(msg_type=MsgType.CLI.value, transaction=transaction)
+        return self.submit(msg.__dict__)
+
+    def close(self):
+        self.closing = True
+        for conn in list(self.connections):
+            conn.transport.loseConnection()
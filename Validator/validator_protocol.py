@@ -0,0 +1,117 @@
+import json
+
+from twisted.internet.protocol import Factory
+from twisted.protocols.basic import Int32StringReceiver
+
+from BlockchainDjango.util.logging_util import Logger
+from BlockchainDjango.util.const import MsgType
+
+# 单个帧的最大长度(字节)
+MAX_FRAME_LENGTH = 1024 * 1024
+
+
+def encode_frame(frame_dict):
+    return json.dumps(frame_dict).encode('utf-8')
+
+
+def decode_frame(data):
+    return json.loads(data.decode('utf-8'))
+
+
+class ValidatorProtocol(Int32StringReceiver):
+    """
+    Validator 服务端的协议。每个帧由 4 字节的长度前缀与 json 组成，由 Int32StringReceiver 增量解析，
+    TCP 拆包、粘包都不会影响解析。
+    请求帧为 {'corr_id': ..., 'msg': Message 对象的 dict}，
+    响应帧为 {'corr_id': ..., 'msg_ok': bool, 'tx_ok': bool, 'accepted': 是否加入了mempool}
+    或 {'corr_id': ..., 'error': 错误信息}，
+    同一连接上可以连续发送多个请求，响应按验证完成的先后返回，客户端通过 corr_id 对应请求
+    """
+    MAX_LENGTH = MAX_FRAME_LENGTH
+
+    def stringReceived(self, data):
+        self.factory.messages += 1
+        try:
+            request = decode_frame(data)
+            corr_id = request['corr_id']
+            msg_dict = request['msg']
+            if not isinstance(msg_dict, dict):
+                raise TypeError('msg 不是 dict: ' + type(msg_dict).__name__)
+        except (ValueError, KeyError, TypeError) as e:
+            Logger.info('无法解析的请求帧: ' + str(e))
+            self.send_frame({'corr_id': None, 'error': '无法解析的请求帧'})
+            return
+
+        msg_type = msg_dict.get('msg_type')
+        if msg_type == MsgType.CLI.value:
+            self.process_cli_msg(corr_id, msg_dict)
+
+        else:
+            Logger.info('未知的msg类型: ' + str(msg_type))
+            self.send_frame({'corr_id': corr_id, 'error': '未知的msg类型'})
+
+    def process_cli_msg(self, corr_id, msg_dict):
+        """
+        用于处理客户端发送的请求消息，签名验证交给 VerifyEngine 在进程池中完成
+        :param corr_id:
+        :param msg_dict:
+        :return:
+        """
+        d = self.factory.engine.submit(msg_dict)
+        d.addCallback(self.reply_verify_result, corr_id, msg_dict)
+        d.addErrback(self.reply_error, corr_id)
+        return d
+
+    def reply_verify_result(self, verify_rlt, corr_id, msg_dict):
+        """
+        将验证结果返回给客户端
+        :param verify_rlt: (Message 是否正确, Transaction 是否正确)
+        :param corr_id:
+        :param msg_dict:
+        :return:
+        """
+        msg_ok, tx_ok = verify_rlt
+        # 验证通过的交易单加入 mempool，等待打包进区块
+        accepted = False
+        if msg_ok and tx_ok and self.factory.producer is not None:
+            accepted = self.factory.producer.add_tx(msg_dict['transaction'])
+
+        self.send_frame({'corr_id': corr_id, 'msg_ok': msg_ok, 'tx_ok': tx_ok, 'accepted': accepted})
+        return verify_rlt
+
+    def reply_error(self, err, corr_id):
+        Logger.info('验证Message时出错: ' + str(err.value))
+        self.send_frame({'corr_id': corr_id, 'error': '验证Message时出错'})
+
+    def send_frame(self, frame_dict):
+        # 验证完成前客户端可能已经断开连接
+        if self.transport is not None and self.connected:
+            self.sendString(encode_frame(frame_dict))
+
+
+class ValidatorFactory(Factory):
+    """
+    创建 ValidatorProtocol，并统计已接受的连接数和收到的消息数
+    """
+    protocol = ValidatorProtocol
+
+    def __init__(self, engine, producer=None):
+        """
+        :param engine: 验证签名的 VerifyEngine
+        :param producer: 将验证通过的交易单打包出块的 BlockProducer，为 None 时只验证不出块
+        """
+        self.engine = engine
+        self.producer = producer
+        self.connections = 0
+        self.messages = 0
+
+    def get_stats(self):
+        stats = {'connections': self.connections, 'messages': self.messages}
+        stats.update(self.engine.get_stats())
+        if self.producer is not None:
+            stats.update(self.producer.get_stats())
+        return stats
+
+    def buildProtocol(self, addr):
+        self.connections += 1
+        return Factory.buildProtocol(self, addr)
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from twisted.internet import defer, reactor
+from twisted.python import failure
+
+from BlockchainDjango.entity.transaction import Transaction
+from BlockchainDjango.entity.message import Message
+from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.service.message_service import MessageService
+from BlockchainDjango.util.signature import Signature
+
+
+def verify_msg_dict(msg_dict):
+    """
+    验证 Message 本身及其中所存储的 Transaction 的签名是否正确，
+    Transaction 的 id 必须由其签名生成，否则同一签名可以以不同的 id 重复提交
+    :param msg_dict: Message 对象的 dict
+    :return: (Message 是否正确, Transaction 是否正确)
+    """
+    try:
+        msg_ok = bool(MessageService.verify_msg(Message(**msg_dict)))
+    except Exception:
+        # 签名错误时 ecdsa 会抛出 BadSignatureError, msg 格式错误时也视为验证失败
+        msg_ok = False
+
+    try:
+        tx_obj = Transaction()
+        tx_obj.init_tx_by_dict(msg_dict['transaction'])
+        tx_ok = tx_obj.id == Signature.gen_id_by_sig(tx_obj.signature) and bool(TransactionService.verify_tx(tx_obj))
+    except Exception:
+        tx_ok = False
+
+    return msg_ok, tx_ok
+
+
+def verify_batch(msg_dicts):
+    """
+    在进程池的工作进程中验证一批 Message
+    :param msg_dicts:
+    :return: (与 msg_dicts 顺序一致的 (Message 是否正确, Transaction 是否正确) 的list,
+              工作进程的 pid, 工作进程中 VerifyingKey 缓存的统计信息)
+    """
+    results = [verify_msg_dict(msg_dict) for msg_dict in msg_dicts]
+    return results, os.getpid(), Signature.get_verifying_key_stats()
+
+
+class VerifyEngine(object):
+    """
+    将待验证的 Message 攒成批，交给与 CPU 核数相同大小的进程池并行验证，
+    验证结果以 Deferred 的形式返回给 reactor 线程，验证签名不再阻塞 reactor
+    """
+
+    def __init__(self, batch_size=64, max_latency=0.01, processes=None):
+        """
+        :param batch_size: 攒够 batch_size 个 Message 后立即提交验证
+        :param max_latency: 第一个 Message 等待成批的最长时间(秒)，超时后不足一批也提交验证
+        :param processes: 进程池大小，默认为 CPU 核数
+        """
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.processes = processes or multiprocessing.cpu_count()
+        self.executor = ProcessPoolExecutor(max_workers=self.processes,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        # [(msg_dict, Deferred), ...]
+        self.pending = []
+        self.flush_call = None
+        self.in_flight = 0
+        # 工作进程的 pid -> 该进程中 VerifyingKey 缓存的统计信息
+        self.key_cache_stats = {}
+
+    def submit(self, msg_dict):
+        """
+        提交一个待验证的 Message，只能在 reactor 线程中调用
+        :param msg_dict: Message 对象的 dict
+        :return: Deferred，验证完成后回调 (Message 是否正确, Transaction 是否正确)
+        """
+        d = defer.Deferred()
+        self.pending.append((msg_dict, d))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.flush_call is None:
+            self.flush_call = reactor.callLater(self.max_latency, self.flush)
+
+        return d
+
+    def flush(self):
+        """
+        将当前攒下的 Message 作为一批提交给进程池
+        :return:
+        """
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+        self.in_flight += len(batch)
+        future = self.executor.submit(verify_batch, [msg_dict for msg_dict, _ in batch])
+        # 进程池在其他线程中回调，需要回到 reactor 线程中触发 Deferred
+        future.add_done_callback(lambda f: reactor.callFromThread(self._batch_done, batch, f))
+
+    def _batch_done(self, batch, future):
+        self.in_flight -= len(batch)
+        try:
+            results, pid, key_cache_stats = future.result()
+        except Exception as e:
+            err = failure.Failure(e)
+            for _, d in batch:
+                d.errback(err)
+            return
+
+        self.key_cache_stats[pid] = key_cache_stats
+        for (_, d), result in zip(batch, results):
+            d.callback(result)
+
+    def get_key_cache_stats(self):
+        """
+        汇总各工作进程中 VerifyingKey 缓存的命中、未命中与淘汰次数
+        :return:
+        """
+        totals = {'hits': 0, 'misses': 0, 'evictions': 0}
+        for stats in self.key_cache_stats.values():
+            for name in totals:
+                totals[name] += stats[name]
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_ratio'] = totals['hits'] / lookups if lookups else 0.0
+        return totals
+
+    def get_stats(self):
+        return {'processes': self.processes, 'pending': len(self.pending), 'in_flight': self.in_flight,
+                'verifying_key_cache': self.get_key_cache_stats()}
+
+    def shutdown(self):
+        self.flush()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,72 @@
+from unittest import TestCase
+from BlockchainDjango.entity.block import Block
+from BlockchainDjango.service.audit_service import audit_block, verify_since_checkpoint
+from BlockchainDjango.service.block_service import BlockService
+from BlockchainDjango.service.checkpoint_service import CheckpointService
+from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.storage import set_store
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.merkle_tree import gen_merkle_tree
+
+
+def gen_block_doc(tx_list):
+    tree_hash = gen_merkle_tree([tx.__dict__.__str__() for tx in tx_list])
+    block = Block('0' * 63 + '1', tree_hash, 1510000000.5, len(tx_list), [tx.id for tx in tx_list])
+    return dict(block.__dict__)
+
+
+class TestAuditService(TestCase):
+    def test_audit_block(self):
+        tx_list = [TransactionService.gen_tx('tx_' + str(i)) for i in range(3)]
+        block_doc = gen_block_doc(tx_list)
+        tx_dicts = [dict(tx.__dict__, tx_id=tx.id) for tx in tx_list]
+        self.assertEqual([], audit_block(block_doc, block_doc['tx_list'], tx_dicts))
+
+        # 篡改交易单内容后，Merkle 根与签名都无法通过验证
+        tx_dicts[1]['content'] = 'tampered'
+        self.assertEqual(2, len(audit_block(block_doc, block_doc['tx_list'], tx_dicts)))
+
+    def test_audit_block_bloom(self):
+        tx_list = [TransactionService.gen_tx('tx_' + str(i)) for i in range(3)]
+        block_doc = gen_block_doc(tx_list)
+        block_doc['bloom'] = BlockService.gen_bloom(tx_list)
+        tx_dicts = [dict(tx.__dict__) for tx in tx_list]
+        self.assertEqual([], audit_block(block_doc, block_doc['tx_list'], tx_dicts))
+
+        # 替换为不包含这些交易单的 Bloom 过滤器，查找时这些交易单会被跳过
+        block_doc['bloom'] = BlockService.gen_bloom(tx_list[:1])
+        self.assertEqual(['Bloom 过滤器与交易单不一致'], audit_block(block_doc, block_doc['tx_list'], tx_dicts))
+
+    def test_audit_block_header(self):
+        tx_list = [TransactionService.gen_tx('tx')]
+        block_doc = gen_block_doc(tx_list)
+        block_doc['time_stamp'] = 1510000001.5
+        self.assertEqual(['区块ID与区块头的哈希不一致'], audit_block(block_doc, block_doc['tx_list'], [tx_list[0].__dict__]))
+
+    def test_audit_genesis_block(self):
+        init_content = ['This is genesis block']
+        block = Block('0' * 64, gen_merkle_tree(init_content), 1510000000.5, 1, init_content)
+        self.assertEqual([], audit_block(block.get_header_doc(), init_content, None))
+
+    def test_verify_since_checkpoint(self):
+        store = SQLiteStore(':memory:')
+        set_store(store)
+        try:
+            block_ids = [BlockService.init_block()]
+            for i in range(5):
+                block_ids.append(BlockService.append_block([TransactionService.gen_tx('tx_' + str(i))]))
+            self.assertTrue(verify_since_checkpoint(chunk_size=2))
+
+            cum_hash = ''
+            for block_id in block_ids[:4]:
+                cum_hash = CheckpointService.calc_cum_hash(cum_hash, block_id)
+            CheckpointService.create_checkpoint(store, 3, block_ids[3], cum_hash)
+            self.assertTrue(verify_since_checkpoint(chunk_size=2))
+
+            # 检查点之后的区块中的交易单被篡改
+            tx_doc = store.get(BlockService.get_block_tx_ids([store.get(block_ids[5])])[0][0])
+            tx_doc['Transaction']['content'] = 'tampered'
+            store.put(tx_doc)
+            self.assertFalse(verify_since_checkpoint(chunk_size=2))
+        finally:
+            set_store(None)
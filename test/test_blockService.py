@@ -1,5 +1,16 @@
 from unittest import TestCase
-from BlockchainDjango.service.block_service import BlockService
+from BlockchainDjango.service import block_service
+from BlockchainDjango.service.block_service import BlockService, DuplicateTxError
+from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.storage import set_store
+from BlockchainDjango.service.index_service import IndexService
+from BlockchainDjango.storage.base import BulkSaveError, ConflictError
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import Const
+from BlockchainDjango.entity.block import Block
+from BlockchainDjango.util.merkle_tree import MerkleTree
+from BlockchainDjango.util.bloom_filter import BloomFilter
+from BlockchainDjango.entity.transaction import Transaction
 
 
 class TestBlockService(TestCase):
@@ -11,3 +22,106 @@ class TestBlockService(TestCase):
 
     def test_show_block_chain(self):
         BlockService.show_block_chain()
+
+    def test_verify_tx_proof(self):
+        tx_dicts = [{'id': 'tx' + str(i), 'signature': '', 'tx_type': 'string', 'pub_key': '', 'content': str(i),
+                     'timestamp': ''} for i in range(5)]
+        tree = MerkleTree([tx_dict.__str__() for tx_dict in tx_dicts])
+        # 查询得到的交易单中附加的 tx_id 不影响验证
+        tx_dicts[3]['tx_id'] = 'tx3'
+        block = Block('0' * 64, tree.get_root_hex(), 1510000000.5, 5, [tx_dict['id'] for tx_dict in tx_dicts])
+        block_doc = dict(block.__dict__)
+        tx_proof = {'tx_id': 'tx3', 'block_id': block.get_id(), 'header': BlockService.get_block_header(block_doc),
+                    'index': 3, 'leaf_hash': tree.leaves[3].hex(), 'proof': tree.get_proof(3)}
+
+        self.assertTrue(BlockService.verify_tx_proof(tx_proof, tx_dicts[3]))
+        self.assertFalse(BlockService.verify_tx_proof(tx_proof, tx_dicts[2]))
+        tx_proof['header']['time_stamp'] = 1510000001.5
+        self.assertFalse(BlockService.verify_tx_proof(tx_proof))
+
+    def test_gen_bloom(self):
+        tx = Transaction(content={'identifier': '101', 'patient_id': '102'})
+        tx.id = 'tx1'
+        bloom = BloomFilter.from_dict(BlockService.gen_bloom([tx]))
+        for key in ('tx1', '101', '102'):
+            self.assertIn(key, bloom)
+        self.assertEqual(['tx1', '101', '102'], BlockService.get_bloom_keys('tx1', tx.content))
+
+    def test_update_pending_indexes(self):
+        class FailingStore(SQLiteStore):
+            """前 failures 次批量写入失败"""
+            def __init__(self, failures):
+                super(FailingStore, self).__init__(':memory:')
+                self.failures = failures
+
+            def put_many(self, docs):
+                if self.failures:
+                    self.failures -= 1
+                    raise BulkSaveError([(docs[0]['_id'], ConflictError('conflict'))])
+                return super(FailingStore, self).put_many(docs)
+
+        tx = Transaction(content='a')
+        tx.id = 'tx1'
+        store = FailingStore(Const.INDEX_UPDATE_MAX_RETRIES + 1)
+        block_service._pending_indexes.add([tx], 'block1', 1)
+        block_service._pending_indexes.add([], 'block2', 2)
+        try:
+            # 索引更新失败时不抛出异常，区块按顺序留在队列中
+            self.assertEqual(2, BlockService.update_pending_indexes(store))
+            self.assertIsNone(store.get(IndexService.get_height_key(1)))
+
+            self.assertEqual(0, BlockService.update_pending_indexes(store))
+            self.assertEqual('block1', store.get(IndexService.get_tx_key('tx1'))['block_id'])
+            self.assertEqual('block2', store.get(IndexService.get_height_key(2))['block_id'])
+        finally:
+            block_service._pending_indexes.clear()
+
+    def test_append_block_duplicate_tx(self):
+        store = SQLiteStore(':memory:')
+        set_store(store)
+        try:
+            BlockService.init_block()
+            tx1 = TransactionService.gen_tx('tx1')
+            tx2 = TransactionService.gen_tx('tx2')
+            BlockService.append_block([tx1])
+
+            # 已在区块链中的交易单在写入前被拒绝，同一区块中的其他交易单没有被写入
+            with self.assertRaises(DuplicateTxError) as cm:
+                BlockService.append_block([tx2, tx1])
+            self.assertEqual([tx1.id], cm.exception.tx_ids)
+            self.assertIsNone(store.get(tx2.id))
+
+            # 其他交易单可以重新提交
+            block_id = BlockService.append_block([tx2])
+            self.assertEqual(block_id, IndexService.find_tx_block(tx2.id)['block_id'])
+        finally:
+            set_store(None)
+
+    def test_append_block_partial_write(self):
+        class RacingStore(SQLiteStore):
+            """第一次批量写入前，另一个进程写入了同一ID、内容不同的交易单"""
+            racing_id = None
+
+            def put_many(self, docs):
+                if self.racing_id is not None:
+                    super(RacingStore, self).put({'_id': self.racing_id, 'Transaction': {'id': self.racing_id}})
+                    self.racing_id = None
+                return super(RacingStore, self).put_many(docs)
+
+        store = RacingStore(':memory:')
+        set_store(store)
+        try:
+            BlockService.init_block()
+            doc_ids = {doc['_id'] for doc in store.iterate()}
+            tx1 = TransactionService.gen_tx('tx1')
+            tx2 = TransactionService.gen_tx('tx2')
+            store.racing_id = tx1.id
+            with self.assertRaises(BulkSaveError):
+                BlockService.append_block([tx2, tx1])
+            # 写入失败的区块中已写入成功的区块头、区块体与交易单都被删除
+            self.assertEqual(doc_ids | {tx1.id}, {doc['_id'] for doc in store.iterate()})
+
+            block_id = BlockService.append_block([tx2])
+            self.assertEqual(block_id, store.get_head()['last_block_id'])
+        finally:
+            set_store(None)
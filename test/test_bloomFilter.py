@@ -0,0 +1,16 @@
+from unittest import TestCase
+from BlockchainDjango.util.bloom_filter import BloomFilter
+
+
+class TestBloomFilter(TestCase):
+    def test_contains(self):
+        bloom = BloomFilter.create(100, 0.01)
+        for i in range(100):
+            bloom.add('101' + str(i))
+
+        bloom = BloomFilter.from_dict(bloom.to_dict())
+        for i in range(100):
+            self.assertIn('101' + str(i), bloom)
+        # 误判率应接近 fp_rate
+        false_positives = sum(1 for i in range(10000) if 'other' + str(i) in bloom)
+        self.assertLess(false_positives, 300)
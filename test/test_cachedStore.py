@@ -0,0 +1,58 @@
+from unittest import TestCase
+from BlockchainDjango.storage.cached_store import CachedStore, MemorySharedCache
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import Const
+
+
+class CountingStore(SQLiteStore):
+    """记录从存储中读取的文档ID"""
+
+    def __init__(self):
+        super(CountingStore, self).__init__(':memory:')
+        self.reads = []
+
+    def get_many(self, doc_ids):
+        self.reads.extend(doc_ids)
+        return super(CountingStore, self).get_many(doc_ids)
+
+
+class TestCachedStore(TestCase):
+    def setUp(self):
+        self.backend = CountingStore()
+        self.backend.put_many([{'_id': 'b1', 'pre_id': 'g'}, {'_id': 't1', 'Transaction': {'id': 't1'}},
+                               {'_id': Const.LAST_BLOCK_ID, 'last_block_id': 'b1'}])
+
+    def test_read_through(self):
+        store = CachedStore(self.backend)
+        self.assertEqual('g', store['b1']['pre_id'])
+        self.assertEqual(['b1', 't1', None], [doc and doc['_id'] for doc in store.get_many(['b1', 't1', 'x'])])
+        # 修改返回的文档不影响缓存
+        store['t1']['Transaction']['tx_id'] = 't1'
+        self.assertNotIn('tx_id', store['t1']['Transaction'])
+        self.assertEqual(['b1', 't1', 'x'], self.backend.reads)
+
+        stats = store.get_cache_stats()
+        self.assertEqual(2, stats['store_cache_size'])
+        self.assertGreater(stats['store_cache_bytes'], 0)
+        self.assertEqual(3, stats['store_cache_hits'])
+
+    def test_head_bypasses_cache(self):
+        store = CachedStore(self.backend)
+        head_doc = store.get_head()
+        self.assertTrue(store.swap_head(dict(head_doc, last_block_id='b2')))
+        self.assertEqual('b2', store[Const.LAST_BLOCK_ID]['last_block_id'])
+        self.assertEqual(0, store.get_cache_stats()['store_cache_size'])
+
+    def test_shared_cache(self):
+        shared_cache = MemorySharedCache()
+        CachedStore(self.backend, shared_cache=shared_cache).get('b1')
+        # 另一个进程的缓存从共享缓存中读取
+        other = CachedStore(self.backend, shared_cache=shared_cache)
+        self.assertEqual('g', other['b1']['pre_id'])
+        self.assertEqual(['b1'], self.backend.reads)
+        self.assertEqual(1, other.get_cache_stats()['shared_cache_hits'])
+
+    def test_delete(self):
+        store = CachedStore(self.backend)
+        store.delete(store['b1'])
+        self.assertIsNone(store.get('b1'))
@@ -0,0 +1,15 @@
+from unittest import TestCase
+from BlockchainDjango.service.checkpoint_service import CheckpointService
+
+
+class TestCheckpointService(TestCase):
+    def test_verify_checkpoint(self):
+        cum_hash = CheckpointService.calc_cum_hash(CheckpointService.calc_cum_hash('', 'a'), 'b')
+        checkpoint_dict = dict(CheckpointService.gen_checkpoint(1, 'b', cum_hash).__dict__)
+        self.assertEqual('checkpoint:1', checkpoint_dict['_id'])
+        self.assertTrue(CheckpointService.verify_checkpoint(checkpoint_dict))
+        # 不受信任的公钥签名的检查点
+        self.assertFalse(CheckpointService.verify_checkpoint(checkpoint_dict, trusted_pub_keys=set()))
+
+        checkpoint_dict['height'] = 2
+        self.assertFalse(CheckpointService.verify_checkpoint(checkpoint_dict))
@@ -0,0 +1,35 @@
+import gc
+import socket
+from unittest import TestCase
+from BlockchainDjango.util.couchdb_util import _BoundedConnectionPool
+
+
+class TestBoundedConnectionPool(TestCase):
+    def setUp(self):
+        # 只需要能建立 TCP 连接，不需要真正的 couchdb
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(16)
+        self.url = 'http://127.0.0.1:%d/' % self.server.getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_open_count(self):
+        pool = _BoundedConnectionPool(timeout=5, max_idle=1)
+        conns = [pool.get(self.url) for _ in range(3)]
+        self.assertEqual(3, pool.open_count())
+
+        # 超过 max_idle 的连接在放回时被关闭
+        pool.release(self.url, conns[0])
+        pool.release(self.url, conns[1])
+        self.assertEqual(1, pool.idle_count())
+        self.assertEqual(2, pool.open_count())
+
+        # 出错时 couchdb.http 直接关闭并丢弃连接，不放回连接池
+        conns[2].close()
+        self.assertEqual(1, pool.open_count())
+        del conns
+        gc.collect()
+        self.assertEqual(1, pool.open_count())
+        self.assertEqual(0, len(pool.in_use))
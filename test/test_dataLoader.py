@@ -0,0 +1,26 @@
+from unittest import TestCase
+from BlockchainDjango.service.data_loader import DataLoader, RequestLoaders
+
+
+class TestDataLoader(TestCase):
+    def test_batch_and_memoize(self):
+        batches = []
+
+        def batch_func(keys):
+            batches.append(keys)
+            return [key * 2 for key in keys]
+
+        loader = DataLoader(batch_func)
+        self.assertEqual([2, 4, 2], loader.load_many([1, 2, 1]))
+        loader.prime([3, 2, 4])
+        self.assertEqual(6, loader.load(3))
+        self.assertEqual(8, loader.load(4))
+        self.assertEqual([[1, 2], [3, 4]], batches)
+
+    def test_request_scope(self):
+        class Request(object):
+            pass
+
+        request = Request()
+        self.assertIs(RequestLoaders.get(request), RequestLoaders.get(request))
+        self.assertIsNot(RequestLoaders.get(request), RequestLoaders.get(Request()))
@@ -0,0 +1,74 @@
+import threading
+import time
+from concurrent.futures import Future
+from unittest import TestCase
+from BlockchainDjango.service.group_commit import GroupCommitWriter
+
+
+class TestGroupCommitWriter(TestCase):
+    def test_concurrent_submit(self):
+        blocks = []
+
+        def append(tx_list):
+            # 模拟写入区块的耗时，使写入期间到达的请求合并为一组
+            time.sleep(0.05)
+            blocks.append(tx_list)
+            return 'block_' + str(len(blocks))
+
+        writer = GroupCommitWriter(append, window=0.01)
+        results = {}
+
+        def submit(index):
+            results[index] = writer.submit(['tx_' + str(index)])
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(20, sum(len(tx_list) for tx_list in blocks))
+        self.assertLess(len(blocks), 20)
+        # 每个调用者拿到的是其交易单所在区块的ID
+        for index, block_id in results.items():
+            self.assertIn('tx_' + str(index), blocks[int(block_id.split('_')[1]) - 1])
+
+    def test_max_txs(self):
+        writer = GroupCommitWriter(lambda tx_list: len(tx_list), window=0.05, max_txs=3)
+        self.assertEqual(4, writer.submit(['a', 'b', 'c', 'd']))
+
+    def test_append_failed(self):
+        def append(tx_list):
+            raise ValueError('写入失败')
+
+        writer = GroupCommitWriter(append)
+        with self.assertRaises(ValueError):
+            writer.submit(['a'])
+        self.assertEqual(1, writer.get_stats()['failures'])
+
+    def test_isolate_failed_caller(self):
+        class DuplicateError(Exception):
+            def __init__(self, tx_ids):
+                super(DuplicateError, self).__init__(tx_ids)
+                self.tx_ids = tx_ids
+
+        blocks = []
+
+        def append(tx_list):
+            if 'dup' in tx_list:
+                raise DuplicateError(['dup'])
+            if 'bad' in tx_list:
+                raise ValueError('写入失败')
+            blocks.append(tx_list)
+            return 'block_' + str(len(blocks))
+
+        writer = GroupCommitWriter(append)
+        futures = [Future() for _ in range(4)]
+        writer._write([(['a'], futures[0]), (['dup', 'b'], futures[1]), (['c'], futures[2]), (['bad'], futures[3])])
+
+        # 出错的交易单所在的调用者失败，其余调用者的交易单照常写入
+        self.assertIsInstance(futures[1].exception(), DuplicateError)
+        self.assertIsInstance(futures[3].exception(), ValueError)
+        self.assertEqual([['a'], ['c']], blocks)
+        self.assertEqual('block_1', futures[0].result())
+        self.assertEqual('block_2', futures[2].result())
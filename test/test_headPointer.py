@@ -0,0 +1,80 @@
+from unittest import TestCase
+from BlockchainDjango.service.head_pointer import HeadPointer, HeadConflictError
+from BlockchainDjango.service.checkpoint_service import CheckpointService
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import Const
+
+
+def create_store(last_block_id, **kwargs):
+    store = SQLiteStore(':memory:')
+    store.put(dict({'_id': Const.LAST_BLOCK_ID, 'last_block_id': last_block_id}, **kwargs))
+    return store
+
+
+class TestHeadPointer(TestCase):
+    def test_link(self):
+        store = create_store('a')
+        head_pointer = HeadPointer(compact_interval=0)
+        self.assertEqual('b', head_pointer.link(store, lambda pre_id, height: 'b')['last_block_id'])
+        self.assertEqual('b', store.get_head()['last_block_id'])
+
+    def test_height_and_cum_hash(self):
+        store = create_store('a', height=0, cum_hash=CheckpointService.calc_cum_hash('', 'a'))
+        heights = []
+
+        def save_block(pre_id, height):
+            heights.append(height)
+            return 'b'
+
+        head_doc = HeadPointer(compact_interval=0).link(store, save_block)
+        # 新区块以链尾的高度加一写入
+        self.assertEqual([1], heights)
+        self.assertEqual(1, head_doc['height'])
+        self.assertEqual(CheckpointService.calc_cum_hash(CheckpointService.calc_cum_hash('', 'a'), 'b'),
+                         head_doc['cum_hash'])
+
+    def test_relink_on_conflict(self):
+        store = create_store('a')
+        head_pointer = HeadPointer(compact_interval=0)
+        pre_ids = []
+
+        def save_block(pre_id, height):
+            pre_ids.append(pre_id)
+            if len(pre_ids) == 1:
+                # 模拟写入区块期间其他写入者更新了链尾
+                store.put(dict(store.get_head(), last_block_id='other'))
+            return 'block_after_' + pre_id
+
+        self.assertEqual('block_after_other', head_pointer.link(store, save_block)['last_block_id'])
+        self.assertEqual(['a', 'other'], pre_ids)
+        stats = head_pointer.get_stats()
+        self.assertEqual(1, stats['head_conflicts'])
+        self.assertEqual(1, stats['head_retries'])
+
+    def test_max_retries(self):
+        store = create_store('a')
+        head_pointer = HeadPointer(max_retries=2, compact_interval=0)
+
+        def save_block(pre_id, height):
+            store.put(dict(store.get_head(), last_block_id=pre_id + 'x'))
+            return 'b'
+
+        with self.assertRaises(HeadConflictError):
+            head_pointer.link(store, save_block)
+        self.assertEqual(3, head_pointer.get_stats()['head_conflicts'])
+
+    def test_no_compaction_by_default(self):
+        class CompactCountingStore(SQLiteStore):
+            compactions = 0
+
+            def compact(self, revs_limit):
+                self.compactions += 1
+
+        store = CompactCountingStore(':memory:')
+        store.put({'_id': Const.LAST_BLOCK_ID, 'last_block_id': 'a'})
+        head_pointer = HeadPointer()
+        for i in range(5):
+            head_pointer.link(store, lambda pre_id, height: pre_id + 'b')
+        # 默认不在写入链尾时压缩整个存储
+        self.assertEqual(0, store.compactions)
+        self.assertEqual(0, head_pointer.get_stats()['compactions'])
@@ -0,0 +1,119 @@
+from unittest import TestCase
+from BlockchainDjango.service.index_service import IndexService
+from BlockchainDjango.entity.transaction import Transaction
+from BlockchainDjango.storage.base import BulkSaveError, ConflictError
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+
+
+def gen_tx(tx_id, tx_type, content):
+    tx = Transaction(content=content)
+    tx.id = tx_id
+    tx.tx_type = tx_type
+    return tx
+
+
+class TestIndexService(TestCase):
+    def test_gen_identity_entries(self):
+        tx_list = [gen_tx('tx1', 'patient', {'identifier': '101', 'name': 'a'}),
+                   gen_tx('tx2', 'patient', {'identifier': '101', 'name': 'b'}),
+                   gen_tx('tx3', 'doctor', {'identifier': '001'}),
+                   gen_tx('tx4', 'patient_record', {'patient_id': '101', 'record_tx_id': 'tx0'}),
+                   gen_tx('tx5', 'string', 'signature')]
+        entries = IndexService.gen_identity_entries(tx_list, 'block1')
+
+        patient_key = IndexService.get_identity_key('patient', 'identifier', '101')
+        doctor_key = IndexService.get_identity_key('doctor', 'identifier', '001')
+        self.assertEqual(2, len(entries))
+        # 同一区块内以 tx_list 中靠前的交易单为准
+        self.assertEqual({'tx_id': 'tx1', 'block_id': 'block1'}, entries[patient_key])
+        self.assertEqual({'tx_id': 'tx3', 'block_id': 'block1'}, entries[doctor_key])
+
+    def test_is_identity_indexed(self):
+        self.assertTrue(IndexService.is_identity_indexed('patient', 'identifier'))
+        self.assertFalse(IndexService.is_identity_indexed('patient', 'name'))
+        self.assertFalse(IndexService.is_identity_indexed('patient_record', 'patient_id'))
+
+    def test_gen_relation_entries(self):
+        tx_list = [gen_tx('tx1', 'patient_record', {'patient_id': '101', 'record_tx_id': 'r1'}),
+                   gen_tx('tx2', 'doctor_record', {'doctor_id': '001', 'record_tx_id': 'r1'}),
+                   gen_tx('tx3', 'medical_record_del', {'tx_id': 'r0', 'operator_type': 'patient',
+                                                        'operator_id': '101', 'patient_id': '101',
+                                                        'doctor_id': '002'}),
+                   gen_tx('tx4', 'medical_record_update', {'old_tx_id': 'r2', 'new_tx_id': 'r1',
+                                                           'operator_type': 'doctor', 'operator_id': '001',
+                                                           'old_patient_id': '101', 'old_doctor_id': '001'})]
+        entries = IndexService.gen_relation_entries(tx_list)
+
+        patient_entry = entries[IndexService.get_relation_key('patient_record', '101')]
+        self.assertEqual(['r1'], patient_entry['records'])
+        self.assertEqual([['r0', 'tx3']], patient_entry['deleted'])
+        self.assertEqual([['r2', 'tx4']], patient_entry['updated'])
+
+        doctor_entry = entries[IndexService.get_relation_key('doctor_record', '001')]
+        self.assertEqual({'records': ['r1'], 'deleted': [], 'updated': [['r2', 'tx4']]}, doctor_entry)
+
+        deleted_doctor_entry = entries[IndexService.get_relation_key('doctor_record', '002')]
+        self.assertEqual({'records': [], 'deleted': [['r0', 'tx3']], 'updated': []}, deleted_doctor_entry)
+
+    def test_gen_tx_entries(self):
+        tx_list = [gen_tx('tx1', 'string', 'a'), gen_tx('tx2', 'string', 'b')]
+        entries = IndexService.gen_tx_entries(tx_list, 'block1')
+        self.assertEqual({'block_id': 'block1', 'index': 1}, entries[IndexService.get_tx_key('tx2')])
+
+    def test_update_indexes_retry_on_conflict(self):
+        class ConcurrentStore(SQLiteStore):
+            """第一次批量写入前，另一个写入者向同一关系索引追加了就诊记录"""
+            def __init__(self):
+                super(ConcurrentStore, self).__init__(':memory:')
+                self.put_many_calls = 0
+
+            def put_many(self, docs):
+                self.put_many_calls += 1
+                if 1 == self.put_many_calls:
+                    doc = self.get(relation_key)
+                    doc['records'].append('r_other')
+                    super(ConcurrentStore, self).put(doc)
+                return super(ConcurrentStore, self).put_many(docs)
+
+        relation_key = IndexService.get_relation_key('patient_record', '101')
+        store = ConcurrentStore()
+        store.put({'_id': relation_key, 'records': ['r0'], 'deleted': [], 'updated': []})
+        tx_list = [gen_tx('tx1', 'patient_record', {'patient_id': '101', 'record_tx_id': 'r1'})]
+        IndexService.update_indexes(store, tx_list, 'block1', 1)
+
+        # 冲突的文档被重新读取并合并，另一个写入者追加的记录不会丢失
+        self.assertEqual(2, store.put_many_calls)
+        self.assertEqual(['r0', 'r_other', 'r1'], store.get(relation_key)['records'])
+        self.assertEqual('block1', store.get(IndexService.get_tx_key('tx1'))['block_id'])
+        self.assertEqual('block1', store.get(IndexService.get_height_key(1))['block_id'])
+
+        # 超过最大重试次数后抛出 BulkSaveError
+        store.put_many_calls = 0
+        with self.assertRaises(BulkSaveError):
+            IndexService.update_indexes(store, tx_list, 'block2', 2, max_retries=0)
+
+    def test_update_indexes_replay(self):
+        class FailingStore(SQLiteStore):
+            """高度索引文档一直写入失败，其余文档写入成功"""
+            def __init__(self):
+                super(FailingStore, self).__init__(':memory:')
+                self.failing = True
+
+            def put_many(self, docs):
+                if not self.failing:
+                    return super(FailingStore, self).put_many(docs)
+                height_key = IndexService.get_height_key(1)
+                super(FailingStore, self).put_many([doc for doc in docs if doc['_id'] != height_key])
+                raise BulkSaveError([(height_key, ConflictError())])
+
+        relation_key = IndexService.get_relation_key('patient_record', '101')
+        store = FailingStore()
+        tx_list = [gen_tx('tx1', 'patient_record', {'patient_id': '101', 'record_tx_id': 'r1'})]
+        with self.assertRaises(BulkSaveError):
+            IndexService.update_indexes(store, tx_list, 'block1', 1, max_retries=1)
+
+        # 重放同一区块的索引更新时，已写入的关系索引项不会被重复追加
+        store.failing = False
+        IndexService.update_indexes(store, tx_list, 'block1', 1)
+        self.assertEqual(['r1'], store.get(relation_key)['records'])
+        self.assertEqual('block1', store.get(IndexService.get_height_key(1))['block_id'])
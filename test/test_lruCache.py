@@ -0,0 +1,32 @@
+from unittest import TestCase
+from BlockchainDjango.util.lru_cache import LRUCache
+
+
+class TestLRUCache(TestCase):
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+        stats = cache.get_stats()
+        self.assertEqual(3, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['evictions'])
+        self.assertEqual(2, stats['size'])
+
+    def test_max_bytes(self):
+        cache = LRUCache(10, max_bytes=10)
+        cache.put('a', 'aaaa', 4)
+        cache.put('b', 'bbbb', 4)
+        cache.put('c', 'cccc', 4)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(8, cache.get_stats()['bytes'])
+        cache.pop('b')
+        self.assertEqual(4, cache.get_stats()['bytes'])
@@ -1,5 +1,9 @@
 from unittest import TestCase
+from BlockchainDjango.service.index_service import IndexService
 from BlockchainDjango.service.medical_record_service import MedicalRecordService
+from BlockchainDjango.storage import get_store, set_store
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import FindRecordType
 
 
 class TestMedicalRecordService(TestCase):
@@ -24,3 +28,37 @@ class TestMedicalRecordService(TestCase):
         MedicalRecordService.modify_record_fields(dict1, dict2)
         print(dict1)
         print(dict2)
+
+    def test_find_page_by_relation(self):
+        set_store(SQLiteStore(':memory:'))
+        try:
+            get_store().put({'_id': IndexService.get_relation_key('patient_record', 'p'),
+                             'records': ['r1', 'r2', 'r3', 'r4', 'r5'], 'deleted': [['r4', 'd1']], 'updated': []})
+            tx_ids, cursor = MedicalRecordService.find_page_by_patient_id('p', 2)
+            self.assertEqual(['r5', 'r3'], tx_ids)
+
+            # 之后新增的记录不影响后续页
+            get_store().put(dict(get_store()[IndexService.get_relation_key('patient_record', 'p')],
+                                 records=['r1', 'r2', 'r3', 'r4', 'r5', 'r6']))
+            tx_ids, cursor = MedicalRecordService.find_page_by_patient_id('p', 2, cursor)
+            self.assertEqual(['r2', 'r1'], tx_ids)
+            self.assertIsNone(cursor)
+
+            with self.assertRaises(ValueError):
+                MedicalRecordService.find_page_by_patient_id('p', 2, 'not-a-cursor')
+        finally:
+            set_store(None)
+
+    def test_find_by_relation_id_name(self):
+        set_store(SQLiteStore(':memory:'))
+        try:
+            get_store().put({'_id': IndexService.get_relation_key('patient_record', 'p'),
+                             'records': ['r1', 'r2', 'r3'], 'deleted': [['r2', 'd1']], 'updated': []})
+            # 旧的调用方式仍传入 id_name，该参数被忽略
+            self.assertEqual(MedicalRecordService.find_by_patient_id('p'),
+                             MedicalRecordService.find_by_relation('patient_record', 'p', 'patient_id'))
+            self.assertEqual((['r2'], ['d1']),
+                             MedicalRecordService.find_by_relation('patient_record', 'p', 'patient_id',
+                                                                   FindRecordType.DELETED.value))
+        finally:
+            set_store(None)
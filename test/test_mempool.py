@@ -0,0 +1,94 @@
+from unittest import TestCase
+from BlockchainDjango.service.block_service import BlockService
+from BlockchainDjango.service.index_service import IndexService
+from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.storage import set_store
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from Validator.mempool import Mempool, BlockProducer
+
+
+def gen_tx_dict(tx_id):
+    return {'id': tx_id, 'signature': '', 'tx_type': 'string', 'pub_key': '', 'content': tx_id, 'timestamp': ''}
+
+
+class TestMempool(TestCase):
+    def test_dedupe(self):
+        mempool = Mempool()
+        self.assertTrue(mempool.add(gen_tx_dict('a')))
+        self.assertFalse(mempool.add(gen_tx_dict('a')))
+        self.assertEqual([gen_tx_dict('a')], mempool.take(10, 1024))
+        # 已打包的交易单再次提交时也会被拒绝
+        self.assertFalse(mempool.add(gen_tx_dict('a')))
+        self.assertEqual(2, mempool.duplicates)
+
+    def test_take_and_put_back(self):
+        mempool = Mempool()
+        for tx_id in ('a', 'b', 'c'):
+            mempool.add(gen_tx_dict(tx_id))
+
+        tx_dicts = mempool.take(2, 1024 * 1024)
+        self.assertEqual(['a', 'b'], [tx_dict['id'] for tx_dict in tx_dicts])
+        mempool.put_back(tx_dicts)
+        self.assertEqual(['a', 'b', 'c'], [tx_dict['id'] for tx_dict in mempool.take(10, 1024 * 1024)])
+        self.assertEqual(0, mempool.byte_size)
+
+    def test_take_max_bytes(self):
+        mempool = Mempool()
+        for tx_id in ('a', 'b'):
+            mempool.add(gen_tx_dict(tx_id))
+
+        # 至少取出一条交易单
+        self.assertEqual(1, len(mempool.take(10, 1)))
+        self.assertEqual(1, len(mempool))
+
+    def test_put_back_max_retries(self):
+        mempool = Mempool(max_retries=1)
+        mempool.add(gen_tx_dict('a'))
+        tx_dicts = mempool.take(10, 1024)
+        self.assertEqual([], mempool.put_back(tx_dicts))
+
+        # 第二次放回时超过最大重试次数，被丢弃后允许重新提交
+        tx_dicts = mempool.take(10, 1024)
+        self.assertEqual(tx_dicts, mempool.put_back(tx_dicts))
+        self.assertEqual(0, len(mempool))
+        self.assertEqual(1, mempool.dropped)
+        self.assertTrue(mempool.add(gen_tx_dict('a')))
+
+    def test_put_back_uncommitted(self):
+        producer = BlockProducer(Mempool())
+        producer.producing = True
+        tx_dicts = [gen_tx_dict('a'), gen_tx_dict('b')]
+        # 已在交易单索引中的交易单不再放回 mempool
+        producer.put_back_uncommitted([{'block_id': 'block1', 'index': 0}, None], tx_dicts)
+        self.assertFalse(producer.producing)
+        self.assertEqual(1, producer.txs_committed)
+        self.assertEqual(['b'], [tx_dict['id'] for tx_dict in producer.mempool.take(10, 1024)])
+
+    def test_put_back_failed_ids(self):
+        mempool = Mempool(max_retries=1)
+        for tx_id in ('a', 'b'):
+            mempool.add(gen_tx_dict(tx_id))
+        dropped = []
+        for _ in range(3):
+            # 只有导致写入失败的交易单 b 计入放回次数，a 不会被丢弃
+            dropped += mempool.put_back(mempool.take(10, 1024 * 1024), failed_ids=['b'])
+        self.assertEqual(['b'], [tx_dict['id'] for tx_dict in dropped])
+        self.assertEqual(['a'], [tx_dict['id'] for tx_dict in mempool.take(10, 1024 * 1024)])
+
+    def test_commit_txs(self):
+        set_store(SQLiteStore(':memory:'))
+        try:
+            BlockService.init_block()
+            tx1 = TransactionService.gen_tx('tx1')
+            tx2 = TransactionService.gen_tx('tx2')
+            BlockService.add_block([tx1])
+
+            # 已在区块链中的交易单不再写入，也不会导致其他交易单写入失败
+            block_id, committed, written = BlockProducer.commit_txs([dict(tx1.__dict__), dict(tx2.__dict__)])
+            self.assertEqual([tx1.id], [tx_dict['id'] for tx_dict in committed])
+            self.assertEqual([tx2.id], [tx_dict['id'] for tx_dict in written])
+            self.assertEqual(block_id, IndexService.find_tx_block(tx2.id)['block_id'])
+
+            self.assertEqual((None, [dict(tx2.__dict__)], []), BlockProducer.commit_txs([dict(tx2.__dict__)]))
+        finally:
+            set_store(None)
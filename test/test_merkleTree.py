@@ -0,0 +1,43 @@
+from unittest import TestCase
+from merkletools import MerkleTools
+from BlockchainDjango.util.merkle_tree import MerkleTree, gen_merkle_tree, hash_leaf, verify_proof
+
+
+def gen_tx_strs(count):
+    return ['tx_' + str(i) for i in range(count)]
+
+
+def gen_merkletools_tree(tx_list):
+    mt = MerkleTools(hash_type="sha256")
+    mt.add_leaf(tx_list, True)
+    mt.make_tree()
+    return mt
+
+
+class TestMerkleTree(TestCase):
+    def test_same_root_as_merkletools(self):
+        self.assertIsNone(gen_merkle_tree([]))
+        for count in range(1, 40):
+            tx_list = gen_tx_strs(count)
+            self.assertEqual(gen_merkletools_tree(tx_list).get_merkle_root(), gen_merkle_tree(tx_list))
+
+    def test_add_leaf_incrementally(self):
+        tree = MerkleTree()
+        tx_list = gen_tx_strs(37)
+        for count, tx_str in enumerate(tx_list, 1):
+            tree.add_leaf(tx_str)
+            # 每添加一个叶子都计算一次根，只重新计算受影响的节点
+            self.assertEqual(gen_merkle_tree(tx_list[:count]), tree.get_root_hex())
+
+    def test_proof(self):
+        for count in (1, 2, 7, 16, 21):
+            tx_list = gen_tx_strs(count)
+            tree = MerkleTree(tx_list)
+            mt = gen_merkletools_tree(tx_list)
+            root = tree.get_root_hex()
+            for index, tx_str in enumerate(tx_list):
+                proof = tree.get_proof(index)
+                self.assertEqual(mt.get_proof(index), proof)
+                self.assertTrue(verify_proof(proof, hash_leaf(tx_str), root))
+                self.assertFalse(verify_proof(proof, hash_leaf(tx_str + 'x'), root))
+        self.assertIsNone(MerkleTree(gen_tx_strs(3)).get_proof(3))
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from BlockchainDjango.storage import BulkSaveError, ConflictError
+from BlockchainDjango.storage.segment_log_store import SegmentLogStore
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import Const
+
+
+class TestSegmentLogStore(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = SegmentLogStore(self.path, SQLiteStore(':memory:'), segment_size=200, sync=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_and_get(self):
+        block = {'_id': 'b1', 'pre_id': 'g', 'tree_hash': 'h'}
+        tx = {'_id': 't1', 'Transaction': {'id': 't1', 'content': '内容'}}
+        head = {'_id': Const.LAST_BLOCK_ID, 'last_block_id': 'b1'}
+        self.store.put_many([block, tx, head])
+        self.assertEqual('1', block['_rev'])
+
+        self.assertEqual('内容', self.store.get('t1')['Transaction']['content'])
+        self.assertEqual(['b1', None, Const.LAST_BLOCK_ID],
+                         [doc and doc['_id'] for doc in self.store.get_many(['b1', 'x', Const.LAST_BLOCK_ID])])
+        # 链尾等可修改的文档保存在 mutable_store 中
+        self.assertIsNotNone(self.store.mutable_store.get(Const.LAST_BLOCK_ID))
+        self.assertIsNone(self.store.mutable_store.get('b1'))
+        self.assertTrue(self.store.swap_head(dict(self.store.get_head(), last_block_id='b2')))
+
+    def test_immutable_conflict(self):
+        self.store.put({'_id': 'b1', 'pre_id': 'g'})
+        with self.assertRaises(ConflictError):
+            self.store.put({'_id': 'b1', 'pre_id': 'x'})
+        with self.assertRaises(BulkSaveError) as cm:
+            self.store.put_many([{'_id': 'b1', 'pre_id': 'x'}, {'_id': 'b2', 'pre_id': 'b1'}])
+        self.assertEqual(['b1'], cm.exception.failed_ids)
+        self.assertEqual('g', self.store['b1']['pre_id'])
+
+    def test_reopen_and_replay(self):
+        for i in range(10):
+            self.store.put({'_id': 'b' + str(i), 'pre_id': 'b' + str(i - 1)})
+        self.store.delete(self.store['b3'])
+        # 每个段文件 200 字节，写入时会切换到新的段文件
+        self.assertGreater(self.store.get_stats()['segments'], 1)
+
+        reopened = SegmentLogStore(self.path, SQLiteStore(':memory:'))
+        self.assertIsNone(reopened.get('b3'))
+        self.assertEqual('b8', reopened['b9']['pre_id'])
+        self.assertEqual(['b0', 'b1', 'b2', 'b4', 'b5', 'b6', 'b7', 'b8', 'b9'],
+                         [doc['_id'] for doc in reopened.replay()])
+
+    def test_truncated_record(self):
+        self.store.put({'_id': 'b1', 'pre_id': 'g'})
+        segment_path = os.path.join(self.path, 'segment_00000001.log')
+        with open(segment_path, 'ab') as segment_file:
+            segment_file.write(b'\x00\x00\x05')
+
+        reopened = SegmentLogStore(self.path, SQLiteStore(':memory:'))
+        # 不完整的记录在写入前被截去
+        reopened.put({'_id': 'b2', 'pre_id': 'b1'})
+        self.assertEqual(['b1', 'b2'], [doc['_id'] for doc in reopened.replay()])
+        self.assertEqual(['b1', 'b2'], [doc['_id'] for doc in SegmentLogStore(self.path, SQLiteStore(':memory:'))
+                                        .replay()])
+
+    def test_cross_instance_read(self):
+        other = SegmentLogStore(self.path, self.store.mutable_store)
+        self.store.put({'_id': 'b1', 'pre_id': 'g'})
+        # 读取不到时先读取其他写入者新追加的记录
+        self.assertEqual('g', other['b1']['pre_id'])
+
+    def test_iterate(self):
+        self.store.put_many([{'_id': 'checkpoint:2', 'height': 2}, {'_id': 'checkpoint:1', 'height': 1},
+                             {'_id': 'tx_index:a', 'block_id': 'b'}])
+        self.assertEqual(['checkpoint:1', 'checkpoint:2', 'tx_index:a'],
+                         [doc['_id'] for doc in self.store.iterate()])
+
+    def test_concurrent_threads(self):
+        results = []
+
+        def put_blocks(thread_index):
+            for i in range(20):
+                try:
+                    # 各线程写入同一个区块，只能有一个线程写入成功
+                    self.store.put({'_id': 'b' + str(i), 'pre_id': 'g', 'writer': thread_index})
+                    results.append(i)
+                except ConflictError:
+                    pass
+
+        threads = [threading.Thread(target=put_blocks, args=(thread_index,)) for thread_index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(list(range(20)), sorted(results))
+        self.assertEqual(20, len(list(self.store.replay())))
@@ -1,10 +1,45 @@
+import os
+import tempfile
 from unittest import TestCase
 from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.util import signature
+from BlockchainDjango.util.signature import Signature, _KeyStore
 
 
 class TestSignature(TestCase):
+    def setUp(self):
+        # 生成交易单时使用临时目录中的密钥对，不在 util/files 中生成密钥文件
+        self.key_dir = tempfile.TemporaryDirectory()
+        self.key_store = signature._key_store
+        signature._key_store = _KeyStore(os.path.join(self.key_dir.name, 'sk.pem'),
+                                         os.path.join(self.key_dir.name, 'vk.pem'))
+
+    def tearDown(self):
+        signature._key_store = self.key_store
+        self.key_dir.cleanup()
 
     def test_verify(self):
         transaction = TransactionService.gen_tx("signature")
         self.assertNotEqual(TransactionService.verify_tx(transaction), 'True')
 
+    def test_get_key_pair(self):
+        with tempfile.TemporaryDirectory() as key_dir:
+            key_store = _KeyStore(os.path.join(key_dir, 'sk.pem'), os.path.join(key_dir, 'vk.pem'))
+            # 密钥文件不存在时生成新的密钥对
+            pvt_key, pub_key = key_store.get_key_pair()
+            self.assertEqual(0o600, os.stat(key_store.pvt_key_loc).st_mode & 0o777)
+            # 密钥文件未被修改时返回缓存的密钥对
+            self.assertIs(pvt_key, key_store.get_key_pair()[0])
+            signature = bytes.hex(Signature.sign(pvt_key, 'content'))
+            self.assertTrue(Signature.verify(pub_key, 'content', signature))
+
+            # 密钥文件被替换后重新读取
+            new_pvt_key, _ = Signature.gen_key_pair(key_store.pvt_key_loc, key_store.pub_key_loc)
+            self.assertEqual(new_pvt_key.to_string(), key_store.get_key_pair()[0].to_string())
+
+    def test_get_verifying_key(self):
+        transaction = TransactionService.gen_tx("signature")
+        vk = Signature.get_verifying_key(transaction.pub_key)
+        self.assertIs(vk, Signature.get_verifying_key(transaction.pub_key))
+        self.assertTrue(TransactionService.verify_tx(transaction))
+        self.assertGreater(Signature.get_verifying_key_stats()['hits'], 0)
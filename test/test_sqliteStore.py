@@ -0,0 +1,52 @@
+from unittest import TestCase
+from BlockchainDjango.storage import BulkSaveError, ConflictError, DocNotFoundError
+from BlockchainDjango.storage.sqlite_store import SQLiteStore
+from BlockchainDjango.util.const import Const
+
+
+class TestSQLiteStore(TestCase):
+    def setUp(self):
+        self.store = SQLiteStore(':memory:')
+
+    def test_put_and_get(self):
+        doc = {'_id': 'a', 'content': [1, 2]}
+        self.store.put(doc)
+        self.assertEqual('1', doc['_rev'])
+        self.assertEqual({'_id': 'a', '_rev': '1', 'content': [1, 2]}, self.store.get('a'))
+        self.assertIsNone(self.store.get('b'))
+        with self.assertRaises(DocNotFoundError):
+            self.store['b']
+
+    def test_get_many(self):
+        self.store.put_many([{'_id': 'a'}, {'_id': 'b'}])
+        self.assertEqual(['b', None, 'a'], [doc and doc['_id'] for doc in self.store.get_many(['b', 'c', 'a'])])
+
+    def test_conflict(self):
+        doc = {'_id': 'a'}
+        self.store.put(doc)
+        # 没有 _rev 或 _rev 过期时视为冲突
+        with self.assertRaises(ConflictError):
+            self.store.put({'_id': 'a'})
+        self.store.put(dict(doc))
+        with self.assertRaises(ConflictError):
+            self.store.put(doc)
+
+        with self.assertRaises(BulkSaveError) as cm:
+            self.store.put_many([{'_id': 'a'}, {'_id': 'b'}])
+        self.assertEqual(['a'], cm.exception.failed_ids)
+        self.assertIsNotNone(self.store.get('b'))
+
+    def test_swap_head(self):
+        self.store.put({'_id': Const.LAST_BLOCK_ID, 'last_block_id': 'a'})
+        head_doc = self.store.get_head()
+        self.assertTrue(self.store.swap_head(dict(head_doc, last_block_id='b')))
+        self.assertFalse(self.store.swap_head(dict(head_doc, last_block_id='c')))
+        self.assertEqual('b', self.store.get_head()['last_block_id'])
+
+    def test_iterate_and_delete(self):
+        self.store.put_many([{'_id': 'tx_index:2'}, {'_id': 'tx_index:1'}, {'_id': 'height_index:0'}])
+        self.assertEqual(['tx_index:1', 'tx_index:2'], [doc['_id'] for doc in self.store.iterate('tx_index:')])
+
+        self.store.delete(self.store['tx_index:1'])
+        self.assertIsNone(self.store.get('tx_index:1'))
+        self.assertEqual(2, self.store.get_stats()['doc_count'])
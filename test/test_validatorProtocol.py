@@ -0,0 +1,78 @@
+import struct
+from unittest import TestCase
+
+from twisted.internet import defer
+from twisted.internet.testing import StringTransport
+
+from Validator.validator_protocol import ValidatorProtocol, encode_frame, decode_frame
+
+
+class FakeEngine(object):
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, msg_dict):
+        d = defer.Deferred()
+        self.pending.append((msg_dict, d))
+        return d
+
+
+class FakeFactory(object):
+    def __init__(self):
+        self.engine = FakeEngine()
+        self.producer = None
+        self.messages = 0
+
+
+def frame(frame_dict):
+    data = encode_frame(frame_dict)
+    return struct.pack('!I', len(data)) + data
+
+
+def read_frames(data):
+    frames = []
+    while data:
+        length, = struct.unpack('!I', data[:4])
+        frames.append(decode_frame(data[4:4 + length]))
+        data = data[4 + length:]
+    return frames
+
+
+class TestValidatorProtocol(TestCase):
+    def setUp(self):
+        self.proto = ValidatorProtocol()
+        self.proto.factory = FakeFactory()
+        self.transport = StringTransport()
+        self.proto.makeConnection(self.transport)
+
+    def test_split_and_merged_frames(self):
+        data = frame({'corr_id': 1, 'msg': {'msg_type': 'cli', 'n': 1}}) + \
+            frame({'corr_id': 2, 'msg': {'msg_type': 'cli', 'n': 2}})
+        # 两个帧粘在一起，并且在任意位置被拆开
+        self.proto.dataReceived(data[:3])
+        self.proto.dataReceived(data[3:30])
+        self.proto.dataReceived(data[30:])
+
+        pending = self.proto.factory.engine.pending
+        self.assertEqual(2, self.proto.factory.messages)
+        self.assertEqual([1, 2], [msg_dict['n'] for msg_dict, _ in pending])
+
+        # 乱序返回的验证结果通过 corr_id 对应请求
+        pending[1][1].callback((True, False))
+        pending[0][1].callback((True, True))
+        self.assertEqual([{'corr_id': 2, 'msg_ok': True, 'tx_ok': False, 'accepted': False},
+                          {'corr_id': 1, 'msg_ok': True, 'tx_ok': True, 'accepted': False}],
+                         read_frames(self.transport.value()))
+
+    def test_unknown_msg_type(self):
+        self.proto.dataReceived(frame({'corr_id': 7, 'msg': {'msg_type': 'unknown'}}))
+        self.assertEqual([{'corr_id': 7, 'error': '未知的msg类型'}], read_frames(self.transport.value()))
+
+    def test_malformed_msg(self):
+        # msg 不是 dict 时返回错误帧，连接保持可用
+        self.proto.dataReceived(frame({'corr_id': 8, 'msg': 'not a dict'}) + frame(['not', 'a', 'request']))
+        self.proto.dataReceived(frame({'corr_id': 9, 'msg': {'msg_type': 'unknown'}}))
+        self.assertEqual([{'corr_id': None, 'error': '无法解析的请求帧'},
+                          {'corr_id': None, 'error': '无法解析的请求帧'},
+                          {'corr_id': 9, 'error': '未知的msg类型'}], read_frames(self.transport.value()))
+        self.assertFalse(self.transport.disconnecting)
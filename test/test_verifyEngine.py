@@ -0,0 +1,69 @@
+import copy
+import os
+from concurrent.futures import Future
+from unittest import TestCase
+
+from twisted.internet import defer
+
+from BlockchainDjango.service.message_service import MessageService
+from BlockchainDjango.service.transaction_service import TransactionService
+from BlockchainDjango.util.const import MsgType
+from Validator.verify_engine import VerifyEngine, verify_batch, verify_msg_dict
+
+
+def gen_msg_dict():
+    transaction = TransactionService.gen_tx('signature')
+    return MessageService.gen_msg(msg_type=MsgType.CLI.value, transaction=transaction).__dict__
+
+
+class TestVerifyEngine(TestCase):
+    def test_verify_msg_dict(self):
+        msg_dict = gen_msg_dict()
+        self.assertEqual((True, True), verify_msg_dict(msg_dict))
+
+        # Transaction 的 id 不是由其签名生成的
+        forged = copy.deepcopy(msg_dict)
+        forged['transaction']['id'] = '0' * 64
+        self.assertFalse(verify_msg_dict(forged)[1])
+
+    def test_verify_batch(self):
+        valid = gen_msg_dict()
+        bad_sig = copy.deepcopy(valid)
+        bad_sig['transaction']['content'] = 'tampered'
+        results, pid, key_cache_stats = verify_batch([valid, bad_sig, {'msg_type': 'cli'}])
+
+        self.assertEqual([(True, True), (False, False), (False, False)], results)
+        self.assertEqual(os.getpid(), pid)
+        self.assertIn('hits', key_cache_stats)
+
+    def test_batch_done(self):
+        engine = VerifyEngine(processes=1)
+        try:
+            msg_dicts = [gen_msg_dict(), gen_msg_dict()]
+            msg_dicts[1]['transaction']['content'] = 'tampered'
+            batch = [(msg_dict, defer.Deferred()) for msg_dict in msg_dicts]
+            results = []
+            for _, d in batch:
+                d.addCallback(results.append)
+
+            # 验证结果按批中的顺序回调各个 Deferred，并记录工作进程的 VerifyingKey 缓存统计
+            future = Future()
+            future.set_result(verify_batch(msg_dicts))
+            engine.in_flight = len(batch)
+            engine._batch_done(batch, future)
+            self.assertEqual([(True, True), (False, False)], results)
+            self.assertEqual(0, engine.in_flight)
+            self.assertGreater(engine.get_stats()['verifying_key_cache']['hits'], 0)
+
+            # 整批验证失败时每个 Deferred 都收到 errback
+            errors = []
+            d = defer.Deferred()
+            d.addErrback(errors.append)
+            future = Future()
+            future.set_exception(RuntimeError('worker died'))
+            engine.in_flight = 1
+            engine._batch_done([(msg_dicts[0], d)], future)
+            self.assertEqual(1, len(errors))
+            self.assertIsInstance(errors[0].value, RuntimeError)
+        finally:
+            engine.shutdown()